@@ -1,11 +1,19 @@
+import time
+import hashlib
+
+from django import http
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
 from django.shortcuts import get_object_or_404
-from django.utils.translation import ugettext as _
+from django.utils.translation import ugettext as _, get_language
 from django.utils.feedgenerator import rfc3339_date
+from django.utils.http import http_date, parse_http_date_safe
 from django.contrib.sites.models import Site
 
 from l10n.urlresolvers import reverse
 from django_push.publisher.feeds import Feed, HubAtom1Feed
-from activity.models import Activity
+from activity.models import Activity, prefetch_activities
 from activity.schema import object_types
 from projects.models import Project
 from users.models import UserProfile
@@ -54,9 +62,71 @@ class ActivityStreamFeedType(HubAtom1Feed):
         super(ActivityStreamFeedType, self).add_item_elements(handler, item)
 
 
+FEED_KEY = 'activity_feed_%s'
+
+
+def is_not_modified(request, etag, timestamp):
+    """Whether the conditional headers of ``request`` match the feed."""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = [tag.strip() for tag in if_none_match.split(',')]
+        return etag in etags or '*' in etags
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'))
+    if if_modified_since and timestamp:
+        return timestamp <= if_modified_since
+    return False
+
+
 class BaseActivityFeed(Feed):
+    """Feed of the latest activities of a scope.
+
+    Responses carry an ETag and Last-Modified taken from the newest
+    activity, so pollers get a 304 without the items being read, and the
+    feed documents are cached until a newer activity is created."""
     feed_type = ActivityStreamFeedType
 
+    # Number of activities in the feed.
+    max_items = 25
+
+    def __call__(self, request, *args, **kwargs):
+        try:
+            obj = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            raise http.Http404('Feed object does not exist.')
+        latest_id, latest_on = self.get_latest(obj)
+        timestamp = latest_on and int(time.mktime(latest_on.timetuple()))
+        etag = '"%s"' % hashlib.md5('%s:%s:%s:%s' % (request.get_host(),
+            request.path, get_language(), latest_id)).hexdigest()
+        if is_not_modified(request, etag, timestamp):
+            response = http.HttpResponseNotModified()
+        else:
+            key = FEED_KEY % etag.strip('"')
+            content = cache.get(key)
+            if content is None:
+                content = self.get_feed(obj, request).writeString('utf-8')
+                cache.set(key, content, settings.ACTIVITY_FEED_TIMEOUT)
+            response = http.HttpResponse(content,
+                mimetype=self.feed_type.mime_type)
+        response['ETag'] = etag
+        if timestamp:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def activities(self, obj):
+        """The activities of the feed, newest first."""
+        raise NotImplementedError
+
+    def get_latest(self, obj):
+        """Id and creation time of the newest activity of the feed."""
+        latest = list(self.activities(obj).values_list('id',
+            'created_on')[:1])
+        return latest[0] if latest else (0, None)
+
+    def items(self, obj):
+        return prefetch_activities(self.activities(obj)[:self.max_items],
+            show_actor=True)
+
     def item_author_name(self, item):
         return unicode(item.actor)
 
@@ -104,8 +174,8 @@ class ProfileActivityFeed(BaseActivityFeed):
         return reverse('users_profile_view',
                        kwargs={'username': user.username})
 
-    def items(self, user):
-        return Activity.objects.for_user(user)[:25]
+    def activities(self, user):
+        return Activity.objects.for_user(user)
 
 
 class DashboardActivityFeed(ProfileActivityFeed):
@@ -113,8 +183,8 @@ class DashboardActivityFeed(ProfileActivityFeed):
     def subtitle(self, user):
         return _('Activity feed from %s\'s dashboard') % (user,)
 
-    def items(self, user):
-        return Activity.objects.dashboard(user)[:25]
+    def activities(self, user):
+        return Activity.objects.dashboard(user)
 
 
 class ProjectActivityFeed(BaseActivityFeed):
@@ -126,8 +196,8 @@ class ProjectActivityFeed(BaseActivityFeed):
     def link(self, project):
         return reverse('projects_show', kwargs={'slug': project.slug})
 
-    def items(self, project):
-        return project.activities()[:25]
+    def activities(self, project):
+        return project.activities()
 
 
 class PublicActivityFeed(BaseActivityFeed):
@@ -136,8 +206,8 @@ class PublicActivityFeed(BaseActivityFeed):
         self._request = request
         return Site.objects.get_current().domain
 
-    def items(self, obj):
-        return Activity.objects.public()[:25]
+    def activities(self, obj):
+        return Activity.objects.public_activities()
 
     def link(self, user):
         return reverse('splash')
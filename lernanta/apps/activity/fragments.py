@@ -0,0 +1,141 @@
+"""Rendered activity fragments cache.
+
+The html of activity/_activity_body.html is cached per activity, locale
+and the version stamps of the activity, its target (and the object a
+target comment is about) and its actor. Stamps
+are replaced when those objects are saved or deleted (see the signals at
+the end of activity.models), so stale fragments are never read again and
+expire from the cache on their own.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.contenttypes.models import ContentType
+from django.template.loader import render_to_string
+from django.utils.translation import get_language
+
+VERSION_KEY = 'activity_fragment_version_%s_%s'
+FRAGMENT_KEY = 'activity_fragment_%s_%s_%s_%s'
+
+# Models whose changes are reflected in the fragments.
+VERSIONED_MODELS = set([
+    'activity.activity',
+    'activity.remoteobject',
+    'content.page',
+    'projects.project',
+    'relationships.relationship',
+    'replies.pagecomment',
+    'signups.signupanswer',
+    'statuses.status',
+    'users.userprofile',
+])
+
+
+def get_version_key(label, pk):
+    return VERSION_KEY % (label, pk)
+
+
+def bump_version(instance):
+    """Replaces the version stamp of ``instance``."""
+    opts = instance._meta
+    cache.set(get_version_key('%s.%s' % (opts.app_label,
+        opts.object_name.lower()), instance.pk), uuid.uuid4().hex[:12],
+        settings.ACTIVITY_FRAGMENT_TIMEOUT)
+
+
+def get_versions(keys):
+    """Returns the version stamps of ``keys``, creating the missing
+    ones."""
+    versions = cache.get_many(keys)
+    missing = dict((key, uuid.uuid4().hex[:12]) for key in keys
+        if key not in versions)
+    if missing:
+        cache.set_many(missing, settings.ACTIVITY_FRAGMENT_TIMEOUT)
+        versions.update(missing)
+    return versions
+
+
+def get_label(content_type_id):
+    ct = ContentType.objects.get_for_id(content_type_id)
+    return '%s.%s' % (ct.app_label, ct.model)
+
+
+def get_commented_objects(activities):
+    """Maps the ids of the comments targeted by ``activities`` to the
+    (content type id, id) of the object they comment on, which is shown
+    in their fragment too."""
+    from replies.models import PageComment
+    ct = ContentType.objects.get_for_model(PageComment)
+    comment_ids = [activity.target_id for activity in activities
+        if activity.target_content_type_id == ct.id]
+    if not comment_ids:
+        return {}
+    return dict((comment_id, (page_content_type_id, page_id))
+        for comment_id, page_content_type_id, page_id
+        in PageComment.objects.filter(id__in=comment_ids).values_list(
+            'id', 'page_content_type', 'page_id'))
+
+
+def get_dependency_keys(activity, commented_objects=None):
+    """Version keys of the objects shown in the fragment of ``activity``,
+    computed without loading them. ``commented_objects`` is the result of
+    get_commented_objects for the activities targeting comments."""
+    keys = [get_version_key('activity.activity', activity.id),
+        get_version_key('users.userprofile', activity.actor_id)]
+    if activity.target_content_type_id:
+        label = get_label(activity.target_content_type_id)
+        keys.append(get_version_key(label, activity.target_id))
+        if label == 'replies.pagecomment' and commented_objects:
+            content_type_id, object_id = commented_objects.get(
+                activity.target_id, (None, None))
+            if content_type_id:
+                keys.append(get_version_key(get_label(content_type_id),
+                    object_id))
+    return keys
+
+
+def get_fragment_key(activity, show_actor, versions, commented_objects):
+    stamp = '.'.join([versions[key]
+        for key in get_dependency_keys(activity, commented_objects)])
+    return FRAGMENT_KEY % (activity.id, int(show_actor), get_language(),
+        stamp)
+
+
+def render_activities(activities, show_actor):
+    """Returns the html of ``activities``, keyed by activity id, reading
+    the cached fragments with two cache round trips."""
+    commented_objects = get_commented_objects(activities)
+    dependency_keys = set()
+    for activity in activities:
+        dependency_keys.update(get_dependency_keys(activity,
+            commented_objects))
+    versions = get_versions(list(dependency_keys))
+    keys = dict((activity.id, get_fragment_key(activity, show_actor,
+        versions, commented_objects)) for activity in activities)
+    cached = cache.get_many(keys.values())
+    rendered = {}
+    missing = {}
+    for activity in activities:
+        key = keys[activity.id]
+        if key in cached:
+            rendered[activity.id] = cached[key]
+            continue
+        html = render_to_string('activity/_activity_body.html', {
+            'activity': activity,
+            'show_actor': show_actor,
+        })
+        rendered[activity.id] = missing[key] = html
+    if missing:
+        cache.set_many(missing, settings.ACTIVITY_FRAGMENT_TIMEOUT)
+    return rendered
+
+
+def prefetch_fragments(activities, show_actor=False):
+    """Reads the fragments of ``activities`` in bulk, so their
+    html_representation (or body_html) does not hit the cache again."""
+    rendered = render_activities(activities, show_actor)
+    for activity in activities:
+        activity.__dict__.setdefault('_fragments', {})[show_actor] = \
+            rendered[activity.id]
+    return activities
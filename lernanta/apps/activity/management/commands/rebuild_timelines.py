@@ -0,0 +1,24 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from users.models import UserProfile
+from activity import timelines
+
+
+class Command(BaseCommand):
+    args = '<username username ...>'
+    help = 'Rebuilds the dashboard timelines of the users (all by default)'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--length', type='int', dest='length', default=None,
+            help='Activities kept per timeline (ACTIVITY_TIMELINE_LENGTH '
+            'by default)'),
+    )
+
+    def handle(self, *args, **options):
+        profiles = None
+        if args:
+            profiles = UserProfile.objects.filter(username__in=args)
+        count = timelines.rebuild_timelines(profiles, options['length'])
+        self.stdout.write('Rebuilt %s timelines.\n' % count)
@@ -1,14 +1,17 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
 from django.utils.translation import ugettext_lazy as _
-from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.utils.html import strip_tags
 from django.conf import settings
 
 from drumbeat.models import ModelBase, ManagerBase
-from activity import schema
+from drumbeat.utils import prefetch_foreign_keys, prefetch_generic_objects
+from activity import schema, fragments, public_stream
 from l10n.urlresolvers import reverse
+from pagination.views import get_page_number
 from replies.models import PageComment
 
 
@@ -28,30 +31,70 @@ def apply_filter(activities, name):
         return activities
 
 
+def prefetch_activities(activities, show_actor=False):
+    """Loads the actors, projects and targets of ``activities`` (and the
+    pages and scopes of the targeted comments) with a few bulk queries
+    instead of a few queries per activity, and their cached html with or
+    without the actor. Returns them as a list."""
+    activities = prefetch_foreign_keys(activities, 'actor', 'scope_object')
+    prefetch_generic_objects(activities, 'target_object')
+    comments = [activity.target_object for activity in activities
+        if isinstance(activity.target_object, PageComment)]
+    prefetch_generic_objects(comments, 'page_object')
+    prefetch_generic_objects(comments, 'scope_object')
+    fragments.prefetch_fragments(activities, show_actor)
+    return activities
+
+
 class ActivityManager(ManagerBase):
 
     def public(self):
         """Get list of activities to show on splash page."""
-        remote_object_ct = ContentType.objects.get_for_model(
-            RemoteObject)
-        from statuses.models import Status
-        from projects.models import Project
-        status_ct = ContentType.objects.get_for_model(
-            Status)
+        entries = public_stream.get_entries(self.public_activities())
+        ids = [activity_id for activity_id, project_id in entries[:10]]
+        activities = Activity.objects.in_bulk(ids)
+        return prefetch_activities([activities[activity_id]
+            for activity_id in ids if activity_id in activities],
+            show_actor=True)
+
+    def public_activities(self):
+        """Activities of the listed projects shown to everyone."""
         return Activity.objects.filter(deleted=False,
             scope_object__isnull=False,
             scope_object__not_listed=False,
             scope_object__deleted=False,
             scope_object__test=False).exclude(
-            models.Q(target_content_type=remote_object_ct)
-            | models.Q(target_content_type=status_ct)
-            | models.Q(verb=schema.verbs['follow'])).order_by(
-            '-created_on')[:10]
+            target_content_type__in=self.hidden_target_types()).exclude(
+            verb=schema.verbs['follow']).order_by('-created_on')
+
+    def hidden_target_types(self):
+        """Content types of the targets not shown in public."""
+        from statuses.models import Status
+        return [ContentType.objects.get_for_model(RemoteObject),
+            ContentType.objects.get_for_model(Status)]
 
     def dashboard(self, user):
         """
         Given a user, return a list of activities to show on their dashboard.
         """
+        if settings.ACTIVITY_TIMELINES:
+            return self.timeline(user)
+        return self.following(user)
+
+    def timeline(self, user):
+        """Activities of the user's materialized timeline
+        (see activity.timelines)."""
+        from projects.models import Project
+        return Activity.objects.filter(timeline_entries__owner=user,
+            deleted=False).select_related('actor', 'target_object',
+            'scope_object').exclude(
+            scope_object__category=Project.CHALLENGE).exclude(
+            scope_object__deleted=True).order_by(
+            '-timeline_entries__created_on')
+
+    def following(self, user):
+        """Activities of the user, the users they follow and the projects
+        they follow."""
         projects_following = user.following(model='Project')
         users_following = user.following()
         project_ids = [p.pk for p in projects_following]
@@ -102,6 +145,19 @@ class Activity(ModelBase):
         return reverse('activity_index',
             kwargs={'activity_id': self.pk})
 
+    def is_public(self):
+        """Whether the activity is one of ActivityManager.public_activities."""
+        if self.deleted or not self.scope_object_id:
+            return False
+        if self.verb == schema.verbs['follow']:
+            return False
+        hidden_type_ids = [ct.id
+            for ct in Activity.objects.hidden_target_types()]
+        if self.target_content_type_id in hidden_type_ids:
+            return False
+        project = self.scope_object
+        return not (project.not_listed or project.deleted or project.test)
+
     def textual_representation(self):
         return _('%(actor)s %(verb)s %(target)s') % dict(
                 actor=self.actor, verb=self.friendly_verb(),
@@ -115,10 +171,18 @@ class Activity(ModelBase):
         return verb
 
     def html_representation(self):
-        return render_to_string('activity/_activity_body.html', {
-            'activity': self,
-            'show_actor': True,
-        })
+        return self.get_fragment(show_actor=True)
+
+    def body_html(self):
+        """Html of the activity shown after its actor on the walls."""
+        return self.get_fragment(show_actor=False)
+
+    def get_fragment(self, show_actor):
+        rendered = self.__dict__.setdefault('_fragments', {})
+        if show_actor not in rendered:
+            rendered[show_actor] = fragments.render_activities([self],
+                show_actor)[self.id]
+        return mark_safe(rendered[show_actor])
 
     def __unicode__(self):
         return _('wall activity from %s') % self.actor
@@ -150,14 +214,9 @@ class Activity(ModelBase):
         return False
 
     def get_comment_url(self, comment, user):
-        comment_index = 0
         abs_reply_to = comment.abs_reply_to or comment
-        for first_level_comment in self.first_level_comments():
-            if abs_reply_to.id == first_level_comment.id:
-                break
-            comment_index += 1
-        items_per_page = settings.PAGINATION_DEFAULT_ITEMS_PER_PAGE
-        page = (comment_index / items_per_page) + 1
+        page = get_page_number(self.first_level_comments(), abs_reply_to,
+            '-created_on')
         url = self.get_absolute_url()
         return url + '?pagination_page_number=%s#%s' % (
             page, comment.id)
@@ -187,6 +246,19 @@ class Activity(ModelBase):
             return recipients.values()
 
 
+class TimelineEntry(models.Model):
+    """An activity shown on the dashboard of ``owner``. Entries are added
+    when activities are created (see activity.timelines)."""
+    owner = models.ForeignKey('users.UserProfile',
+        related_name='timeline_entries')
+    activity = models.ForeignKey(Activity, related_name='timeline_entries')
+    # copied from the activity, the timeline is read in this order
+    created_on = models.DateTimeField()
+
+    class Meta:
+        unique_together = (('owner', 'activity'),)
+
+
 class RemoteObject(models.Model):
     """Represents an object originating from another system."""
     object_type = models.URLField(verify_exists=False)
@@ -211,3 +283,51 @@ class RemoteObject(models.Model):
         return activities.filter(target_content_type=ct)
 
 register_filter('subscriptions', RemoteObject.filter_activities)
+
+
+###########
+# Signals #
+###########
+
+
+def fan_out_activity(sender, **kwargs):
+    activity = kwargs.get('instance', None)
+    created = kwargs.get('created', False)
+    if not created or not settings.ACTIVITY_TIMELINES:
+        return
+    from activity.tasks import FanOutActivity
+    FanOutActivity.apply_async(args=(activity.id,))
+
+post_save.connect(fan_out_activity, sender=Activity,
+    dispatch_uid='activity_fan_out_activity')
+
+
+def update_public_stream(sender, **kwargs):
+    activity = kwargs.get('instance', None)
+    if activity.is_public():
+        public_stream.add_activity(activity)
+    else:
+        public_stream.remove_activity(activity.id)
+
+post_save.connect(update_public_stream, sender=Activity,
+    dispatch_uid='activity_update_public_stream')
+
+
+def remove_from_public_stream(sender, **kwargs):
+    activity = kwargs.get('instance', None)
+    public_stream.remove_activity(activity.id)
+
+post_delete.connect(remove_from_public_stream, sender=Activity,
+    dispatch_uid='activity_remove_from_public_stream')
+
+
+def bump_fragment_version(sender, **kwargs):
+    opts = sender._meta
+    label = '%s.%s' % (opts.app_label, opts.object_name.lower())
+    if label in fragments.VERSIONED_MODELS:
+        fragments.bump_version(kwargs['instance'])
+
+post_save.connect(bump_fragment_version,
+    dispatch_uid='activity_bump_fragment_version')
+post_delete.connect(bump_fragment_version,
+    dispatch_uid='activity_bump_fragment_version_delete')
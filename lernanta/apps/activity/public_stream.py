@@ -0,0 +1,67 @@
+"""Cached public activity stream shown on the splash page.
+
+The ids of the newest public activities (see
+ActivityManager.public_activities) are kept in the cache with the ids of
+their projects. Public activities are added when saved and removed when
+deleted or hidden (see the signals at the end of activity.models). The
+activities of a project are removed when it is hidden, and the whole
+list is dropped when a project is shown again (see projects.models), to
+be read again on the next request.
+"""
+from django.core.cache import cache
+
+STREAM_KEY = 'activity_public_stream'
+
+# Activities kept in the cache, more than shown so a few removals do not
+# empty the stream.
+STREAM_LENGTH = 20
+
+STREAM_TIMEOUT = 60 * 60 * 24
+
+
+def get_entries(queryset):
+    """Returns the (activity id, project id) pairs of the stream, reading
+    them from ``queryset`` (newest first) when they are not cached."""
+    entries = cache.get(STREAM_KEY)
+    if entries is None:
+        entries = list(queryset.values_list('id',
+            'scope_object')[:STREAM_LENGTH])
+        cache.set(STREAM_KEY, entries, STREAM_TIMEOUT)
+    return entries
+
+
+def add_activity(activity):
+    entries = cache.get(STREAM_KEY)
+    if entries is None:
+        return
+    entries = [(activity.id, activity.scope_object_id)] + [entry
+        for entry in entries if entry[0] != activity.id]
+    entries.sort(reverse=True)
+    cache.set(STREAM_KEY, entries[:STREAM_LENGTH],
+        STREAM_TIMEOUT)
+
+
+def remove_entries(index, value):
+    entries = cache.get(STREAM_KEY)
+    if entries is None:
+        return
+    remaining = [entry for entry in entries if entry[index] != value]
+    if len(remaining) == len(entries):
+        return
+    if len(remaining) < STREAM_LENGTH / 2:
+        invalidate()
+    else:
+        cache.set(STREAM_KEY, remaining, STREAM_TIMEOUT)
+
+
+def remove_activity(activity_id):
+    remove_entries(0, activity_id)
+
+
+def remove_project(project_id):
+    """Removes the activities of a project that is not public anymore."""
+    remove_entries(1, project_id)
+
+
+def invalidate():
+    cache.delete(STREAM_KEY)
@@ -0,0 +1,40 @@
+from celery.task import Task
+
+from activity.models import Activity
+from users.models import UserProfile
+from activity import timelines
+
+
+class FanOutActivity(Task):
+    """Adds a new activity to the dashboard timelines it belongs to."""
+    name = 'activity.tasks.FanOutActivity'
+
+    max_retries = 3
+    default_retry_delay = 10
+
+    def run(self, activity_id, **kwargs):
+        log = self.get_logger(**kwargs)
+        try:
+            activity = Activity.objects.get(id=activity_id)
+        except Activity.DoesNotExist:
+            # the transaction creating it might not be committed yet
+            self.retry([activity_id], kwargs)
+        count = timelines.fan_out(activity)
+        log.debug('activity {0} added to {1} timelines'.format(
+            activity_id, count))
+
+
+class RebuildTimeline(Task):
+    """Rebuilds the dashboard timeline of a user after a change in the
+    users or projects they follow."""
+    name = 'activity.tasks.RebuildTimeline'
+
+    def run(self, profile_id, **kwargs):
+        log = self.get_logger(**kwargs)
+        try:
+            profile = UserProfile.objects.get(id=profile_id)
+        except UserProfile.DoesNotExist:
+            return
+        count = timelines.rebuild_timeline(profile)
+        log.debug('timeline of {0} rebuilt with {1} activities'.format(
+            profile.username, count))
@@ -0,0 +1,360 @@
+import datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client
+
+from test_utils import TestCase
+
+from drumbeat.testing import LocalCacheMixin
+
+from activity import feeds, fragments, public_stream, timelines
+from activity.models import Activity, TimelineEntry, prefetch_activities
+from activity.schema import verbs
+from content.models import Page
+from projects.models import Project
+from relationships.models import Relationship
+from replies.models import PageComment
+from statuses.models import Status
+from users.models import create_profile
+
+
+class ActivityFragmentTests(LocalCacheMixin, TestCase):
+
+    cached_modules = (fragments,)
+
+    def setUp(self):
+        django_user = User(username='fragments', email='fragments@p2pu.org')
+        self.user = create_profile(django_user)
+        self.user.set_password('testpass')
+        self.user.save()
+        self.project = Project(name='Fragments Project',
+            short_description='This project has activities',
+            long_description='No really, its good')
+        self.project.save()
+        self.page = Page(title='Commented task', content='Task',
+            project=self.project, author=self.user)
+        self.page.save()
+        comment = PageComment(content='A comment', author=self.user,
+            page_object=self.page, scope_object=self.project)
+        comment.save()
+        self.activity = Activity.objects.filter(verb=verbs['post'],
+            target_id=comment.id).latest('id')
+
+    def render(self):
+        activity = Activity.objects.get(id=self.activity.id)
+        return fragments.render_activities([activity], False)[activity.id]
+
+    def get_fragment_key(self):
+        activity = Activity.objects.get(id=self.activity.id)
+        commented_objects = fragments.get_commented_objects([activity])
+        versions = fragments.get_versions(fragments.get_dependency_keys(
+            activity, commented_objects))
+        return fragments.get_fragment_key(activity, False, versions,
+            commented_objects)
+
+    def test_fragment_cached(self):
+        """Test that a rendered fragment is read from the cache"""
+        self.assertTrue('Commented task' in self.render())
+        fragments.cache.set(self.get_fragment_key(), 'cached fragment')
+        self.assertEqual(self.render(), 'cached fragment')
+
+    def test_commented_object_stamp(self):
+        """Test that changing the commented page replaces the fragments
+        of the activities on its comments"""
+        self.render()
+        key = self.get_fragment_key()
+        fragments.cache.set(key, 'cached fragment')
+        self.page.title = 'Renamed task'
+        self.page.save()
+        self.assertNotEqual(self.get_fragment_key(), key)
+        self.assertTrue('Renamed task' in self.render())
+
+
+class TimelineTests(TestCase):
+
+    def setUp(self):
+        self.timelines = settings.ACTIVITY_TIMELINES
+        settings.ACTIVITY_TIMELINES = True
+        profiles = []
+        for username in ('actor', 'follower'):
+            django_user = User(username=username,
+                email='%s@p2pu.org' % username)
+            profile = create_profile(django_user)
+            profile.set_password('testpass')
+            profile.save()
+            profiles.append(profile)
+        self.actor, self.follower = profiles
+        self.project = Project(name='Timeline Project',
+            short_description='This project has activities',
+            long_description='No really, its good')
+        self.project.save()
+
+    def tearDown(self):
+        settings.ACTIVITY_TIMELINES = self.timelines
+
+    def add_activity(self, created_on=None):
+        activity = Activity(actor=self.actor, verb=verbs['post'],
+            target_object=self.project, scope_object=self.project)
+        activity.save()
+        if created_on:
+            Activity.objects.filter(id=activity.id).update(
+                created_on=created_on)
+            activity.created_on = created_on
+        return activity
+
+    def get_entry_ids(self, profile):
+        return sorted(TimelineEntry.objects.filter(
+            owner=profile).values_list('id', flat=True))
+
+    def test_archived_project_followers(self):
+        """Test that the followers of archived projects do not get their
+        activities"""
+        Relationship(source=self.follower, target_project=self.project).save()
+        activity = self.add_activity()
+        self.assertTrue(self.follower.id in
+            timelines.get_recipient_ids(activity))
+        self.project.archived = True
+        self.project.save()
+        self.assertFalse(self.follower.id in
+            timelines.get_recipient_ids(activity))
+
+    def test_rebuild_on_follow_changes(self):
+        """Test that timelines are rebuilt only when following or
+        unfollowing"""
+        self.add_activity()
+        relationship = Relationship(source=self.follower,
+            target_user=self.actor)
+        relationship.save()
+        entry_ids = self.get_entry_ids(self.follower)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.follower,
+            activity__actor=self.actor).exists())
+        relationship.save()
+        self.assertEqual(self.get_entry_ids(self.follower), entry_ids)
+        relationship.deleted = True
+        relationship.save()
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.follower,
+            activity__actor=self.actor).exists())
+
+    def test_trim_timelines(self):
+        """Test that timelines keep their last entries"""
+        start = datetime.datetime(2012, 1, 1)
+        activities = [self.add_activity(start + datetime.timedelta(hours=i))
+            for i in range(12)]
+        TimelineEntry.objects.filter(owner=self.actor).delete()
+        for activity in activities:
+            TimelineEntry(owner=self.actor, activity=activity,
+                created_on=activity.created_on).save()
+        self.assertEqual(timelines.trim_timelines([self.actor.id], 11), 0)
+        self.assertEqual(timelines.trim_timelines([self.actor.id], 10), 2)
+        self.assertEqual(list(TimelineEntry.objects.filter(
+            owner=self.actor).order_by('created_on').values_list(
+            'activity', flat=True)), [activity.id
+            for activity in activities[2:]])
+
+
+class FeedTests(LocalCacheMixin, TestCase):
+
+    cached_modules = (feeds,)
+
+    def setUp(self):
+        self.locale = 'en'
+        self.client = Client()
+        django_user = User(username='feeds', email='feeds@p2pu.org')
+        self.user = create_profile(django_user)
+        self.user.set_password('testpass')
+        self.user.save()
+        self.project = Project(name='Feed Project',
+            short_description='This project has a feed',
+            long_description='No really, its good')
+        self.project.save()
+        self.add_activity(datetime.datetime(2012, 1, 1))
+
+    def add_activity(self, created_on):
+        activity = Activity(actor=self.user, verb=verbs['post'],
+            target_object=self.project, scope_object=self.project)
+        activity.save()
+        Activity.objects.filter(id=activity.id).update(created_on=created_on)
+
+    def get_feed(self, **headers):
+        return self.client.get('/%s/groups/%s/feed/' % (self.locale,
+            self.project.slug), **headers)
+
+    def test_etag(self):
+        """Test that requests with the current ETag get a 304"""
+        response = self.get_feed()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.get_feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.get_feed(HTTP_IF_NONE_MATCH='"other", %s' % etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.get_feed(HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        """Test that requests made after the newest activity get a 304"""
+        response = self.get_feed()
+        last_modified = response['Last-Modified']
+        response = self.get_feed(HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.get_feed(
+            HTTP_IF_MODIFIED_SINCE='Sat, 31 Dec 2011 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_feed_replaced(self):
+        """Test that the cached feed is served until a newer activity is
+        created"""
+        response = self.get_feed()
+        etag = response['ETag']
+        key = feeds.FEED_KEY % etag.strip('"')
+        self.assertEqual(feeds.cache.get(key), response.content)
+        feeds.cache.set(key, 'cached feed')
+        self.assertEqual(self.get_feed().content, 'cached feed')
+        self.add_activity(datetime.datetime(2012, 1, 2))
+        response = self.get_feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotEqual(response.content, 'cached feed')
+
+
+class PublicStreamTests(LocalCacheMixin, TestCase):
+
+    cached_modules = (public_stream,)
+
+    def setUp(self):
+        django_user = User(username='public', email='public@p2pu.org')
+        self.user = create_profile(django_user)
+        self.user.set_password('testpass')
+        self.user.save()
+        self.projects = []
+        for i in range(2):
+            project = Project(name='Public Project %s' % i,
+                short_description='This project is public',
+                long_description='No really, its good')
+            project.save()
+            self.projects.append(project)
+
+    def add_activity(self, project):
+        activity = Activity(actor=self.user, verb=verbs['post'],
+            target_object=project, scope_object=project)
+        activity.save()
+        return activity
+
+    def get_cached_ids(self):
+        entries = public_stream.cache.get(public_stream.STREAM_KEY)
+        if entries is None:
+            return None
+        return [activity_id for activity_id, project_id in entries]
+
+    def fill_stream(self):
+        """Caches a full stream older than the saved activities,
+        alternating the two projects."""
+        entries = [(-i, self.projects[i % 2].id)
+            for i in range(1, public_stream.STREAM_LENGTH + 1)]
+        public_stream.cache.set(public_stream.STREAM_KEY, entries)
+        return entries
+
+    def test_add_remove(self):
+        """Test that public activities are added to the cached stream and
+        removed when deleted or hidden"""
+        first = self.add_activity(self.projects[0])
+        self.assertEqual(self.get_cached_ids(), None)
+        self.assertEqual([activity.id
+            for activity in Activity.objects.public()], [first.id])
+        self.assertEqual(self.get_cached_ids(), [first.id])
+        self.fill_stream()
+        second = self.add_activity(self.projects[1])
+        self.assertEqual(self.get_cached_ids()[0], second.id)
+        self.assertEqual(len(self.get_cached_ids()),
+            public_stream.STREAM_LENGTH)
+        second.deleted = True
+        second.save()
+        self.assertFalse(second.id in self.get_cached_ids())
+        third = self.add_activity(self.projects[0])
+        self.assertEqual(self.get_cached_ids()[0], third.id)
+        third.delete()
+        self.assertFalse(third.id in self.get_cached_ids())
+
+    def test_half_empty_invalidation(self):
+        """Test that the stream is read again when less than half of it
+        is left"""
+        entries = self.fill_stream()[:public_stream.STREAM_LENGTH / 2]
+        public_stream.cache.set(public_stream.STREAM_KEY, entries)
+        public_stream.remove_activity(0)
+        self.assertEqual(len(self.get_cached_ids()), len(entries))
+        public_stream.remove_activity(entries[0][0])
+        self.assertEqual(self.get_cached_ids(), None)
+
+    def test_project_flags(self):
+        """Test that hiding a project removes its activities from the
+        stream and showing it again drops the stream"""
+        entries = self.fill_stream()
+        project = self.projects[0]
+        project.short_description = 'Still public'
+        project.save()
+        self.assertEqual(len(self.get_cached_ids()), len(entries))
+        project.not_listed = True
+        project.save()
+        self.assertEqual(self.get_cached_ids(), [activity_id
+            for activity_id, project_id in entries
+            if project_id != project.id])
+        project.save()
+        self.assertEqual(len(self.get_cached_ids()), len(entries) / 2)
+        project.not_listed = False
+        project.save()
+        self.assertEqual(self.get_cached_ids(), None)
+
+
+class PrefetchTests(LocalCacheMixin, TestCase):
+
+    cached_modules = (fragments,)
+
+    def setUp(self):
+        django_user = User(username='prefetch', email='prefetch@p2pu.org')
+        self.user = create_profile(django_user)
+        self.user.set_password('testpass')
+        self.user.save()
+        self.project = Project(name='Prefetch Project',
+            short_description='This project has a wall',
+            long_description='No really, its good')
+        self.project.save()
+        self.add_activities()
+
+    def add_activities(self):
+        """Adds activities on a page, a comment and a status."""
+        page = Page(title='Walled task', content='Task',
+            project=self.project, author=self.user)
+        page.save()
+        PageComment(content='A comment', author=self.user,
+            page_object=page, scope_object=self.project).save()
+        Status(author=self.user, project=self.project,
+            status='A status').save()
+
+    def load_wall(self):
+        activities = prefetch_activities(Activity.objects.filter(
+            scope_object=self.project).order_by('-created_on'))
+        for activity in activities:
+            self.assertEqual(activity.actor, self.user)
+            self.assertEqual(activity.scope_object, self.project)
+            target = activity.target_object
+            self.assertTrue(target is not None)
+            if isinstance(target, PageComment):
+                self.assertEqual(target.scope_object, self.project)
+                self.assertEqual(target.page_object.title, 'Walled task')
+        return activities
+
+    def test_wall_queries(self):
+        """Test that the queries of a page of activities do not depend on
+        its number of activities"""
+        # the wall, its actors and scopes, one query per target type (pages,
+        # comments and statuses), the pages and scopes of the comments
+        # and the commented objects of the fragments
+        queries = 1 + 2 + 3 + 2 + 1
+        # renders the fragments and loads the content types
+        self.assertEqual(len(self.load_wall()), 3)
+        self.assertNumQueries(queries, self.load_wall)
+        self.add_activities()
+        self.assertEqual(len(self.load_wall()), 6)
+        self.assertNumQueries(queries, self.load_wall)
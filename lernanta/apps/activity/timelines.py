@@ -0,0 +1,98 @@
+"""Materialized dashboard timelines.
+
+Instead of looking up the activities of everything a user follows on each
+dashboard request, every new activity is copied as a TimelineEntry to the
+timeline of its actor, of the actor's followers and of the followers of
+its project by the FanOutActivity task. Timelines are rebuilt from the
+relationships when a user follows or stops following something, and for
+all the users by the rebuild_timelines command.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from drumbeat.utils import bulk_insert
+from activity.models import Activity, TimelineEntry
+from relationships.models import Relationship
+from users.models import UserProfile
+
+
+def get_recipient_ids(activity):
+    """Ids of the users whose timeline shows ``activity``."""
+    recipient_ids = set([activity.actor_id])
+    followers = Relationship.objects.filter(target_user=activity.actor_id,
+        deleted=False, source__deleted=False)
+    recipient_ids.update(followers.values_list('source_id', flat=True))
+    if activity.scope_object_id:
+        # archived projects are not shown as followed
+        followers = Relationship.objects.filter(
+            target_project=activity.scope_object_id,
+            target_project__archived=False, deleted=False,
+            source__deleted=False)
+        recipient_ids.update(followers.values_list('source_id', flat=True))
+    return recipient_ids
+
+
+@transaction.commit_on_success
+def fan_out(activity):
+    """Adds ``activity`` to the timelines it belongs to. Returns the
+    number of entries added."""
+    recipient_ids = get_recipient_ids(activity)
+    recipient_ids.difference_update(TimelineEntry.objects.filter(
+        activity=activity).values_list('owner_id', flat=True))
+    rows = [(owner_id, activity.id, activity.created_on)
+        for owner_id in recipient_ids]
+    bulk_insert(TimelineEntry, ('owner_id', 'activity_id', 'created_on'),
+        rows)
+    trim_timelines(recipient_ids)
+    return len(rows)
+
+
+def trim_timelines(owner_ids, length=None):
+    """Removes the entries of the timelines of ``owner_ids`` older than
+    their last ``length`` ones. Timelines are trimmed once they are a
+    tenth longer, so they are not trimmed on every fan out. Returns the
+    number of entries removed."""
+    length = length or settings.ACTIVITY_TIMELINE_LENGTH
+    if not owner_ids:
+        return 0
+    counts = TimelineEntry.objects.filter(owner__in=owner_ids).values(
+        'owner').annotate(Count('id')).values_list('owner', 'id__count')
+    removed = 0
+    for owner_id, count in counts:
+        if count <= length + length / 10:
+            continue
+        entries = TimelineEntry.objects.filter(owner=owner_id)
+        last_kept = entries.order_by('-created_on').values_list(
+            'created_on', flat=True)[length - 1]
+        old_entries = entries.filter(created_on__lt=last_kept)
+        removed += old_entries.count()
+        old_entries.delete()
+    return removed
+
+
+@transaction.commit_on_success
+def rebuild_timeline(profile, length=None):
+    """Replaces the timeline of ``profile`` by its last ``length``
+    activities computed from the relationships."""
+    length = length or settings.ACTIVITY_TIMELINE_LENGTH
+    activities = Activity.objects.following(profile).values_list('id',
+        'created_on')[:length]
+    TimelineEntry.objects.filter(owner=profile).delete()
+    rows = [(profile.id, activity_id, created_on)
+        for activity_id, created_on in activities]
+    bulk_insert(TimelineEntry, ('owner_id', 'activity_id', 'created_on'),
+        rows)
+    return len(rows)
+
+
+def rebuild_timelines(profiles=None, length=None):
+    """Rebuilds the timelines of ``profiles`` (all the users if None).
+    Returns the number of timelines rebuilt."""
+    if profiles is None:
+        profiles = UserProfile.objects.filter(deleted=False)
+    count = 0
+    for profile in profiles.iterator():
+        rebuild_timeline(profile, length)
+        count += 1
+    return count
@@ -8,13 +8,13 @@ from django.utils.translation import ugettext_lazy as _
 from django.db.models import Max
 from django.contrib.sites.models import Site
 from django.contrib.contenttypes import generic
-from django.conf import settings
 
 from drumbeat.models import ModelBase
 from activity.models import Activity
 from activity.schema import verbs, object_types
 from notifications.models import send_notifications_i18n
 from richtext.models import RichTextField
+from pagination.views import get_page_number
 from replies.models import PageComment
 from badges.models import Submission, Award
 
@@ -132,14 +132,9 @@ class Page(ModelBase):
         return all(conditions)
 
     def get_comment_url(self, comment, user):
-        comment_index = 0
         abs_reply_to = comment.abs_reply_to or comment
-        for first_level_comment in self.first_level_comments():
-            if abs_reply_to.id == first_level_comment.id:
-                break
-            comment_index += 1
-        items_per_page = settings.PAGINATION_DEFAULT_ITEMS_PER_PAGE
-        page = (comment_index / items_per_page) + 1
+        page = get_page_number(self.first_level_comments(), abs_reply_to,
+            '-created_on')
         url = self.get_absolute_url()
         return url + '?pagination_page_number=%s#%s' % (
             page, comment.id)
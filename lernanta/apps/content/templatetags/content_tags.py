@@ -2,9 +2,9 @@ from django import template
 from django.template.loader import render_to_string
 
 from content.forms import TaskLinkSubmitForm, TaskBadgeApplyForm
-from content.models import Page
 from replies.models import PageComment
-from projects.models import PerUserTaskCompletion
+from projects.models import PerUserTaskCompletion, get_task_progress
+from projects.models import count_tasks
 from badges.models import Badge, Submission, Award
 
 
@@ -13,11 +13,8 @@ register = template.Library()
 
 def task_toggle_completion(request, page, ignore_post_data=False):
     project = page.project
-    total_count = Page.objects.filter(project__slug=project.slug, listed=True,
-        deleted=False).count()
     ajax_data = {
         'upon_completion_redirect': page.project.get_absolute_url(),
-        'total_count': total_count,
     }
     progressbar_value = 0
     task_completion = None
@@ -28,11 +25,10 @@ def task_toggle_completion(request, page, ignore_post_data=False):
     badges_to_apply = list(page.badges_to_apply.order_by('id'))
     if request.user.is_authenticated():
         profile = request.user.get_profile()
-        ajax_data['completed_count'] = PerUserTaskCompletion.objects.filter(
-            page__project__slug=project.slug, page__deleted=False,
-            unchecked_on__isnull=True, user=profile).count()
-        if total_count:
-            progressbar_value = (ajax_data['completed_count'] * 100 / total_count)
+        progress = get_task_progress(project, profile)
+        ajax_data['total_count'] = progress.total
+        ajax_data['completed_count'] = progress.completed
+        progressbar_value = progress.percentage()
         try:
             task_completion = PerUserTaskCompletion.objects.filter(
                 user=profile, page=page, unchecked_on__isnull=True)[0]
@@ -95,6 +91,8 @@ def task_toggle_completion(request, page, ignore_post_data=False):
                 badge.applied = False
             elegible = badge.is_eligible(profile)
             badge.show_apply = (not badge.awarded and not badge.applied and elegible)
+    else:
+        ajax_data['total_count'] = count_tasks(project)
 
     ajax_data.update({
         'stay_on_page': bool(task_link_submit_form or task_badge_apply_form),
@@ -1,9 +1,13 @@
+import datetime
+
+from django.conf import settings
 from django.test import Client
 from django.contrib.auth.models import User
 
 from users.models import create_profile
 from projects.models import Project, Participation
 from content.models import Page
+from replies.models import PageComment
 
 from test_utils import TestCase
 
@@ -63,3 +67,34 @@ class PageTests(TestCase):
 
         self.assertTrue(page1.index < page3.index)
         self.assertTrue(page3.index < page2.index)
+
+    def test_get_comment_url(self):
+        """Test that the page of a comment is the one found by going
+        through the comments before it"""
+        page = self.project.pages.all()[0]
+        items_per_page = settings.PAGINATION_DEFAULT_ITEMS_PER_PAGE
+        start = datetime.datetime(2012, 1, 1)
+        comments = []
+        for i in xrange(items_per_page * 2 + 3):
+            comment = PageComment(content='Comment %s' % i,
+                author=self.user, page_object=page,
+                scope_object=self.project)
+            comment.save()
+            comment.created_on = start + datetime.timedelta(minutes=i)
+            PageComment.objects.filter(id=comment.id).update(
+                created_on=comment.created_on)
+            comments.append(comment)
+        reply = PageComment(content='Reply', author=self.user,
+            page_object=page, scope_object=self.project,
+            reply_to=comments[2], abs_reply_to=comments[2])
+        reply.save()
+        first_level_ids = list(page.first_level_comments().values_list(
+            'id', flat=True))
+        for comment in comments + [reply]:
+            abs_reply_to = comment.abs_reply_to or comment
+            comment_index = first_level_ids.index(abs_reply_to.id)
+            expected = page.get_absolute_url() + \
+                '?pagination_page_number=%s#%s' % (
+                (comment_index / items_per_page) + 1, comment.id)
+            self.assertEqual(page.get_comment_url(comment, self.user),
+                expected)
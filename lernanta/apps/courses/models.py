@@ -11,6 +11,7 @@ from courses import db
 from content2 import models as content_model
 from replies import models as comment_model
 from learn import models as learn_model
+from learn import sync as learn_sync
 from media import models as media_model
 from notifications import models as notification_model
 
@@ -203,36 +204,42 @@ def update_course(course_uri, title=None, hashtag=None, description=None, langua
 
 
 def update_course_learn_api(course_uri):
-    """ send updated course info to the learn API to update course listing """
-    course_db = _get_course_db(course_uri)
+    """ schedule an update of the course listing in the learn API """
     try:
-        learn_model.update_course_listing(**get_course_learn_api_data(course_uri))
+        learn_sync.schedule_sync('course', course_uri)
     except:
-        log.error("Could not update learn index information!")
+        log.error('Could not update course info in the learn API')
+
+
+def sync_course_learn_api(course_uri):
+    """ send updated course info to the learn API to update course listing """
+    learn_model.sync_course_listing(**get_course_learn_api_data(course_uri))
+
+learn_sync.register_sync('course', sync_course_learn_api)
 
 
 def get_course_learn_api_data(course_uri):
     """ return data used by the learn API to list courses """
-    course = get_course(course_uri)
+    course_db = _get_course_db(course_uri)
 
     course_url = reverse(
         'courses_slug_redirect',
-        kwargs={'course_id': course["id"]}
+        kwargs={'course_id': course_db.id}
     )
-    data_url = reverse('courses_learn_api_data', kwargs={'course_id': course["id"]})
+    data_url = reverse('courses_learn_api_data', kwargs={'course_id': course_db.id})
 
     learn_api_data = {
         "course_url": course_url,
-        "title": course['title'],
-        "description": course['description'],
+        "title": course_db.title,
+        "description": course_db.description,
         "data_url": data_url,
-        "language": course['language'],
+        "language": course_db.language,
         "thumbnail_url": "",
         "tags": get_course_tags(course_uri)
     }
 
-    if 'image_uri' in course:
-        learn_api_data["thumbnail_url"] = media_model.get_image(course['image_uri'])['url']
+    if len(course_db.image_uri) > 0:
+        learn_api_data["thumbnail_url"] = media_model.get_image(course_db.image_uri)['url']
 
     return learn_api_data
 
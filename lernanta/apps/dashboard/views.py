@@ -93,6 +93,7 @@ def dashboard(request):
         'domain': Site.objects.get_current().domain,
         'dashboard_url': reverse('dashboard'),
     }
-    context.update(get_pagination_context(request, activities))
+    context.update(get_pagination_context(request, activities,
+        order_field='-created_on'))
     return render_to_response('dashboard/dashboard.html', context,
         context_instance=RequestContext(request))
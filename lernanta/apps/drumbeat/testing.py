@@ -0,0 +1,22 @@
+from django.core.cache import get_cache
+
+
+class LocalCacheMixin(object):
+    """Gives the ``cached_modules`` a local memory cache while each test
+    runs, for the code that only keeps its data in a real cache (the
+    tests run with the dummy cache). Goes before TestCase in the bases."""
+
+    cached_modules = ()
+
+    def _pre_setup(self):
+        super(LocalCacheMixin, self)._pre_setup()
+        self._module_caches = [(module, module.cache)
+            for module in self.cached_modules]
+        self.cache = get_cache('locmem://')
+        for module in self.cached_modules:
+            module.cache = self.cache
+
+    def _post_teardown(self):
+        for module, cache in self._module_caches:
+            module.cache = cache
+        super(LocalCacheMixin, self)._post_teardown()
@@ -3,9 +3,12 @@ import re
 import math
 import hashlib
 import unicodedata
+from collections import defaultdict
 
 from django.core.validators import ValidationError, validate_slug
 from django.utils.encoding import smart_unicode
+from django.db import connection
+from django.contrib.contenttypes.models import ContentType
 
 
 # Extra characters outside of alphanumerics that we'll allow.
@@ -53,6 +56,101 @@ def safe_filename(filename):
     return "%s%s" % (hashlib.md5(name.encode('utf8')).hexdigest(), ext)
 
 
+def bulk_insert(model, columns, rows, chunk_size=500):
+    """
+    Insert ``rows`` (sequences of values ordered as ``columns``) into the
+    table of ``model`` using multi-row INSERT statements of at most
+    ``chunk_size`` rows. Model save() and signals are bypassed.
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    column_names = ', '.join([qn(column) for column in columns])
+    row_placeholder = '(%s)' % ', '.join(['%s'] * len(columns))
+    cursor = connection.cursor()
+    rows = list(rows)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        params = []
+        for row in chunk:
+            params.extend(row)
+        sql = 'INSERT INTO %s (%s) VALUES %s' % (table, column_names,
+            ', '.join([row_placeholder] * len(chunk)))
+        cursor.execute(sql, params)
+
+
+def iter_keyset(queryset, fields, chunk_size=5000):
+    """
+    Iterate over the ``fields`` of the rows of ``queryset`` in primary key
+    order, fetching ``chunk_size`` rows per query with a ``pk > last``
+    condition instead of an OFFSET. Each row is a tuple starting with the
+    primary key followed by ``fields``.
+    """
+    queryset = queryset.order_by('pk').values_list('pk', *fields)
+    last_pk = None
+    while True:
+        chunk = queryset
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def prefetch_foreign_keys(objects, *names):
+    """
+    Load the ``names`` foreign keys of ``objects`` (instances of the same
+    model) with one ``in_bulk`` query per field, skipping the objects
+    where they are already cached. Returns the objects as a list.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    for name in names:
+        field = objects[0]._meta.get_field(name)
+        cache_name = field.get_cache_name()
+        pending = [obj for obj in objects if not hasattr(obj, cache_name)]
+        ids = set(getattr(obj, field.attname) for obj in pending)
+        ids.discard(None)
+        related = field.rel.to._default_manager.in_bulk(list(ids))
+        for obj in pending:
+            setattr(obj, cache_name, related.get(getattr(obj, field.attname)))
+    return objects
+
+
+def prefetch_generic_objects(objects, name):
+    """
+    Load the objects of the ``name`` GenericForeignKey of ``objects``
+    (instances of the same model) with one ``in_bulk`` query per content
+    type. Returns the objects as a list.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    field = getattr(objects[0].__class__, name)
+    ct_attname = objects[0]._meta.get_field(field.ct_field).get_attname()
+    ids_by_type = defaultdict(set)
+    for obj in objects:
+        ct_id, object_id = getattr(obj, ct_attname), getattr(obj,
+            field.fk_field)
+        if ct_id and object_id is not None:
+            ids_by_type[ct_id].add(object_id)
+    found = {}
+    for ct_id, ids in ids_by_type.iteritems():
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        if model is None:
+            continue
+        for pk, related in model._default_manager.in_bulk(
+                list(ids)).iteritems():
+            found[(ct_id, pk)] = related
+    for obj in objects:
+        setattr(obj, field.cache_attr, found.get((getattr(obj, ct_attname),
+            getattr(obj, field.fk_field))))
+    return objects
+
+
 class MultiQuerySet(object):
     # http://djangosnippets.org/snippets/1103/
 
@@ -0,0 +1,174 @@
+"""In-memory index of the listed courses, used to filter the catalogue.
+
+Every process keeps the ids of the listed courses grouped by tag,
+language and list, and answers the catalogue filters by intersecting
+those sets instead of querying the tag and list tables. The index is
+built with three queries and then kept up to date course by course: the
+signals at the end of learn.models mark the changed courses, which are
+read again before the next lookup. A counter in the cache is increased on
+every change so the other processes rebuild their index. Changes seen
+before their transaction was committed or rolled back are fixed by
+rebuilding the index every REBUILD_INTERVAL seconds.
+"""
+import time
+import threading
+
+from django.core.cache import cache
+
+from learn import db
+
+VERSION_KEY = 'learn_catalogue_version'
+VERSION_TIMEOUT = 60 * 60 * 24 * 7
+REBUILD_INTERVAL = 60 * 5
+
+
+class CatalogueIndex(object):
+
+    def __init__(self):
+        self.version = None
+        self.built_on = 0
+        self.courses = set()
+        self.tags = {}
+        self.languages = {}
+        self.lists = {}
+        # reverse maps, to take a course out of its sets
+        self.course_tags = {}
+        self.course_language = {}
+        self.course_lists = {}
+        self.dirty = set()
+
+    def _add(self, groups, course_groups, course_id, name):
+        groups.setdefault(name, set()).add(course_id)
+        course_groups.setdefault(course_id, set()).add(name)
+
+    def _discard(self, course_id):
+        self.courses.discard(course_id)
+        for groups, course_groups in ((self.tags, self.course_tags),
+                (self.lists, self.course_lists)):
+            for name in course_groups.pop(course_id, ()):
+                groups[name].discard(course_id)
+                if not groups[name]:
+                    del groups[name]
+        language = self.course_language.pop(course_id, None)
+        if language is not None:
+            self.languages[language].discard(course_id)
+            if not self.languages[language]:
+                del self.languages[language]
+
+    def _load(self, courses, tags, entries):
+        for course_id, language in courses:
+            self.courses.add(course_id)
+            self.languages.setdefault(language, set()).add(course_id)
+            self.course_language[course_id] = language
+        for course_id, tag in tags:
+            self._add(self.tags, self.course_tags, course_id, tag)
+        for course_id, list_name in entries:
+            self._add(self.lists, self.course_lists, course_id, list_name)
+
+    def _read(self, course_ids=None):
+        courses = db.Course.objects.filter(date_removed__isnull=True)
+        tags = db.CourseTags.objects.filter(course__date_removed__isnull=True)
+        entries = db.CourseListEntry.objects.filter(
+            course__date_removed__isnull=True)
+        if course_ids is not None:
+            courses = courses.filter(id__in=course_ids)
+            tags = tags.filter(course__in=course_ids)
+            entries = entries.filter(course__in=course_ids)
+        self._load(courses.values_list('id', 'language'),
+            tags.values_list('course_id', 'tag'),
+            entries.values_list('course_id', 'course_list__name'))
+
+    def rebuild(self, version):
+        self.__init__()
+        self._read()
+        self.version = version
+        self.built_on = time.time()
+
+    def refresh(self):
+        """Reads the changed courses again."""
+        course_ids = list(self.dirty)
+        self.dirty.clear()
+        for course_id in course_ids:
+            self._discard(course_id)
+        self._read(course_ids)
+
+    def match(self, tags=(), language='all', list_name=None):
+        """Returns the ids of the listed courses with all the ``tags``,
+        a language starting with ``language`` and in ``list_name`` (when
+        not None)."""
+        groups = [self.tags.get(tag, set()) for tag in tags]
+        if list_name is not None:
+            groups.append(self.lists.get(list_name, set()))
+        if language != 'all':
+            ids = set()
+            for name, course_ids in self.languages.iteritems():
+                if name.startswith(language):
+                    ids.update(course_ids)
+            groups.append(ids)
+        if not groups:
+            return set(self.courses)
+        groups.sort(key=len)
+        return groups[0].intersection(*groups[1:])
+
+    def tag_counts(self, course_ids=None, exclude=(), max_tags=None):
+        """Returns the most used tags among ``course_ids`` (all the listed
+        courses when None) as dicts with the tag and the tagged_count."""
+        counts = []
+        for tag, ids in self.tags.iteritems():
+            if tag in exclude:
+                continue
+            if course_ids is not None:
+                ids = ids.intersection(course_ids)
+            if ids:
+                counts.append({'tag': tag, 'tagged_count': len(ids)})
+        counts.sort(key=lambda count: (-count['tagged_count'], count['tag']))
+        return counts[:max_tags]
+
+
+_index = CatalogueIndex()
+_lock = threading.Lock()
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time()), VERSION_TIMEOUT)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _update_index():
+    # called with the lock held
+    version = get_version()
+    expired = (time.time() - _index.built_on > REBUILD_INTERVAL)
+    if version is None or _index.version != version or expired:
+        _index.rebuild(version)
+    elif _index.dirty:
+        _index.refresh()
+    return _index
+
+
+def match(tags=(), language='all', list_name=None):
+    """See CatalogueIndex.match."""
+    with _lock:
+        return _update_index().match(tags, language, list_name)
+
+
+def tag_counts(course_ids=None, exclude=(), max_tags=None):
+    """See CatalogueIndex.tag_counts."""
+    with _lock:
+        return _update_index().tag_counts(course_ids, exclude, max_tags)
+
+
+def course_changed(course_id):
+    """Marks the course as changed, in this process and the others."""
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # expired, every index is built again
+        return
+    with _lock:
+        if _index.version is not None and version == _index.version + 1:
+            # no other process changed the courses in between
+            _index.version = version
+            _index.dirty.add(course_id)
@@ -2,8 +2,11 @@ import datetime
 
 from django.conf import settings
 from django.db.models import Count
+from django.db.models.signals import post_save, post_delete
 
+from drumbeat.utils import bulk_insert
 from learn import db
+from learn import catalogue
 
 
 def _get_listed_courses():
@@ -29,22 +32,42 @@ def get_active_languages():
     return languages
 
 
+def _get_course_ids(courses):
+    """Ids of ``courses``, all the listed courses when None."""
+    if courses is None:
+        return None
+    ids = getattr(courses, 'catalogue_ids', None)
+    if ids is not None:
+        return ids
+    if hasattr(courses, 'query') and courses.query.can_filter():
+        return set(courses.values_list('id', flat=True))
+    return set([course.id for course in courses])
+
+
+def _get_courses_by_ids(ids, courses=None):
+    """Listed courses with ``ids`` (and in ``courses`` when given), with
+    their ids in catalogue_ids so they can be filtered again without
+    reading them."""
+    course_ids = _get_course_ids(courses)
+    if course_ids is not None:
+        ids = ids.intersection(course_ids)
+    ret = _get_listed_courses().order_by('-date_added').filter(
+        id__in=sorted(ids))
+    ret.catalogue_ids = ids
+    return ret
+
+
 def get_courses_by_language(language, courses=None):
     if language == "all":
         return courses
 
-    lang_courses = _get_listed_courses().order_by('-date_added').filter(language__startswith=language)
-    if not courses == None:
-        lang_courses = lang_courses.filter(url__in=[c.url for c in courses])
-    return lang_courses
+    ids = catalogue.match(language=language)
+    return _get_courses_by_ids(ids, courses)
 
 
 def get_popular_tags(max_count=10):
     """ return a list of popular tags """
-    listed = _get_listed_courses()
-    return db.CourseTags.objects.filter(course__in=listed).values(
-        'tag').annotate(tagged_count=Count('course')).order_by(
-        '-tagged_count')[:max_count]
+    return catalogue.tag_counts(max_tags=max_count)
 
 
 def get_weighted_tags(min_count=2, min_weight=10, max_weight=26):
@@ -60,33 +83,18 @@ def get_weighted_tags(min_count=2, min_weight=10, max_weight=26):
 
 
 def get_tags_for_courses(courses, exclude=[], max_tags=6):
-    tags = db.CourseTags.objects.filter(course__url__in=[c.url for c in courses])
-    tags = tags.exclude(tag__in=exclude)
-    tags = tags.values('tag')
-    tags = tags.annotate(tagged_count=Count('course'))
-    tags = tags.order_by('-tagged_count')[:max_tags]
-    return tags
+    return catalogue.tag_counts(_get_course_ids(courses),
+        exclude, max_tags)
 
 
 def get_courses_by_tag(tag_name, courses=None):
-    if courses == None:
-        courses=get_listed_courses()
-
-    course_ids = db.CourseTags.objects.filter(
-        tag=tag_name, 
-        course__url__in=[c.url for c in courses]
-    ).values_list('course', flat=True)
-    ret = _get_listed_courses().order_by("-date_added").filter(id__in=course_ids)
-    return ret
+    return get_courses_by_tags([tag_name], courses)
 
 
 def get_courses_by_tags(tag_list, courses=None):
     "this will return courses that have all the tags in tag_list"
-    if courses == None:
-        courses = get_listed_courses()
-    for tag in tag_list:
-        courses = get_courses_by_tag(tag, courses)
-    return courses
+    ids = catalogue.match(tags=tag_list)
+    return _get_courses_by_ids(ids, courses)
 
 
 def get_courses_by_list(list_name, courses=None):
@@ -94,13 +102,8 @@ def get_courses_by_list(list_name, courses=None):
         if courses != None, only the courses in courses and the list
         will be returned.
     """
-    course_ids = db.CourseListEntry.objects.filter(
-        course_list__name = list_name
-    ).values_list('course', flat=True)
-    ret = _get_listed_courses().order_by("-date_added").filter(id__in=course_ids)
-    if courses:
-        ret.filter(url__in=[c.url for c in courses])
-    return ret
+    ids = catalogue.match(list_name=list_name)
+    return _get_courses_by_ids(ids, courses)
 
 
 # new course index API functions ->
@@ -142,6 +145,53 @@ def update_course_listing(course_url, title=None, description=None, data_url=Non
                 course_tag.save()
 
 
+def sync_course_listing(course_url, title, description, data_url, language,
+        thumbnail_url, tags, create=False, lists=None, managed_lists=None):
+    """Brings the listing of a course up to date, adding it when missing
+    if ``create`` is set. Only the tags that changed are written. When
+    ``lists`` is given, the course is moved into those lists and out of
+    the other ``managed_lists`` (every list by default)."""
+    try:
+        listing = _get_listed_courses().get(url=course_url)
+    except db.Course.DoesNotExist:
+        if not create:
+            raise
+        listing = db.Course(url=course_url)
+    if title:
+        listing.title = title
+    if description:
+        listing.description = description
+    if data_url:
+        listing.data_url = data_url
+    if language:
+        listing.language = language
+    if thumbnail_url:
+        listing.thumbnail_url = thumbnail_url
+    listing.save()
+
+    if tags:
+        tags = set(tags)
+        current = db.CourseTags.objects.filter(course=listing)
+        current.filter(internal=False).exclude(tag__in=tags).delete()
+        missing = tags - set(current.values_list('tag', flat=True))
+        bulk_insert(db.CourseTags, ('tag', 'course_id', 'internal'),
+            [(tag, listing.id, False) for tag in missing])
+
+    if lists is not None:
+        entries = db.CourseListEntry.objects.filter(course=listing)
+        if managed_lists is not None:
+            entries = entries.filter(course_list__name__in=managed_lists)
+        entries.exclude(course_list__name__in=lists).delete()
+        current = entries.values_list('course_list__name', flat=True)
+        missing = db.List.objects.filter(name__in=lists).exclude(
+            name__in=list(current)).values_list('id', flat=True)
+        bulk_insert(db.CourseListEntry, ('course_list_id', 'course_id'),
+            [(list_id, listing.id) for list_id in missing])
+
+    # the rows inserted in bulk do not send signals
+    catalogue.course_changed(listing.id)
+
+
 def search_course_title(keyword):
     return _get_listed_courses().order_by("-date_added").filter(title__istartswith=keyword)
 
@@ -223,3 +273,21 @@ def get_lists_for_course(course_url):
         for l in course.courselistentry_set.all()
     ]
 
+
+###########
+# Signals #
+###########
+
+def update_catalogue(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, db.Course):
+        catalogue.course_changed(instance.id)
+    else:
+        catalogue.course_changed(instance.course_id)
+
+
+for model in (db.Course, db.CourseTags, db.CourseListEntry):
+    post_save.connect(update_catalogue, sender=model,
+        dispatch_uid='learn_update_catalogue_%s' % model.__name__)
+    post_delete.connect(update_catalogue, sender=model,
+        dispatch_uid='learn_update_catalogue_%s_delete' % model.__name__)
@@ -0,0 +1,63 @@
+"""Deferred updates of the course index.
+
+Apps register a function that updates the listing of one of their
+courses, and call schedule_sync when the course changes. The first call
+queues a SyncCourseListing task to run LEARN_SYNC_DELAY seconds later,
+and the calls made until it starts are dropped, so many edits in a short
+window end up in a single update reading the latest state of the course.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import get_models
+
+log = logging.getLogger(__name__)
+
+PENDING_KEY = 'learn_sync_pending_%s_%s'
+
+# How long a pending sync blocks new ones if its task is lost.
+PENDING_TIMEOUT_FACTOR = 10
+
+_sync_functions = {}
+
+
+def register_sync(kind, func):
+    """Registers ``func`` to update the listing of the courses of
+    ``kind``. It is called with the key given to schedule_sync."""
+    _sync_functions[kind] = func
+
+
+def get_pending_key(kind, key):
+    return PENDING_KEY % (kind, key)
+
+
+def schedule_sync(kind, key):
+    """Queues an update of the listing of a course unless one is
+    pending already."""
+    from learn.tasks import SyncCourseListing
+    delay = settings.LEARN_SYNC_DELAY
+    pending_key = get_pending_key(kind, key)
+    if not cache.add(pending_key, 1, delay * PENDING_TIMEOUT_FACTOR):
+        return
+    try:
+        SyncCourseListing.apply_async(args=(kind, key), countdown=delay)
+    except:
+        # the next edit tries again
+        cache.delete(pending_key)
+        raise
+
+
+def run_sync(kind, key):
+    # edits made from now on schedule another sync
+    cache.delete(get_pending_key(kind, key))
+    if kind not in _sync_functions:
+        # importing the models registers the sync functions
+        get_models()
+    try:
+        _sync_functions[kind](key)
+    except:
+        log.exception('Could not update the course index for %s %s' % (
+            kind, key))
+        # the task retries it
+        raise
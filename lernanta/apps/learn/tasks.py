@@ -4,6 +4,7 @@ import datetime
 from celery.task import Task
 
 from learn import db
+from learn import sync
 
 class UpdateCourseTask(Task):
     """ Task to update and verify a course listing """
@@ -57,3 +58,17 @@ class UpdateCourseTask(Task):
             listing.verified = False
             listing.save()
 
+
+
+class SyncCourseListing(Task):
+    """Update the listing of a course in the index (see learn.sync)."""
+    name = 'learn.tasks.SyncCourseListing'
+
+    max_retries = 3
+    default_retry_delay = 60
+
+    def run(self, kind, key, **kwargs):
+        try:
+            sync.run_sync(kind, key)
+        except Exception, e:
+            self.retry([kind, key], kwargs, exc=e)
@@ -1,6 +1,8 @@
 from django.test import Client
 from django.contrib.auth.models import User
 
+from mock import patch
+
 from users.models import create_profile
 from learn.models import add_course_listing
 from learn.models import update_course_listing
@@ -14,10 +16,14 @@ from learn.models import get_courses_by_tags
 from learn.models import get_tags_for_courses
 from learn.models import get_active_languages
 from learn.models import get_courses_by_language
-from learn.db import CourseTags
+from learn.models import sync_course_listing
+from learn.db import Course, CourseTags, CourseListEntry
+from learn import sync, tasks
 
 from test_utils import TestCase
 
+from drumbeat.testing import LocalCacheMixin
+
 
 class ProjectTests(TestCase):
 
@@ -160,3 +166,129 @@ class ProjectTests(TestCase):
         spanish_courses = get_courses_by_language("es")
         self.assertTrue(len(spanish_courses) == 2)
 
+
+    def test_course_tags_updated(self):
+        """ test that the tag filters follow the changes of the tags """
+
+        add_course_listing(**self.test_course)
+        self.assertTrue(len(get_courses_by_tags(["tag1", "tag2"])) == 1)
+
+        update_course_listing(self.test_course["course_url"],
+            tags=["tag2", "tag4"])
+        self.assertTrue(len(get_courses_by_tags(["tag1", "tag2"])) == 0)
+        course_list = get_courses_by_tags(["tag2", "tag4"])
+        self.assertTrue(len(course_list) == 1)
+        tags = [tag['tag'] for tag in get_tags_for_courses(course_list)]
+        self.assertEqual(sorted(tags), ["tag2", "tag4"])
+
+
+class SyncTests(LocalCacheMixin, TestCase):
+
+    cached_modules = (sync,)
+
+    def setUp(self):
+        self.synced = []
+        sync.register_sync('test', self.synced.append)
+        # the syncs are queued here instead of running eagerly
+        self.queued = []
+        tasks.SyncCourseListing.apply_async = self.queue
+
+        self.test_course = {
+            "course_url": "http://p2pu.org/courses/2/",
+            "title": "Synced course",
+            "description": "Short description",
+            "data_url": "",
+            "language": "en",
+            "thumbnail_url": "http://p2pu.org/media/image.png",
+            "tags": ["tag1", "tag2"],
+        }
+
+    def tearDown(self):
+        del tasks.SyncCourseListing.apply_async
+        del sync._sync_functions['test']
+
+    def queue(self, args, countdown):
+        if self.queued is None:
+            raise IOError('broker down')
+        self.queued.append(args)
+
+    def test_coalesced(self):
+        """ test that the edits made before the sync runs are dropped """
+
+        for i in range(3):
+            sync.schedule_sync('test', 1)
+        sync.schedule_sync('test', 2)
+        self.assertEqual(self.queued, [('test', 1), ('test', 2)])
+        sync.run_sync('test', 1)
+        self.assertEqual(self.synced, [1])
+        sync.schedule_sync('test', 1)
+        sync.schedule_sync('test', 2)
+        self.assertEqual(self.queued, [('test', 1), ('test', 2),
+            ('test', 1)])
+
+    def test_queue_failure(self):
+        """ test that a sync that could not be queued does not block the
+        next ones """
+
+        self.queued = None
+        self.assertRaises(IOError, sync.schedule_sync, 'test', 1)
+        self.assertEqual(sync.cache.get(sync.get_pending_key('test', 1)),
+            None)
+        self.queued = []
+        sync.schedule_sync('test', 1)
+        self.assertEqual(self.queued, [('test', 1)])
+
+    def fail_sync(self, key):
+        raise IOError('index down')
+
+    def test_sync_failure(self):
+        """ test that a failed sync is logged and retried by its task """
+
+        sync.register_sync('failing', self.fail_sync)
+        try:
+            with patch.object(sync.log, 'exception') as log_exception:
+                self.assertRaises(IOError, sync.run_sync, 'failing', 1)
+            self.assertEqual(log_exception.call_count, 1)
+            with patch.object(tasks.SyncCourseListing, 'retry') as retry:
+                tasks.SyncCourseListing().run('failing', 1)
+            args, kwargs = retry.call_args
+            self.assertEqual(args[0], ['failing', 1])
+            self.assertTrue(isinstance(kwargs['exc'], IOError))
+        finally:
+            del sync._sync_functions['failing']
+
+    def test_tags_diff(self):
+        """ test that only the tags that changed are written """
+
+        sync_course_listing(create=True, **self.test_course)
+        course = Course.objects.get(url=self.test_course["course_url"])
+        CourseTags(course=course, tag="internal", internal=True).save()
+        tag_ids = dict(CourseTags.objects.filter(course=course).values_list(
+            'tag', 'id'))
+        self.test_course["tags"] = ["tag2", "tag3"]
+        sync_course_listing(**self.test_course)
+        tags = dict(CourseTags.objects.filter(course=course).values_list(
+            'tag', 'id'))
+        self.assertEqual(sorted(tags), ["internal", "tag2", "tag3"])
+        self.assertEqual(tags["tag2"], tag_ids["tag2"])
+        self.assertEqual(tags["internal"], tag_ids["internal"])
+
+    def test_lists_diff(self):
+        """ test that the course is moved into the given lists only """
+
+        for name in ("list1", "list2", "other"):
+            create_list(name, name, "http://p2pu.org/%s/" % name)
+        sync_course_listing(create=True, lists=["list1", "other"],
+            **self.test_course)
+        url = self.test_course["course_url"]
+        entries = CourseListEntry.objects.filter(course__url=url)
+        self.assertEqual(sorted(entries.values_list('course_list__name',
+            flat=True)), ["list1", "other"])
+        entry_id = entries.get(course_list__name="other").id
+        sync_course_listing(lists=["list2"],
+            managed_lists=["list1", "list2"], **self.test_course)
+        self.assertEqual(sorted(entries.values_list('course_list__name',
+            flat=True)), ["list2", "other"])
+        self.assertEqual(entries.get(course_list__name="other").id, entry_id)
+        self.assertEqual(len(get_courses_by_list("list2")), 1)
+        self.assertEqual(len(get_courses_by_list("list1")), 0)
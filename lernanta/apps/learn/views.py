@@ -43,7 +43,8 @@ def _filter_and_return(request, context, projects, max_count):
 
     context['popular_tags'] = get_tags_for_courses(projects, filter_tags)
     context['projects'] = projects
-    context.update(get_pagination_context(request, projects, max_count))
+    context.update(get_pagination_context(request, projects, max_count,
+        order_field='-date_added'))
     if request.is_ajax():
         projects_html = render_to_string('learn/_learn_projects.html',
             context, context_instance=RequestContext(request))
@@ -97,7 +98,6 @@ def learn(request, max_count=24):
 
 def schools(request, school_slug, max_count=24):
     school = get_object_or_404(School, slug=school_slug)
-    projects = get_listed_courses()
 
     form = _language_prefs(request)
      
@@ -111,7 +111,7 @@ def schools(request, school_slug, max_count=24):
     }
 
     #projects = projects.filter(school=school)
-    projects = get_courses_by_list(school_slug, projects)
+    projects = get_courses_by_list(school_slug)
   
     return _filter_and_return(request, context, projects, max_count)
 
@@ -126,7 +126,6 @@ def fresh(request, max_count=24):
 
    
 def list(request, list_name, max_count=24):
-    projects = get_listed_courses()
     get_params = request.GET.copy()
 
     form = _language_prefs(request)
@@ -139,7 +138,7 @@ def list(request, list_name, max_count=24):
         'infinite_scroll': request.GET.get('infinite_scroll', False),
     }
 
-    projects = get_courses_by_list(list_name, projects)
+    projects = get_courses_by_list(list_name)
     context['learn_{0}'.format(list_name)] = True
 
     return _filter_and_return(request, context, projects, max_count)
@@ -1,12 +1,13 @@
 import logging
 
 from django.db import models
-# from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete
 
 from django_push.subscriber.models import Subscription
 # from django_push.subscriber.signals import updated
 from django.db.models import Max
 from links.tasks import SubscribeToFeed, UnsubscribeFromFeed, HandleNotification
+from projects.models import update_sidebar
 
 
 log = logging.getLogger(__name__)
@@ -89,3 +90,9 @@ def listener(notification, **kwargs):
     except Exception, ex:
         log.warn("Unprocessable notification: %s (%s)" % (notification, ex))
 #updated.connect(listener, dispatch_uid='links_listener')
+
+
+post_save.connect(update_sidebar, sender=Link,
+    dispatch_uid='links_update_sidebar')
+post_delete.connect(update_sidebar, sender=Link,
+    dispatch_uid='links_update_sidebar_delete')
@@ -1,9 +1,20 @@
 from django import template
 
+from pagination.views import CursorPage
+
 
 register = template.Library()
 
 
+def get_page_url(request, page_url, param, value, remove_param):
+    get_params = request.GET.copy()
+    for name in (param, remove_param):
+        if name in get_params:
+            del get_params[name]
+    get_params[param] = value
+    return page_url + '?%s' % get_params.urlencode()
+
+
 def pagination_links(context):
     request = context['request']
     page_url = context['page_url']
@@ -12,19 +23,22 @@ def pagination_links(context):
     page_number = context[prefix + 'pagination_current_page_number']
 
     page_number_param = prefix + 'pagination_page_number'
+    cursor_param = prefix + 'pagination_cursor'
     prev_page_url = next_page_url = None
-    if current_page.has_previous():
-        prev_get_params = request.GET.copy()
-        if page_number_param in prev_get_params:
-            del prev_get_params[page_number_param]
-        prev_get_params[page_number_param] = page_number - 1
-        prev_page_url = page_url + '?%s' % prev_get_params.urlencode()
-    if current_page.has_next():
-        next_get_params = request.GET.copy()
-        if page_number_param in next_get_params:
-            del next_get_params[page_number_param]
-        next_get_params[page_number_param] = page_number + 1
-        next_page_url = page_url + '?%s' % next_get_params.urlencode()
+    if isinstance(current_page, CursorPage):
+        if current_page.has_previous():
+            prev_page_url = get_page_url(request, page_url, cursor_param,
+                current_page.previous_cursor, page_number_param)
+        if current_page.has_next():
+            next_page_url = get_page_url(request, page_url, cursor_param,
+                current_page.next_cursor, page_number_param)
+    else:
+        if current_page.has_previous():
+            prev_page_url = get_page_url(request, page_url,
+                page_number_param, page_number - 1, cursor_param)
+        if current_page.has_next():
+            next_page_url = get_page_url(request, page_url,
+                page_number_param, page_number + 1, cursor_param)
 
     return {
         'prev_page_url': prev_page_url,
@@ -0,0 +1,98 @@
+import datetime
+
+from django.test.client import RequestFactory
+
+from test_utils import TestCase
+
+from projects.models import Project
+from pagination.views import (get_cursor_page, get_pagination_context,
+    decode_cursor)
+
+
+class CursorPaginationTests(TestCase):
+
+    def setUp(self):
+        start = datetime.datetime(2012, 1, 1)
+        # three of the projects share their creation date
+        hours = (0, 1, 1, 1, 2)
+        self.projects = []
+        for i, hour in enumerate(hours):
+            project = Project(name='Paged Project %s' % i,
+                short_description='This project is paged',
+                long_description='No really, its paged')
+            project.save()
+            created_on = start + datetime.timedelta(hours=hour)
+            Project.objects.filter(id=project.id).update(
+                created_on=created_on)
+            self.projects.append(project.id)
+        self.factory = RequestFactory()
+
+    def get_objects(self):
+        return Project.objects.filter(id__in=self.projects)
+
+    def get_ids(self, page):
+        return [project.id for project in page.object_list]
+
+    def walk(self, order_field):
+        pages = [get_cursor_page(self.get_objects(), 2, order_field)]
+        while pages[-1].has_next():
+            pages.append(get_cursor_page(self.get_objects(), 2, order_field,
+                pages[-1].next_cursor))
+        return pages
+
+    def test_forward(self):
+        """Test that following the next cursors lists every object once,
+        ties included"""
+        pages = self.walk('-created_on')
+        self.assertEqual([self.get_ids(page) for page in pages],
+            [[self.projects[4], self.projects[3]],
+             [self.projects[2], self.projects[1]],
+             [self.projects[0]]])
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[1].has_previous())
+        pages = self.walk('created_on')
+        self.assertEqual(sum([self.get_ids(page) for page in pages], []),
+            self.projects)
+
+    def test_backward(self):
+        """Test that following the previous cursors lists the same pages
+        back to the first one"""
+        pages = self.walk('-created_on')
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = get_cursor_page(self.get_objects(), 2, '-created_on',
+                page.previous_cursor)
+            self.assertEqual(self.get_ids(page), self.get_ids(expected))
+            self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursor(self):
+        """Test that invalid cursors are rejected and show the first
+        page"""
+        for cursor in ('x20120101000000000000.1', 'nfoo',
+                'n20120101000000000000.abc', 'nyesterday.1'):
+            self.assertRaises(ValueError, decode_cursor, cursor)
+            request = self.factory.get('/', {'pagination_cursor': cursor})
+            context = get_pagination_context(request, self.get_objects(), 2,
+                order_field='-created_on')
+            self.assertEqual(
+                self.get_ids(context['pagination_current_page']),
+                [self.projects[4], self.projects[3]])
+
+    def test_page_number_fallback(self):
+        """Test that requests with a page number are paginated by page
+        number"""
+        request = self.factory.get('/', {'pagination_page_number': '2'})
+        context = get_pagination_context(request,
+            self.get_objects().order_by('-created_on', '-id'), 2,
+            order_field='-created_on')
+        self.assertEqual(context['pagination_current_page_number'], 2)
+        self.assertEqual(context['pagination_pages_count'], 3)
+        self.assertEqual(
+            self.get_ids(context['pagination_current_page']),
+            [self.projects[2], self.projects[1]])
+        request = self.factory.get('/')
+        context = get_pagination_context(request, self.get_objects(), 2,
+            order_field='-created_on')
+        self.assertEqual(context['pagination_paginator'], None)
+        self.assertTrue(context['pagination_current_page'].has_next())
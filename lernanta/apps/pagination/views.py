@@ -1,13 +1,127 @@
+import datetime
+
 from django import http
 from django.core.paginator import Paginator, EmptyPage
 from django.conf import settings
+from django.db.models import Q
+
+CURSOR_DATE_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+class CursorPage(object):
+    """A page of objects fetched after (or before) a cursor instead of at
+    an offset. Cursors are strings encoding the direction and the
+    (order_field, id) values of the object the page starts from."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(direction, obj, field_name):
+    return '%s%s.%s' % (direction,
+        getattr(obj, field_name).strftime(CURSOR_DATE_FORMAT), obj.pk)
 
 
-def get_pagination_context(request, objects, items_per_page=None, prefix=''):
+def decode_cursor(cursor):
+    """Returns the (direction, value, id) of ``cursor``. Raises
+    ValueError if it is not valid."""
+    direction, cursor = cursor[:1], cursor[1:]
+    if direction not in ('n', 'p'):
+        raise ValueError(direction)
+    value, pk = cursor.split('.')
+    return (direction, datetime.datetime.strptime(value, CURSOR_DATE_FORMAT),
+        int(pk))
+
+
+def get_cursor_page(objects, items_per_page, order_field, cursor=None):
+    """Returns the page of ``objects`` ordered by ``order_field`` (a
+    datetime field, prefixed with '-' for descending order) and id that
+    ``cursor`` points to, the first page if it is None. Objects are not
+    counted."""
+    descending = order_field.startswith('-')
+    field_name = order_field.lstrip('-')
+    direction = value = pk = None
+    if cursor:
+        direction, value, pk = decode_cursor(cursor)
+    # previous pages are read in the opposite order and reversed
+    backwards = (direction == 'p')
+    if descending != backwards:
+        ordering, lookup = ('-' + field_name, '-pk'), 'lt'
+    else:
+        ordering, lookup = (field_name, 'pk'), 'gt'
+    objects = objects.order_by(*ordering)
+    if cursor:
+        objects = objects.filter(
+            Q(**{'%s__%s' % (field_name, lookup): value})
+            | Q(**{field_name: value, 'pk__%s' % lookup: pk}))
+    object_list = list(objects[:items_per_page + 1])
+    has_more = len(object_list) > items_per_page
+    object_list = object_list[:items_per_page]
+    if backwards:
+        object_list.reverse()
+    next_cursor = previous_cursor = None
+    if object_list:
+        if has_more or backwards:
+            next_cursor = encode_cursor('n', object_list[-1], field_name)
+        if cursor and (has_more or not backwards):
+            previous_cursor = encode_cursor('p', object_list[0], field_name)
+    return CursorPage(object_list, next_cursor, previous_cursor)
+
+
+def get_page_number(objects, obj, order_field, items_per_page=None):
+    """Returns the number of the page of ``objects`` (ordered by
+    ``order_field``, prefixed with '-' for descending order, and id) that
+    holds ``obj``, counting the objects before it with a single query."""
+    if not items_per_page:
+        items_per_page = settings.PAGINATION_DEFAULT_ITEMS_PER_PAGE
+    field_name = order_field.lstrip('-')
+    lookup = 'gt' if order_field.startswith('-') else 'lt'
+    value = getattr(obj, field_name)
+    position = objects.filter(
+        Q(**{'%s__%s' % (field_name, lookup): value})
+        | Q(**{field_name: value, 'pk__%s' % lookup: obj.pk})).count()
+    return (position / items_per_page) + 1
+
+
+def get_pagination_context(request, objects, items_per_page=None, prefix='',
+        order_field=None):
+    """Paginates ``objects`` by page number, or by cursor when an
+    ``order_field`` is given (see get_cursor_page) and no page number was
+    requested, so existing page number links keep working. Lists and
+    sliced querysets are always paginated by page number."""
     if not items_per_page:
         items_per_page = settings.PAGINATION_DEFAULT_ITEMS_PER_PAGE
     page_number = 1
     page_number_param = prefix + 'pagination_page_number'
+    use_cursor = (order_field and hasattr(objects, 'query') and
+        objects.query.can_filter())
+    if use_cursor and page_number_param not in request.GET:
+        cursor = request.GET.get(prefix + 'pagination_cursor')
+        try:
+            current_page = get_cursor_page(objects, items_per_page,
+                order_field, cursor)
+        except ValueError:
+            current_page = get_cursor_page(objects, items_per_page,
+                order_field)
+        return {
+            prefix + 'pagination_paginator': None,
+            prefix + 'pagination_current_page': current_page,
+            prefix + 'pagination_current_page_number': None,
+            prefix + 'pagination_next_page_number': None,
+            prefix + 'pagination_prev_page_number': None,
+            prefix + 'pagination_pages_count': None,
+        }
     if page_number_param in request.GET:
         try:
             page_number = int(request.GET[page_number_param])
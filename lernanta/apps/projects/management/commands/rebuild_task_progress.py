@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from projects.models import Project, rebuild_task_progress
+
+
+class Command(BaseCommand):
+    args = '<slug slug ...>'
+    help = ('Rebuilds the task progress of the challenges (all by default) '
+        'from the task completions')
+
+    def handle(self, *args, **options):
+        projects = Project.objects.filter(category=Project.CHALLENGE)
+        if args:
+            projects = projects.filter(slug__in=args)
+        count = 0
+        for project in projects.iterator():
+            count += rebuild_task_progress(project)
+        self.stdout.write('Rebuilt %s task progress rows.\n' % count)
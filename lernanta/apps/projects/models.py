@@ -1,27 +1,29 @@
+import time
 import logging
 import datetime
 
 from django.core.cache import cache
 from django.core.validators import MaxLengthValidator
 from django.conf import settings
-from django.db import models
-from django.db.models import Count, Max, Q
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, Max, Q, F
 from django.template.defaultfilters import slugify
 from django.utils.translation import ugettext_lazy as _
 from django.template.loader import render_to_string
 from django.contrib.sites.models import Site
 from django.core.mail import send_mail
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 
 from taggit.managers import TaggableManager
 
 from l10n.urlresolvers import reverse
 from drumbeat import storage
-from drumbeat.utils import get_partition_id, safe_filename
+from drumbeat.utils import get_partition_id, safe_filename, bulk_insert
 from drumbeat.models import ModelBase
 from relationships.models import Relationship
 from activity.models import Activity, RemoteObject, register_filter
+from activity import public_stream
 from activity.schema import object_types, verbs
 from notifications.models import send_notifications_i18n
 from richtext.models import RichTextField
@@ -29,6 +31,8 @@ from content.models import Page
 from replies.models import PageComment
 from tags.models import GeneralTaggedItem
 from learn import models as learn_model
+from learn import sync as learn_sync
+from projects.roles import get_user_roles, forget_roles
 
 log = logging.getLogger(__name__)
 
@@ -194,31 +198,22 @@ class Project(ModelBase):
                 signup.set_unmoderated_signup()
 
     def is_organizing(self, user):
-        if user.is_authenticated():
-            profile = user.get_profile()
-            is_organizer = self.organizers().filter(user=profile).exists()
-            is_superuser = user.is_superuser
-            return is_organizer or is_superuser
-        else:
+        roles = get_user_roles(user)
+        if roles is None:
             return False
+        return roles.is_organizing(self) or user.is_superuser
 
     def is_following(self, user):
-        if user.is_authenticated():
-            profile = user.get_profile()
-            is_following = self.followers().filter(source=profile).exists()
-            return is_following
-        else:
+        roles = get_user_roles(user)
+        if roles is None:
             return False
+        return roles.is_following(self)
 
     def is_participating(self, user):
-        if user.is_authenticated():
-            profile = user.get_profile()
-            is_organizer_or_participant = self.participants().filter(
-                user=profile).exists()
-            is_superuser = user.is_superuser
-            return is_organizer_or_participant or is_superuser
-        else:
+        roles = get_user_roles(user)
+        if roles is None:
             return False
+        return roles.is_participating(self) or user.is_superuser
 
     def get_metrics_permissions(self, user):
         """Provides metrics related permissions for metrics overview
@@ -258,31 +253,18 @@ class Project(ModelBase):
     def update_learn_api(self):
         if not self.pk:
             return
-        try:
-            learn_model.update_course_listing(**self.get_learn_api_data())
-        except:
-            learn_model.add_course_listing(**self.get_learn_api_data())
-
-        course_url = reverse('projects_show', kwargs={'slug': self.slug})
-        course_lists = learn_model.get_lists_for_course(course_url)
-        list_names = [ l['name'] for l in course_lists ]
         if self.not_listed or self.test:
-            for list_name in list_names:
-                learn_model.remove_course_from_list(course_url, list_name)
+            # taken out of every list
+            lists, managed_lists = [], None
         else:
-            desired_list = 'drafts'
+            managed_lists = ['drafts', 'listed', 'archived']
+            lists = ['drafts']
             if not (self.under_development or self.archived):
-                desired_list = 'listed'
+                lists = ['listed']
             elif self.archived:
-                desired_list = 'archived'
-            possible_lists = ['drafts', 'listed', 'archived']
-            possible_lists.remove(desired_list)
-            for l in possible_lists:
-                if l in list_names:
-                    learn_model.remove_course_from_list(course_url, l)
-            if desired_list not in list_names:
-                learn_model.add_course_to_list(course_url, desired_list)
-
+                lists = ['archived']
+        learn_model.sync_course_listing(create=True, lists=lists,
+            managed_lists=managed_lists, **self.get_learn_api_data())
 
     def save(self):
         """Make sure each project has a unique slug."""
@@ -297,12 +279,12 @@ class Project(ModelBase):
                 self.slug = "%s-%s" % (slug, count + 1)
                 count += 1
 
+        super(Project, self).save()
+
         try:
-            self.update_learn_api()
+            learn_sync.schedule_sync('project', self.id)
         except:
             log.error('Could not update course info in the learn API')
-        
-        super(Project, self).save()
 
 
     def set_duration(self, value):
@@ -369,55 +351,18 @@ class Project(ModelBase):
         return self.school
 
     def check_tasks_completion(self, user):
-        total_count = self.pages.filter(listed=True,
-            deleted=False).count()
-        completed_count = PerUserTaskCompletion.objects.filter(
-            page__project=self, page__deleted=False,
-            unchecked_on__isnull=True, user=user).count()
-        if total_count == completed_count:
+        progress = update_task_progress(self, user)
+        if progress.is_completed():
             for badge in self.completion_badges.all():
                 badge.award_to(user)
 
     def completed_tasks_users(self):
-        custom_query = """
-SELECT
-    `relationships_relationship`.`id`,
-    `relationships_relationship`.`source_id`,
-    `relationships_relationship`.`target_user_id`,
-    `relationships_relationship`.`target_project_id`,
-    `relationships_relationship`.`created_on`,
-    `relationships_relationship`.`deleted`
-FROM
-    `relationships_relationship`
-INNER JOIN
-    `users_userprofile` ON (`relationships_relationship`.`source_id` = `users_userprofile`.`id`)
-INNER JOIN
-    `projects_perusertaskcompletion` ON  (`relationships_relationship`.`source_id` = `projects_perusertaskcompletion`.`user_id`)
-INNER JOIN
-    `content_page` U1 ON (`projects_perusertaskcompletion`.`page_id` = U1.`id`)
-WHERE
-    `projects_perusertaskcompletion`.`unchecked_on` IS NULL
-    AND U1.`project_id` = {project_id}
-    AND U1.`deleted` = False
-    AND `users_userprofile`.`deleted` = False
-    AND `relationships_relationship`.`target_project_id` = {project_id}
-GROUP BY
-    `projects_perusertaskcompletion`.`user_id`, `projects_perusertaskcompletion`.`user_id`
-HAVING
-    COUNT(`projects_perusertaskcompletion`.`page_id`) = {task_count}
-LIMIT 56;"""
-        total_count = self.pages.filter(listed=True,
-            deleted=False).count()
-        #completed_stats = PerUserTaskCompletion.objects.filter(
-        #    page__project=self, page__deleted=False,
-        #    unchecked_on__isnull=True).values(
-        #    'user').annotate(completed_count=Count('page')).filter(
-        #    completed_count=total_count)
-        #usernames = completed_stats.values_list(
-        #    'user', flat=True)
-        #return Relationship.objects.filter(source__in=usernames,
-        #    target_project=self, source__deleted=False)
-        return Relationship.objects.raw(custom_query.format(project_id=self.id, task_count=total_count))
+        """Followers that completed every task, latest first."""
+        return Relationship.objects.filter(target_project=self,
+            deleted=False, source__deleted=False,
+            source__task_progress__project=self,
+            source__task_progress__completed_on__isnull=False).order_by(
+            '-source__task_progress__completed_on')
 
     def get_badges(self):
         from badges.models import Badge
@@ -533,6 +478,12 @@ register_filter('default', Project.filter_activities)
 register_filter('learning', Project.filter_learning_activities)
 
 
+def sync_learn_listing(project_id):
+    Project.objects.get(id=project_id).update_learn_api()
+
+learn_sync.register_sync('project', sync_learn_listing)
+
+
 class Participation(ModelBase):
     user = models.ForeignKey('users.UserProfile',
         related_name='participations')
@@ -550,6 +501,91 @@ class Participation(ModelBase):
     no_participants_content_updates = models.BooleanField(default=False)
 
 
+class ProjectCounters(models.Model):
+    """Counts shown on the project sidebar, updated when the counted
+    objects change (see update_project_counters)."""
+    project = models.OneToOneField('projects.Project',
+        related_name='counters')
+    organizers = models.PositiveIntegerField(default=0)
+    participants = models.PositiveIntegerField(default=0)
+    followers = models.PositiveIntegerField(default=0)
+    updates = models.PositiveIntegerField(default=0)
+    pending_signups = models.PositiveIntegerField(default=0)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    COUNTERS = ('organizers', 'participants', 'followers', 'updates',
+        'pending_signups')
+
+
+def count_project(project, names=ProjectCounters.COUNTERS):
+    """Counts the ``names`` counters of ``project`` from the counted
+    tables."""
+    counts = {}
+    if 'organizers' in names:
+        counts['organizers'] = project.organizers().count()
+    if 'participants' in names:
+        counts['participants'] = project.non_organizer_participants().count()
+    if 'followers' in names:
+        counts['followers'] = project.non_participant_followers().count()
+    if 'updates' in names:
+        counts['updates'] = project.activities().count()
+    if 'pending_signups' in names:
+        from signups.models import SignupAnswer
+        counts['pending_signups'] = SignupAnswer.objects.filter(
+            sign_up__project=project, accepted=False, deleted=False).count()
+    return counts
+
+
+def update_project_counters(project, names=ProjectCounters.COUNTERS,
+        create=True):
+    """Recounts the ``names`` counters of ``project``, creating its
+    counters unless ``create`` is False. Returns the counts."""
+    counts = count_project(project, names)
+    updated = ProjectCounters.objects.filter(project=project).update(
+        **counts)
+    if not updated and create:
+        if names != ProjectCounters.COUNTERS:
+            counts = count_project(project)
+        sid = transaction.savepoint()
+        try:
+            ProjectCounters.objects.create(project=project, **counts)
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            # created by a concurrent request
+            transaction.savepoint_rollback(sid)
+            ProjectCounters.objects.filter(project=project).update(**counts)
+    bump_sidebar_version(project.id)
+    return counts
+
+
+def get_project_counters(project):
+    """Returns the counts of ``project``, counting them the first
+    time."""
+    counters = ProjectCounters.objects.filter(project=project).values(
+        *ProjectCounters.COUNTERS)
+    if counters:
+        return counters[0]
+    return update_project_counters(project)
+
+
+SIDEBAR_VERSION_KEY = 'projects_sidebar_version_%s'
+
+
+def get_sidebar_version(project_id):
+    """Version stamp of the cached sidebar data of a project."""
+    key = SIDEBAR_VERSION_KEY % project_id
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.add(key, version, settings.PROJECT_SIDEBAR_TIMEOUT)
+    return version
+
+
+def bump_sidebar_version(project_id):
+    cache.set(SIDEBAR_VERSION_KEY % project_id, int(time.time() * 1000),
+        settings.PROJECT_SIDEBAR_TIMEOUT)
+
+
 class PerUserTaskCompletion(ModelBase):
     user = models.ForeignKey('users.UserProfile',
         related_name='peruser_task_completion')
@@ -561,6 +597,133 @@ class PerUserTaskCompletion(ModelBase):
     url = models.URLField(max_length=1023, blank=True, null=True)
 
 
+class TaskProgress(models.Model):
+    """Tasks of a challenge completed by a user, updated when the user
+    toggles a task and when tasks are listed, unlisted or deleted (see
+    update_task_progress and update_project_task_progress)."""
+    user = models.ForeignKey('users.UserProfile',
+        related_name='task_progress')
+    project = models.ForeignKey('projects.Project',
+        related_name='task_progress')
+    completed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    completed_on = models.DateTimeField(blank=True, null=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (('user', 'project'),)
+
+    def is_completed(self):
+        return self.total > 0 and self.completed >= self.total
+
+    def percentage(self):
+        if not self.total:
+            return 0
+        return min(self.completed * 100 / self.total, 100)
+
+    def set_completed_on(self):
+        if not self.is_completed():
+            self.completed_on = None
+        elif not self.completed_on:
+            self.completed_on = datetime.datetime.now()
+
+
+def count_tasks(project):
+    return Page.objects.filter(project=project, listed=True,
+        deleted=False).count()
+
+
+def get_completed_tasks(project, users=None):
+    """Completions of the listed tasks of ``project``, by ``users`` when
+    given."""
+    completions = PerUserTaskCompletion.objects.filter(page__project=project,
+        page__listed=True, page__deleted=False, unchecked_on__isnull=True)
+    if users is not None:
+        completions = completions.filter(user__in=users)
+    return completions
+
+
+def update_task_progress(project, user):
+    """Recounts the tasks of ``project`` completed by ``user``. Returns
+    the progress."""
+    completed = get_completed_tasks(project, [user]).values(
+        'page').distinct().count()
+    try:
+        progress = TaskProgress.objects.get(project=project, user=user)
+    except TaskProgress.DoesNotExist:
+        progress = TaskProgress(project=project, user=user,
+            total=count_tasks(project))
+    progress.completed = completed
+    progress.set_completed_on()
+    sid = transaction.savepoint()
+    try:
+        progress.save()
+        transaction.savepoint_commit(sid)
+    except IntegrityError:
+        # created by a concurrent request
+        transaction.savepoint_rollback(sid)
+        progress = TaskProgress.objects.get(project=project, user=user)
+        progress.completed = completed
+        progress.set_completed_on()
+        progress.save()
+    return progress
+
+
+def get_task_progress(project, user):
+    """Returns the progress of ``user`` in ``project``, an unsaved one
+    when the user never completed a task."""
+    try:
+        return TaskProgress.objects.get(project=project, user=user)
+    except TaskProgress.DoesNotExist:
+        return TaskProgress(project=project, user=user,
+            total=count_tasks(project))
+
+
+def update_project_task_progress(project, users=None):
+    """Updates the total of every progress of ``project``, and recounts
+    the completed tasks of ``users`` (the ones that completed a task that
+    was listed, unlisted or deleted)."""
+    TaskProgress.objects.filter(project=project).update(
+        total=count_tasks(project))
+    if users is not None:
+        counts = dict((user_id, 0) for user_id in users)
+        completed = get_completed_tasks(project, users).values(
+            'user').annotate(completed=Count('page', distinct=True))
+        for row in completed:
+            counts[row['user']] = row['completed']
+        for user_id, count in counts.iteritems():
+            TaskProgress.objects.filter(project=project,
+                user=user_id).update(completed=count)
+    progress = TaskProgress.objects.filter(project=project)
+    progress.filter(completed_on__isnull=True, total__gt=0,
+        completed__gte=F('total')).update(
+        completed_on=datetime.datetime.now())
+    progress.filter(completed_on__isnull=False).filter(
+        Q(total=0) | Q(completed__lt=F('total'))).update(completed_on=None)
+
+
+def rebuild_task_progress(project):
+    """Recreates the progress of every user that completed a task of
+    ``project``. Returns the number of progress rows."""
+    total = count_tasks(project)
+    now = datetime.datetime.now()
+    completed = get_completed_tasks(project).values('user').annotate(
+        completed=Count('page', distinct=True),
+        last_checked_on=Max('checked_on'))
+    rows = []
+    for row in completed:
+        completed_on = None
+        if total and row['completed'] >= total:
+            # when the last task was checked
+            completed_on = row['last_checked_on']
+        rows.append((row['user'], project.id, row['completed'], total,
+            completed_on, now))
+    TaskProgress.objects.filter(project=project).delete()
+    bulk_insert(TaskProgress, ('user_id', 'project_id', 'completed', 'total',
+        'completed_on', 'updated_on'), rows)
+    return len(rows)
+
+
 ###########
 # Signals #
 ###########
@@ -575,3 +738,149 @@ def check_tasks_completion(sender, **kwargs):
 
 post_save.connect(check_tasks_completion, sender=PerUserTaskCompletion,
     dispatch_uid='projects_check_tasks_completion')
+
+
+TASK_FLAGS = ('listed', 'deleted')
+
+
+def check_task_flags(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    instance._task_flags_changed = False
+    if not instance.pk:
+        return
+    try:
+        flags = Page.objects.filter(pk=instance.pk).values_list(
+            *TASK_FLAGS).get()
+    except Page.DoesNotExist:
+        return
+    instance._task_flags_changed = (flags != tuple(getattr(instance, flag)
+        for flag in TASK_FLAGS))
+
+
+def update_task_totals(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    project = Project(id=instance.project_id)
+    if kwargs.get('created', False):
+        if instance.listed and not instance.deleted:
+            update_project_task_progress(project)
+    elif getattr(instance, '_task_flags_changed', False):
+        users = PerUserTaskCompletion.objects.filter(page=instance,
+            unchecked_on__isnull=True).values_list('user_id', flat=True)
+        update_project_task_progress(project, list(users))
+
+
+def remove_task(sender, **kwargs):
+    # the completions of the page are already deleted
+    instance = kwargs.get('instance', None)
+    project = Project(id=instance.project_id)
+    users = TaskProgress.objects.filter(project=project).values_list(
+        'user_id', flat=True)
+    update_project_task_progress(project, list(users))
+
+
+pre_save.connect(check_task_flags, sender=Page,
+    dispatch_uid='projects_check_task_flags')
+post_save.connect(update_task_totals, sender=Page,
+    dispatch_uid='projects_update_task_totals')
+post_delete.connect(remove_task, sender=Page,
+    dispatch_uid='projects_remove_task')
+
+
+PUBLIC_FLAGS = ('not_listed', 'deleted', 'test')
+
+
+def check_public_flags(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    instance._public_flags_changed = False
+    if not instance.pk:
+        return
+    try:
+        flags = Project.objects.filter(pk=instance.pk).values_list(
+            *PUBLIC_FLAGS).get()
+    except Project.DoesNotExist:
+        return
+    instance._public_flags_changed = (flags != tuple(getattr(instance, flag)
+        for flag in PUBLIC_FLAGS))
+
+
+def invalidate_public_stream(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if not getattr(instance, '_public_flags_changed', False):
+        return
+    if any(getattr(instance, flag) for flag in PUBLIC_FLAGS):
+        # the project's activities left the public stream
+        public_stream.remove_project(instance.id)
+    else:
+        # they might be newer than the ones in the stream
+        public_stream.invalidate()
+
+
+# The counters are recounted when the counted objects are saved, and only
+# updated when they are deleted since their project might be deleted too.
+# Projects are referenced by id so deleted ones are not read.
+
+def count_participation(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    update_project_counters(Project(id=instance.project_id),
+        ('organizers', 'participants', 'followers'),
+        create=('created' in kwargs))
+
+
+def count_follower(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if instance.target_project_id:
+        update_project_counters(Project(id=instance.target_project_id),
+            ('followers',), create=('created' in kwargs))
+
+
+def count_update(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if instance.scope_object_id:
+        update_project_counters(Project(id=instance.scope_object_id),
+            ('updates',), create=('created' in kwargs))
+
+
+def update_sidebar(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Project):
+        bump_sidebar_version(instance.id)
+    elif instance.project_id:
+        bump_sidebar_version(instance.project_id)
+
+
+pre_save.connect(check_public_flags, sender=Project,
+    dispatch_uid='projects_check_public_flags')
+post_save.connect(invalidate_public_stream, sender=Project,
+    dispatch_uid='projects_invalidate_public_stream')
+post_save.connect(count_participation, sender=Participation,
+    dispatch_uid='projects_count_participation')
+post_delete.connect(count_participation, sender=Participation,
+    dispatch_uid='projects_count_participation_delete')
+post_save.connect(count_follower, sender=Relationship,
+    dispatch_uid='projects_count_follower')
+post_delete.connect(count_follower, sender=Relationship,
+    dispatch_uid='projects_count_follower_delete')
+post_save.connect(count_update, sender=Activity,
+    dispatch_uid='projects_count_update')
+post_delete.connect(count_update, sender=Activity,
+    dispatch_uid='projects_count_update_delete')
+post_save.connect(update_sidebar, sender=Project,
+    dispatch_uid='projects_update_sidebar')
+post_save.connect(update_sidebar, sender=Page,
+    dispatch_uid='projects_update_sidebar_page')
+post_delete.connect(update_sidebar, sender=Page,
+    dispatch_uid='projects_update_sidebar_page_delete')
+
+
+def update_roles(sender, **kwargs):
+    forget_roles()
+
+
+post_save.connect(update_roles, sender=Participation,
+    dispatch_uid='projects_update_roles_participation')
+post_delete.connect(update_roles, sender=Participation,
+    dispatch_uid='projects_update_roles_participation_delete')
+post_save.connect(update_roles, sender=Relationship,
+    dispatch_uid='projects_update_roles_relationship')
+post_delete.connect(update_roles, sender=Relationship,
+    dispatch_uid='projects_update_roles_relationship_delete')
@@ -0,0 +1,69 @@
+"""Roles of a user in the projects, read once per request.
+
+The participations and the followed projects of a user are loaded with
+one query each the first time a role is checked and kept on the user
+object, which is request.user for the rest of the request. Saving or
+deleting a participation or a relationship (see the signals at the end
+of projects.models) makes them be read again, so a request sees its own
+changes.
+"""
+import itertools
+
+ROLES_ATTR = '_project_roles'
+
+_generation = itertools.count()
+_current = [_generation.next()]
+
+
+def forget_roles():
+    """Discards the roles loaded so far in this process."""
+    _current[0] = _generation.next()
+
+
+class UserRoles(object):
+
+    def __init__(self, profile):
+        from relationships.models import Relationship
+        from projects.models import Participation
+        self.organizing = set()
+        self.participating = set()
+        self.adopting = set()
+        self.following = set()
+        if profile.deleted:
+            return
+        participations = Participation.objects.filter(user=profile,
+            left_on__isnull=True).values_list('project_id', 'organizing',
+            'adopter')
+        for project_id, organizing, adopter in participations:
+            self.participating.add(project_id)
+            if organizing:
+                self.organizing.add(project_id)
+            if organizing or adopter:
+                self.adopting.add(project_id)
+        self.following.update(Relationship.objects.filter(source=profile,
+            target_project__isnull=False, deleted=False).values_list(
+            'target_project_id', flat=True))
+
+    def is_organizing(self, project):
+        return project.id in self.organizing
+
+    def is_participating(self, project):
+        return project.id in self.participating
+
+    def is_adopter(self, project):
+        return project.id in self.adopting
+
+    def is_following(self, project):
+        return project.id in self.following
+
+
+def get_user_roles(user):
+    """Returns the UserRoles of ``user``, None if it is anonymous."""
+    if not user.is_authenticated():
+        return None
+    generation, roles = user.__dict__.get(ROLES_ATTR, (None, None))
+    if generation != _current[0]:
+        generation = _current[0]
+        roles = UserRoles(user.get_profile())
+        user.__dict__[ROLES_ATTR] = (generation, roles)
+    return roles
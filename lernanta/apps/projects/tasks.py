@@ -0,0 +1,16 @@
+from celery.task.schedules import crontab
+from celery.decorators import periodic_task
+
+from projects.models import Project, update_project_counters
+
+
+@periodic_task(name="projects.tasks.reconcile_project_counters", run_every=crontab(hour=2, minute=30, day_of_week="*"))
+def reconcile_project_counters():
+    # Recounts every counter, fixing the ones missed by the signals (bulk
+    # updates, raw queries).
+    log = reconcile_project_counters.get_logger()
+    count = 0
+    for project in Project.objects.filter(deleted=False).iterator():
+        update_project_counters(project)
+        count += 1
+    log.debug('reconciled the counters of {0} projects'.format(count))
@@ -1,6 +1,8 @@
 import datetime
 
 from django import template
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
 from django.contrib.sites.models import Site
 
@@ -9,10 +11,13 @@ from signups.models import Signup
 from statuses import forms as statuses_forms
 from activity.views import filter_activities
 from pagination.views import get_pagination_context
-from activity.models import apply_filter
+from activity.models import apply_filter, prefetch_activities
 from l10n.urlresolvers import reverse
 
 from projects.models import Project, PerUserTaskCompletion
+from projects.models import get_project_counters, get_sidebar_version
+from projects.models import count_tasks, get_task_progress
+from projects.roles import get_user_roles
 from projects import drupal
 from badges.models import Badge
 from schools.models import ProjectSet
@@ -21,32 +26,23 @@ from schools.models import ProjectSet
 register = template.Library()
 
 
-def sidebar(context):
-    user = context['user']
-    project = context['project']
+SIDEBAR_KEY = 'projects_sidebar_%s_%s_%s'
+
+
+def get_sidebar_role(project, user):
+    """Returns the (participating, following, organizing) flags of
+    ``user`` in ``project``."""
+    roles = get_user_roles(user)
+    if roles is None:
+        return False, False, False
+    return (roles.is_participating(project), roles.is_following(project),
+        roles.is_organizing(project))
+
+
+def get_sidebar_data(project, is_participating, is_following,
+        is_organizing):
     sign_up = Signup.objects.get(project=project)
-    is_participating = is_following = is_organizing = False
-    if user.is_authenticated():
-        is_participating = project.participants().filter(user=user).exists()
-        profile = user.get_profile()
-        is_following = profile.is_following(project)
-        is_organizing = project.organizers().filter(user=user).exists()
-
-    tags = project.tags.exclude(slug='').order_by('name')
-
-    organizers = project.organizers()
-    organizers_count = organizers.count()
-    participants = project.non_organizer_participants()
-    participants_count = participants.count()
-    followers = project.non_participant_followers()
-    followers_count = followers.count()
-
-    update_count = project.activities().count()
-    pending_signup_answers_count = sign_up.pending_answers().count()
-    content_pages = Page.objects.filter(project__pk=project.pk,
-        listed=True, deleted=False).order_by('index')
-    links = project.link_set.all().order_by('index')
-    school = project.accepted_school()
+    counts = get_project_counters(project)
     imported_from = None
     if project.imported_from:
         imported_from = drupal.get_course(project.imported_from)
@@ -54,34 +50,46 @@ def sidebar(context):
     can_add_task = is_organizing
     if project.category == Project.STUDY_GROUP:
         can_add_task = is_participating
-    can_change_order = can_add_task
-
-    chat = '#p2pu-%s-%s' % (project.id, project.slug[:10])
 
-    submission_enabled_badges = project.get_submission_enabled_badges()
-
-    context.update({
+    return {
         'participating': is_participating,
-        'participants_count': participants_count,
+        'participants_count': counts['participants'],
         'following': is_following,
-        'followers_count': followers_count,
-        'tags': tags,
+        'followers_count': counts['followers'],
+        'tags': list(project.tags.exclude(slug='').order_by('name')),
         'organizing': is_organizing,
-        'organizers_count': organizers_count,
-        'update_count': update_count,
-        'pending_signup_answers_count': pending_signup_answers_count,
-        'content_pages': content_pages,
-        'links': links,
-        'school': school,
+        'organizers_count': counts['organizers'],
+        'update_count': counts['updates'],
+        'pending_signup_answers_count': counts['pending_signups'],
+        'content_pages': list(Page.objects.filter(project__pk=project.pk,
+            listed=True, deleted=False).order_by('index')),
+        'links': list(project.link_set.all().order_by('index')),
+        'school': project.accepted_school(),
         'imported_from': imported_from,
         'sign_up': sign_up,
         'can_add_task': can_add_task,
-        'can_change_order': can_change_order,
-        'chat': chat,
-        'discussion_area': context.get('discussion_area', False),
+        'can_change_order': can_add_task,
+        'chat': '#p2pu-%s-%s' % (project.id, project.slug[:10]),
         'is_challenge': (project.category == Project.CHALLENGE),
-        'submission_enabled_badges': submission_enabled_badges,
-    })
+        'submission_enabled_badges': list(
+            project.get_submission_enabled_badges()),
+    }
+
+
+def sidebar(context):
+    user = context['user']
+    project = context['project']
+    role = get_sidebar_role(project, user)
+    # The data only depends on the project and the role of the user in it,
+    # and is replaced when the counters or the tasks change.
+    key = SIDEBAR_KEY % (project.id, ''.join(str(int(flag))
+        for flag in role), get_sidebar_version(project.id))
+    data = cache.get(key)
+    if data is None:
+        data = get_sidebar_data(project, *role)
+        cache.set(key, data, settings.PROJECT_SIDEBAR_TIMEOUT)
+    context.update(data)
+    context['discussion_area'] = context.get('discussion_area', False)
     return context
 
 register.inclusion_tag('projects/sidebar.html', takes_context=True)(sidebar)
@@ -99,15 +107,16 @@ def task_list(project, user, show_all_tasks=True, short_list_length=3):
     completed_count = 0
     if is_challenge and user.is_authenticated():
         profile = user.get_profile()
-        is_organizing = project.organizers().filter(user=profile).exists()
-        is_participating = project.participants().filter(user=profile).exists()
+        roles = get_user_roles(user)
+        is_organizing = roles.is_organizing(project)
+        is_participating = roles.is_participating(project)
         if is_participating:
+            done = set(PerUserTaskCompletion.objects.filter(user=profile,
+                page__in=[task.id for task in tasks],
+                unchecked_on__isnull=True).values_list('page_id', flat=True))
             for task in tasks:
-                task.is_done = PerUserTaskCompletion.objects.filter(
-                    user=profile, page=task, unchecked_on__isnull=True)
-        completed_count = PerUserTaskCompletion.objects.filter(
-            page__project=project, page__deleted=False,
-            unchecked_on__isnull=True, user=profile).count()
+                task.is_done = (task.id in done)
+        completed_count = get_task_progress(project, profile).completed
     progressbar_value = 0
     if tasks_count:
         progressbar_value = (completed_count * 100 / tasks_count)
@@ -194,29 +203,30 @@ def project_wall(request, project, discussion_area=False):
         'wall_url': url,
         'is_challenge': is_challenge,
     }
-    context.update(get_pagination_context(request, activities))
+    context.update(get_pagination_context(request, activities,
+        order_field='-created_on'))
+    current_page = context['pagination_current_page']
+    current_page.object_list = prefetch_activities(current_page.object_list)
     return context
 
 register.inclusion_tag('projects/_wall.html')(project_wall)
 
 
 def tasks_list_wall(request, project, user, toggled_tasks=True):
-    tasks = Page.objects.filter(project=project, listed=True,
-        deleted=False).order_by('index')
-    tasks_count = tasks.count()
     is_participating = is_organizing = adopter = False
-    completed_count = 0
     if user.is_authenticated():
         profile = user.get_profile()
-        is_organizing = project.organizers().filter(user=profile).exists()
-        adopter = project.adopters().filter(user=profile).exists()
-        is_participating = project.participants().filter(user=profile).exists()
-        completed_count = PerUserTaskCompletion.objects.filter(
-            page__project=project, page__deleted=False,
-            unchecked_on__isnull=True, user=profile).count()
-    progressbar_value = 0
-    if tasks_count:
-        progressbar_value = (completed_count * 100 / tasks_count)
+        roles = get_user_roles(user)
+        is_organizing = roles.is_organizing(project)
+        adopter = roles.is_adopter(project)
+        is_participating = roles.is_participating(project)
+        progress = get_task_progress(project, profile)
+        tasks_count = progress.total
+        completed_count = progress.completed
+        progressbar_value = progress.percentage()
+    else:
+        tasks_count = count_tasks(project)
+        completed_count = progressbar_value = 0
     hidde_tasks_complete_msg = (progressbar_value != 100)
     adopter_request = (not is_organizing and not adopter)
     next_projects = project.next_projects.all()
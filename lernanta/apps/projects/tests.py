@@ -1,11 +1,30 @@
+import shutil
+import tempfile
+
 from django.test import Client
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, AnonymousUser
+from django.conf import settings
 
 from users.models import create_profile
-from projects.models import Project
+from projects.models import Project, Participation, PerUserTaskCompletion
+from projects.models import (TaskProgress, get_task_progress,
+    rebuild_task_progress)
+from projects.models import (ProjectCounters, count_project,
+    get_sidebar_version, SIDEBAR_VERSION_KEY)
+from projects import models as project_models
+from projects.templatetags import project_tags
+from content.models import Page
+from relationships.models import Relationship
+from activity.models import Activity
+from activity.schema import verbs
+from signups.models import Signup, SignupAnswer
+from links.models import Link
+from tracker.models import MetricsExport
 
 from test_utils import TestCase
 
+from drumbeat.testing import LocalCacheMixin
+
 
 class ProjectTests(TestCase):
 
@@ -79,3 +98,234 @@ class ProjectTests(TestCase):
         challenge = Project.objects.get(slug=slug)
         self.assertEqual(challenge.category, Project.CHALLENGE)
         self.assertEqual(challenge.duration_hours, 10)
+
+    def test_metrics_export_reused(self):
+        """Test that the detailed report is exported once per dataset"""
+        export_root = settings.METRICS_EXPORT_ROOT
+        settings.METRICS_EXPORT_ROOT = tempfile.mkdtemp()
+        try:
+            project = Project(name='Metrics Project',
+                short_description='This project has metrics',
+                long_description='No really, its good',
+            )
+            project.save()
+            Participation(project=project, user=self.user,
+                organizing=True).save()
+            self.client.login(username=self.test_username,
+                password=self.test_password)
+            url = '/%s/groups/%s/admin/export_detailed_csv/' % (
+                self.locale, project.slug)
+            response = self.client.get(url)
+            export = MetricsExport.objects.get(project=project)
+            export_url = '/%s/groups/%s/admin/metrics/exports/%s/' % (
+                self.locale, project.slug, export.id)
+            self.assertRedirects(response, export_url)
+            self.assertEqual(export.status, MetricsExport.DONE)
+            self.assertTrue(export.rows_written > 0)
+            self.client.get(url)
+            self.assertEqual(MetricsExport.objects.filter(
+                project=project).count(), 1)
+            response = self.client.get(export_url + 'download/')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue('Course: Metrics Project' in response.content)
+        finally:
+            shutil.rmtree(settings.METRICS_EXPORT_ROOT)
+            settings.METRICS_EXPORT_ROOT = export_root
+
+    def test_roles_read_once(self):
+        """Test that the roles of a user are read once and refreshed when
+        they change"""
+        project = Project(name='Roles Project',
+            short_description='This project has roles',
+            long_description='No really, its good',
+        )
+        project.save()
+        user = self.user.user
+        self.assertFalse(project.is_participating(user))
+        participation = Participation(project=project, user=self.user)
+        participation.save()
+        self.assertTrue(project.is_participating(user))
+        self.assertNumQueries(0, project.is_participating, user)
+        self.assertFalse(project.is_organizing(user))
+        participation.organizing = True
+        participation.save()
+        self.assertTrue(project.is_organizing(user))
+
+    def test_task_progress(self):
+        """Test that the task progress follows toggles and task changes"""
+        project = Project(name='Progress Challenge',
+            short_description='This challenge has tasks',
+            long_description='No really, its good',
+            category=Project.CHALLENGE,
+        )
+        project.save()
+        pages = []
+        for title in ('First task', 'Second task'):
+            page = Page(title=title, content=title, project=project,
+                author=self.user)
+            page.save()
+            pages.append(page)
+        PerUserTaskCompletion(user=self.user, page=pages[0]).save()
+        progress = get_task_progress(project, self.user)
+        self.assertEqual((progress.completed, progress.total), (1, 2))
+        self.assertFalse(progress.is_completed())
+        pages[1].listed = False
+        pages[1].save()
+        progress = get_task_progress(project, self.user)
+        self.assertEqual((progress.completed, progress.total), (1, 1))
+        self.assertTrue(progress.completed_on)
+        relationship = Relationship(source=self.user, target_project=project)
+        relationship.save()
+        self.assertEqual(list(project.completed_tasks_users()),
+            [relationship])
+
+    def test_rebuild_task_progress(self):
+        """Test that the progress of earlier completions is counted"""
+        project = Project(name='Finished Challenge',
+            short_description='This challenge was finished',
+            long_description='No really, its good',
+            category=Project.CHALLENGE,
+        )
+        project.save()
+        page = Page(title='Only task', content='Only task', project=project,
+            author=self.user)
+        page.save()
+        completion = PerUserTaskCompletion(user=self.user, page=page)
+        completion.save()
+        # progress rows missing, as before they were kept
+        TaskProgress.objects.filter(project=project).delete()
+        self.assertEqual(rebuild_task_progress(project), 1)
+        progress = get_task_progress(project, self.user)
+        self.assertEqual((progress.completed, progress.total), (1, 1))
+        self.assertEqual(progress.completed_on,
+            PerUserTaskCompletion.objects.get(id=completion.id).checked_on)
+
+
+class ProjectCounterTests(LocalCacheMixin, TestCase):
+
+    cached_modules = (project_models, project_tags)
+
+    def setUp(self):
+        profiles = []
+        for username in ('organizer', 'participant', 'follower'):
+            django_user = User(username=username,
+                email='%s@p2pu.org' % username)
+            profile = create_profile(django_user)
+            profile.set_password('testpass')
+            profile.save()
+            profiles.append(profile)
+        self.organizer, self.participant, self.follower = profiles
+        self.project = Project(name='Counted Project',
+            short_description='This project is counted',
+            long_description='No really, its good')
+        self.project.save()
+        Participation(project=self.project, user=self.organizer,
+            organizing=True).save()
+        Signup(author=self.organizer, project=self.project).save()
+
+    def get_counters(self):
+        return ProjectCounters.objects.filter(project=self.project).values(
+            *ProjectCounters.COUNTERS)[0]
+
+    def assertCounted(self, **counts):
+        counters = self.get_counters()
+        self.assertEqual(counters, count_project(self.project))
+        for name, count in counts.iteritems():
+            self.assertEqual(counters[name], count)
+
+    def test_participation_counters(self):
+        """Test that the counters follow the participations"""
+        self.assertCounted(organizers=1, participants=0)
+        participation = Participation(project=self.project,
+            user=self.participant)
+        participation.save()
+        self.assertCounted(organizers=1, participants=1)
+        participation.delete()
+        self.assertCounted(organizers=1, participants=0)
+
+    def test_follower_counters(self):
+        """Test that the counters follow the relationships"""
+        relationship = Relationship(source=self.follower,
+            target_project=self.project)
+        relationship.save()
+        self.assertCounted(followers=1)
+        relationship.delete()
+        self.assertCounted(followers=0)
+
+    def test_update_counters(self):
+        """Test that the counters follow the activities"""
+        updates = self.get_counters()['updates']
+        activity = Activity(actor=self.organizer, verb=verbs['post'],
+            target_object=self.project, scope_object=self.project)
+        activity.save()
+        self.assertCounted(updates=updates + 1)
+        activity.delete()
+        self.assertCounted(updates=updates)
+
+    def test_pending_signup_counters(self):
+        """Test that the counters follow the signup answers"""
+        sign_up = Signup.objects.get(project=self.project)
+        answers = []
+        for profile in (self.participant, self.follower):
+            answer = SignupAnswer(sign_up=sign_up, author=profile,
+                standard='Let me in')
+            answer.save()
+            answers.append(answer)
+        self.assertCounted(pending_signups=2)
+        answers[0].accepted = True
+        answers[0].save()
+        self.assertCounted(pending_signups=1)
+        answers[1].delete()
+        self.assertCounted(pending_signups=0)
+
+    def test_sidebar_keyed_by_role(self):
+        """Test that the cached sidebar data is kept for each role"""
+        organizer = project_tags.sidebar({'user': self.organizer.user,
+            'project': self.project})
+        anonymous = project_tags.sidebar({'user': AnonymousUser(),
+            'project': self.project})
+        self.assertTrue(organizer['organizing'])
+        self.assertFalse(anonymous['organizing'])
+        self.assertFalse(anonymous['participating'])
+        version = get_sidebar_version(self.project.id)
+        key = project_tags.SIDEBAR_KEY % (self.project.id, '000', version)
+        self.assertFalse(project_tags.cache.get(key) is None)
+        project_tags.cache.set(key, {'organizing': 'cached'})
+        self.assertEqual(project_tags.sidebar({'user': AnonymousUser(),
+            'project': self.project})['organizing'], 'cached')
+        self.assertTrue(project_tags.sidebar({'user': self.organizer.user,
+            'project': self.project})['organizing'])
+        key = project_tags.SIDEBAR_KEY % (self.project.id, '101', version)
+        self.assertTrue(project_tags.cache.get(key)['organizing'])
+
+    def reset_sidebar_version(self):
+        # the versions are in milliseconds, a bump right after the previous
+        # one could read the data cached for it
+        version = get_sidebar_version(self.project.id)
+        project_tags.cache.delete(project_tags.SIDEBAR_KEY % (
+            self.project.id, '000', version))
+        project_models.cache.set(SIDEBAR_VERSION_KEY % self.project.id, 0)
+
+    def test_sidebar_replaced(self):
+        """Test that the cached sidebar data is replaced when the links or
+        the sign-up of the project change"""
+        context = {'user': AnonymousUser(), 'project': self.project}
+        self.assertEqual(project_tags.sidebar(dict(context))['links'], [])
+        self.reset_sidebar_version()
+        link = Link(name='Reading', url='http://example.com/',
+            project=self.project)
+        link.save()
+        self.assertNotEqual(get_sidebar_version(self.project.id), 0)
+        self.assertEqual(project_tags.sidebar(dict(context))['links'],
+            [link])
+        self.reset_sidebar_version()
+        link.delete()
+        self.assertNotEqual(get_sidebar_version(self.project.id), 0)
+        self.assertEqual(project_tags.sidebar(dict(context))['links'], [])
+        self.reset_sidebar_version()
+        sign_up = Signup.objects.get(project=self.project)
+        sign_up.status = Signup.NON_MODERATED
+        sign_up.save()
+        self.assertNotEqual(get_sidebar_version(self.project.id), 0)
+        self.assertEqual(project_tags.sidebar(dict(context))[
+            'sign_up'].status, Signup.NON_MODERATED)
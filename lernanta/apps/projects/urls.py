@@ -134,6 +134,14 @@ urlpatterns = patterns('',
         'projects.views.export_detailed_csv',
         name='projects_admin_export_detailed_csv'),
 
+    url(r'^(?P<slug>[\w-]+)/admin/metrics/exports/(?P<export_id>\d+)/$',
+        'projects.views.metrics_export',
+        name='projects_admin_metrics_export'),
+
+    url(r'^(?P<slug>[\w-]+)/admin/metrics/exports/(?P<export_id>\d+)/download/$',
+        'projects.views.metrics_export_download',
+        name='projects_admin_metrics_export_download'),
+
     url(r'(?P<slug>[\w-]+)/edit/publish/$',
         'projects.views.publish',
         name='projects_publish'),
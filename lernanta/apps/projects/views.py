@@ -1,6 +1,6 @@
+import os
 import logging
 import datetime
-import unicodecsv
 import itertools
 
 from django import http
@@ -30,6 +30,8 @@ from activity.models import Activity
 from activity.schema import verbs
 from signups.models import Signup
 from tracker import models as tracker_models
+from tracker import exports as tracker_exports
+from tracker.tasks import ExportProjectMetrics
 from utils import json_date_encoder
 
 from drumbeat import messages
@@ -766,167 +768,56 @@ def admin_metrics_data_ajax(request, slug):
 @login_required
 @can_view_metric_detail
 def export_detailed_csv(request, slug):
-    """Display detailed CSV for certain users."""
+    """Start (or reuse) the export of the detailed CSV report."""
     project = get_object_or_404(Project, slug=slug)
-    # Preprocessing
-    organizers = project.organizers(include_deleted=True).order_by('user__username')
-    organizer_profiles = (organizer.user for organizer in organizers)
-    organizer_ids = organizers.values('user_id')
-    participants = project.non_organizer_participants(include_deleted=True).order_by(
-        'user__username')
-    participant_profiles = (participant.user for participant in participants)
-    participant_ids = participants.values('user_id')
-    followers = project.non_participant_followers(include_deleted=True).order_by(
-        'source__username')
-    follower_profiles = (follower.source for follower in followers)
-    follower_ids = followers.values('source_id')
-    previous_followers = project.previous_followers(include_deleted=True).order_by(
-        'source__username')
-    previous_follower_profiles = (previous.source for previous
-        in previous_followers)
-    previous_follower_ids = project.previous_followers().values('source_id')
-    headers = ["Time on Pages", "Non-zero Length Page Views",
-        "Zero-length Page Views", "Comments", "Page Edits"]
-    # Create csv response
-    response = http.HttpResponse(mimetype='text/csv')
+    tracker_exports.fail_stale_exports()
+    fingerprint = tracker_exports.get_dataset_fingerprint(project)
+    exports = tracker_models.MetricsExport.objects.filter(project=project,
+        fingerprint=fingerprint).exclude(
+        status=tracker_models.MetricsExport.FAILED).order_by('-created_on')
+    for export in exports:
+        if not export.is_ready() or os.path.exists(
+                tracker_exports.get_export_path(export.filename)):
+            return http.HttpResponseRedirect(export.get_absolute_url())
+    export = tracker_models.MetricsExport(project=project,
+        requested_by=request.user.get_profile(), fingerprint=fingerprint)
+    export.save()
+    ExportProjectMetrics.apply_async(args=(export.id,))
+    return http.HttpResponseRedirect(export.get_absolute_url())
+
+
+@hide_deleted_projects
+@login_required
+@can_view_metric_detail
+def metrics_export(request, slug, export_id):
+    """Progress of a detailed CSV report export."""
+    project = get_object_or_404(Project, slug=slug)
+    export = get_object_or_404(tracker_models.MetricsExport,
+        id=export_id, project=project)
+    return render_to_response('projects/project_admin_metrics_export.html', {
+        'project': project,
+        'export': export,
+        'can_view_metric_overview': True,
+        'metrics_tab': True,
+        'is_challenge': (project.category == project.CHALLENGE),
+    }, context_instance=RequestContext(request))
+
+
+@hide_deleted_projects
+@login_required
+@can_view_metric_detail
+def metrics_export_download(request, slug, export_id):
+    """Download the file of a finished detailed CSV report export."""
+    project = get_object_or_404(Project, slug=slug)
+    export = get_object_or_404(tracker_models.MetricsExport,
+        id=export_id, project=project, status=tracker_models.MetricsExport.DONE)
+    path = tracker_exports.get_export_path(export.filename)
+    if not os.path.exists(path):
+        raise http.Http404
+    response = http.HttpResponse(open(path, 'rb'), mimetype='text/csv')
     response['Content-Disposition'] = 'attachment; '
     response['Content-Disposition'] += 'filename=detailed_report.csv'
-    writer = unicodecsv.writer(response)
-    writer.writerow(["Course: " + project.name])
-    writer.writerow(["Data generated: " + datetime.datetime.now().strftime(
-        "%b %d, %Y")])
-    writer.writerow([])
-    writer.writerow([])
-    # Write Total Metrics
-    writer.writerow(["TOTALS"])
-    writer.writerow(["Organizers"] + headers)
-    metrics = tracker_models.user_total_metrics(project,
-        organizer_profiles)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Participants"] + headers)
-    metrics = tracker_models.user_total_metrics(project,
-        participant_profiles)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Followers"] + headers)
-    for row in tracker_models.user_total_metrics(project, follower_profiles):
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Previous Followers"] + headers)
-    metrics = tracker_models.user_total_metrics(project,
-        previous_follower_profiles)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Unauthenticated Visitors"] + headers)
-    for row in tracker_models.unauth_total_metrics(project):
-        writer.writerow(row + ["0"] * 2)
-    writer.writerow([])
-    writer.writerow([])
-    # Restoring profile iterators
-    organizer_profiles = (organizer.user for organizer in organizers)
-    participant_profiles = (participant.user for participant in participants)
-    follower_profiles = (follower.source for follower in followers)
-    previous_follower_profiles = (previous.source for previous
-        in previous_followers)
-    # Write Per Page Total Metrics
-    writer.writerow(["PER PAGE TOTALS"])
-    writer.writerow(["Organizers", "Page Paths"] + headers[:-2])
-    metrics = tracker_models.user_total_per_page_metrics(project,
-        organizer_ids)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Participants", "Page Paths"] + headers[:-2])
-    metrics = tracker_models.user_total_per_page_metrics(project,
-        participant_ids)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Followers", "Page Paths"] + headers[:-2])
-    metrics = tracker_models.user_total_per_page_metrics(project, follower_ids)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Previous Followers", "Page Paths"] + headers[:-2])
-    metrics = tracker_models.user_total_per_page_metrics(project,
-        previous_follower_ids)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Unauthenticated Visitors", "Page Paths"] + headers[:-2])
-    for row in tracker_models.unauth_total_per_page_metrics(project):
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow([])
-    # Write Chronological Metrics
-    writer.writerow(["CHRONOLOGICAL"])
-    writer.writerow(["Organizers", "Dates"] + headers)
-    metrics = tracker_models.chronological_user_metrics(project,
-        organizer_profiles)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Participants", "Dates"] + headers)
-    metrics = tracker_models.chronological_user_metrics(project,
-        participant_profiles)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Followers", "Dates"] + headers)
-    metrics = tracker_models.chronological_user_metrics(project,
-        follower_profiles)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Previous Followers", "Dates"] + headers)
-    metrics = tracker_models.chronological_user_metrics(project,
-        previous_follower_profiles)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Unauthenticated Visitors", "Dates"] + headers)
-    for row in tracker_models.chronological_unauth_metrics(project):
-        writer.writerow(row + ["0"] * 2)
-    writer.writerow([])
-    writer.writerow([])
-    # Write Chronological Per Page Metrics
-    writer.writerow(["CHRONOLOGICAL PER PAGE"])
-    writer.writerow(["Organizers", "Dates", "Page Paths"] + headers[:-2])
-    metrics = tracker_models.chronological_user_per_page_metrics(
-        project, organizer_ids)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Participants", "Dates", "Page Paths"] + headers[:-2])
-    metrics = tracker_models.chronological_user_per_page_metrics(
-        project, participant_ids)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Followers", "Dates", "Page Paths"] + headers[:-2])
-    metrics = tracker_models.chronological_user_per_page_metrics(
-        project, follower_ids)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Previous Followers", "Dates",
-        "Page Paths"] + headers[:-2])
-    metrics = tracker_models.chronological_user_per_page_metrics(project,
-        previous_follower_ids)
-    for row in metrics:
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow(["Unauthenticated Visitors", "Dates",
-        "Page Paths"] + headers[:-2])
-    for row in tracker_models.chronological_unauth_per_page_metrics(project):
-        writer.writerow(row)
-    writer.writerow([])
-    writer.writerow([])
-
+    response['Content-Length'] = os.path.getsize(path)
     return response
 
 
@@ -3,10 +3,11 @@ import logging
 
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.sites.models import Site
 from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
 
 from drumbeat.models import ModelBase
 from activity.models import Activity, register_filter
@@ -101,3 +102,38 @@ def follow_handler(sender, **kwargs):
 
 post_save.connect(follow_handler, sender=Relationship,
     dispatch_uid='relationships_follow_handler')
+
+
+def check_deleted_changed(sender, **kwargs):
+    rel = kwargs.get('instance', None)
+    rel._deleted_changed = False
+    if not settings.ACTIVITY_TIMELINES or not rel.pk:
+        return
+    rel._deleted_changed = Relationship.objects.filter(pk=rel.pk).exclude(
+        deleted=rel.deleted).exists()
+
+
+def rebuild_timeline(rel):
+    from activity.tasks import RebuildTimeline
+    RebuildTimeline.apply_async(args=(rel.source_id,))
+
+
+def rebuild_timeline_handler(sender, **kwargs):
+    rel = kwargs.get('instance', None)
+    if not settings.ACTIVITY_TIMELINES:
+        return
+    # only following or unfollowing changes the timeline
+    if kwargs.get('created', False) or rel._deleted_changed:
+        rebuild_timeline(rel)
+
+
+def rebuild_timeline_delete_handler(sender, **kwargs):
+    if settings.ACTIVITY_TIMELINES:
+        rebuild_timeline(kwargs.get('instance', None))
+
+pre_save.connect(check_deleted_changed, sender=Relationship,
+    dispatch_uid='relationships_check_deleted_changed')
+post_save.connect(rebuild_timeline_handler, sender=Relationship,
+    dispatch_uid='relationships_rebuild_timeline_handler')
+post_delete.connect(rebuild_timeline_delete_handler, sender=Relationship,
+    dispatch_uid='relationships_rebuild_timeline_delete_handler')
@@ -3,18 +3,19 @@ import datetime
 from django.db import models
 from django.contrib.sites.models import Site
 from django.utils.translation import ugettext_lazy as _
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.template.loader import render_to_string
 from django.contrib.contenttypes import generic
 from django.db.models import Q
-from django.conf import settings
 
 from notifications.models import send_notifications_i18n
 from drumbeat.models import ModelBase
 from richtext.models import RichTextField
+from pagination.views import get_page_number
 from activity.schema import object_types
 from replies.models import PageComment
-from projects.models import Participation
+from projects.models import Project, Participation
+from projects.models import update_project_counters, update_sidebar
 
 
 class Signup(ModelBase):
@@ -64,13 +65,8 @@ class Signup(ModelBase):
         return answers.order_by('-created_on')
 
     def get_page_for_answer(self, answer, user):
-        answer_index = 0
-        for visible_answer in self.get_visible_answers(user):
-            if visible_answer.id == answer.id:
-                break
-            answer_index += 1
-        items_per_page = settings.PAGINATION_DEFAULT_ITEMS_PER_PAGE
-        return (answer_index / items_per_page) + 1
+        return get_page_number(self.get_visible_answers(user), answer,
+            '-created_on')
 
     def get_answer_url(self, answer, user):
         page = self.get_page_for_answer(answer, user)
@@ -215,3 +211,24 @@ def post_save_answer(sender, **kwargs):
 
 post_save.connect(post_save_answer, sender=SignupAnswer,
     dispatch_uid='signups_post_save_answer')
+
+
+def count_pending_answers(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    try:
+        project_id = instance.sign_up.project_id
+    except Signup.DoesNotExist:
+        # deleted with its project
+        return
+    update_project_counters(Project(id=project_id), ('pending_signups',),
+        create=('created' in kwargs))
+
+
+post_save.connect(count_pending_answers, sender=SignupAnswer,
+    dispatch_uid='signups_count_pending_answers')
+post_delete.connect(count_pending_answers, sender=SignupAnswer,
+    dispatch_uid='signups_count_pending_answers_delete')
+post_save.connect(update_sidebar, sender=Signup,
+    dispatch_uid='signups_update_sidebar')
+post_delete.connect(update_sidebar, sender=Signup,
+    dispatch_uid='signups_update_sidebar_delete')
@@ -13,8 +13,7 @@ from relationships.models import Relationship
 from projects.decorators import organizer_required, restrict_project_kind
 from projects.decorators import hide_deleted_projects
 from pagination.views import get_pagination_context
-from projects.models import Project, Participation, PerUserTaskCompletion
-from content.models import Page
+from projects.models import Project, Participation, get_task_progress
 
 from signups.models import Signup
 from signups.forms import SignupForm, SignupAnswerForm
@@ -307,12 +306,8 @@ def direct_signup_adopter(request, slug):
     if participation.organizing:
         return http.HttpResponseForbidden(
             _('Organizers do not need to adopt the challenges.'))
-    completed_count = PerUserTaskCompletion.objects.filter(
-        page__project=project, page__deleted=False,
-        unchecked_on__isnull=True, user=profile).count()
-    tasks_count = Page.objects.filter(project=project, listed=True,
-        deleted=False).count()
-    if completed_count != tasks_count:
+    progress = get_task_progress(project, profile)
+    if progress.completed < progress.total:
         return http.HttpResponseForbidden(
             _('You need to complete all of the tasks before becoming an adopter.'))
     if participation.adopter:
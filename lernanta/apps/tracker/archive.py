@@ -0,0 +1,259 @@
+"""Retention of raw pageviews.
+
+Once the pageviews of a day are rolled up into PageViewMetrics (see
+tracker.rollup) and the day is older than TRACKER_ARCHIVE_AFTER_DAYS, they
+are moved from the live tables to gzip'd csv files for that day under
+settings.TRACKER_ARCHIVE_ROOT. ``iter_pageviews`` streams the archived
+and the live pageviews together.
+"""
+import os
+import re
+import gzip
+import datetime
+import logging
+from collections import namedtuple
+
+import unicodecsv
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min
+
+from drumbeat.utils import iter_keyset
+from tracker.models import (MetricsRollupWatermark, get_pageview_models,
+    get_pageview_table)
+from tracker.rollup import get_watermark_name
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_COLUMNS = ('id', 'session_key', 'user_id', 'access_time',
+    'request_url', 'referrer_url', 'ip_address', 'time_on_page',
+    'user_agent')
+
+INTEGER_COLUMNS = ('id', 'user_id', 'time_on_page')
+
+# Rows yielded by iter_pageviews, for both archived and live pageviews.
+ArchivedPageView = namedtuple('ArchivedPageView', ARCHIVE_COLUMNS)
+
+# One file is written per day, table and run, named after the ids of its
+# first and last pageviews. Older archives have a single file per day.
+FILENAME_RE = re.compile(r'^pageviews-(?P<day>\d{4}-\d{2}-\d{2})'
+    r'(?:-(?P<table>\w+?)-(?P<first_id>\d+)-(?P<last_id>\d+))?\.csv\.gz$')
+
+
+def get_archive_path(day, table, first_id, last_id):
+    return os.path.join(settings.TRACKER_ARCHIVE_ROOT,
+        'pageviews-%s-%s-%s-%s.csv.gz' % (day.isoformat(), table, first_id,
+        last_id))
+
+
+def get_archive_files():
+    """Sorted list of the (day, table, last id, path) of the archive files.
+    The table and last id of the older files are None."""
+    root = settings.TRACKER_ARCHIVE_ROOT
+    if not os.path.isdir(root):
+        return []
+    files = []
+    for filename in os.listdir(root):
+        match = FILENAME_RE.match(filename)
+        if match:
+            day = datetime.datetime.strptime(match.group('day'),
+                '%Y-%m-%d').date()
+            last_id = match.group('last_id')
+            files.append((day, match.group('table'),
+                last_id and int(last_id), os.path.join(root, filename)))
+    return sorted(files)
+
+
+def get_archived_days():
+    """Sorted list of the days with an archive file."""
+    return sorted(set(day for day, table, last_id, path
+        in get_archive_files()))
+
+
+def get_archived_id(day, table):
+    """Id of the last pageview of ``table`` accessed on ``day`` that was
+    written to an archive file, 0 if none was."""
+    return max([last_id for file_day, file_table, last_id, path
+        in get_archive_files() if file_day == day and file_table == table]
+        or [0])
+
+
+def get_rolled_up_id(model):
+    """Id of the last pageview of ``model`` rolled up into
+    PageViewMetrics, None if there was no rollup yet."""
+    try:
+        return MetricsRollupWatermark.objects.get(
+            name=get_watermark_name(model)).last_pageview_id
+    except MetricsRollupWatermark.DoesNotExist:
+        return None
+
+
+def get_archive_bound(now=None):
+    """First day that can not be archived yet, either because it is too
+    recent or because some of its pageviews were not rolled up."""
+    now = now or datetime.datetime.now()
+    bound = now.date() - datetime.timedelta(
+        days=settings.TRACKER_ARCHIVE_AFTER_DAYS)
+    for model in get_pageview_models():
+        rolled_up_id = get_rolled_up_id(model)
+        if rolled_up_id is None:
+            # nothing was rolled up yet
+            return None
+        first_pending = model.objects.filter(id__gt=rolled_up_id).aggregate(
+            Min('access_time'))['access_time__min']
+        if first_pending:
+            bound = min(bound, first_pending.date())
+    return bound
+
+
+def format_value(value):
+    if value is None:
+        return u''
+    return unicode(value)
+
+
+def parse_datetime(value):
+    if '.' in value:
+        return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f')
+    return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+
+def parse_row(row):
+    values = dict(zip(ARCHIVE_COLUMNS, [value or None for value in row]))
+    for column in INTEGER_COLUMNS:
+        if values[column] is not None:
+            values[column] = int(values[column])
+    values['access_time'] = parse_datetime(values['access_time'])
+    return ArchivedPageView(**values)
+
+
+def write_archive(day, table, rows):
+    """Writes ``rows`` of ``table`` to a new archive file for ``day``.
+    Returns the id of the last row written, None if there were no rows."""
+    tmp_path = os.path.join(settings.TRACKER_ARCHIVE_ROOT,
+        'pageviews-%s-%s.tmp' % (day.isoformat(), table))
+    first_id = last_id = None
+    f = gzip.open(tmp_path, 'wb')
+    try:
+        writer = unicodecsv.writer(f, encoding='utf-8')
+        writer.writerow(ARCHIVE_COLUMNS)
+        for row in rows:
+            writer.writerow([format_value(value) for value in row])
+            if first_id is None:
+                first_id = row[0]
+            last_id = row[0]
+    finally:
+        f.close()
+    if last_id is None:
+        os.remove(tmp_path)
+    else:
+        os.rename(tmp_path, get_archive_path(day, table, first_id, last_id))
+    return last_id
+
+
+def delete_pageviews(model, start, end, last_id):
+    """Deletes the pageviews of ``model`` accessed between ``start`` and
+    ``end`` up to ``last_id`` (pageviews stored while archiving are
+    kept)."""
+    qn = connection.ops.quote_name
+    sql = 'DELETE FROM %s WHERE %s >= %%s AND %s < %%s AND %s <= %%s' % (
+        qn(get_pageview_table(model)), qn('access_time'),
+        qn('access_time'), qn('id'))
+    cursor = connection.cursor()
+    cursor.execute(sql, [start, end, last_id])
+    return cursor.rowcount
+
+
+@transaction.commit_on_success
+def archive_day(day):
+    """Moves the rolled up pageviews of ``day`` to archive files. Returns
+    the number of pageviews archived.
+
+    The pageviews already written by a run whose deletion was not
+    committed are not written again, only deleted."""
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+    if not os.path.isdir(settings.TRACKER_ARCHIVE_ROOT):
+        os.makedirs(settings.TRACKER_ARCHIVE_ROOT)
+    count = 0
+    for model in get_pageview_models():
+        rolled_up_id = get_rolled_up_id(model)
+        if not rolled_up_id:
+            continue
+        table = get_pageview_table(model)
+        archived_id = get_archived_id(day, table)
+        pageviews = model.objects.filter(access_time__gte=start,
+            access_time__lt=end, id__gt=archived_id,
+            id__lte=rolled_up_id).order_by('id').values_list(
+            *ARCHIVE_COLUMNS)
+        last_id = write_archive(day, table,
+            pageviews.iterator()) or archived_id
+        if last_id:
+            count += delete_pageviews(model, start, end, last_id)
+    return count
+
+
+def archive_pageviews(now=None):
+    """Archives all the days that are rolled up and older than
+    TRACKER_ARCHIVE_AFTER_DAYS. Returns the number of pageviews
+    archived."""
+    bound = get_archive_bound(now)
+    if bound is None:
+        return 0
+    first_accesses = [model.objects.aggregate(Min('access_time'))[
+        'access_time__min'] for model in get_pageview_models()]
+    first_accesses = [access for access in first_accesses if access]
+    if not first_accesses:
+        return 0
+    first_access = min(first_accesses)
+    count = 0
+    day = first_access.date()
+    while day < bound:
+        archived = archive_day(day)
+        if archived:
+            log.debug('archived %s pageviews of %s' % (archived, day))
+        count += archived
+        day += datetime.timedelta(days=1)
+    return count
+
+
+def iter_archived_pageviews(day):
+    for file_day, table, last_id, path in get_archive_files():
+        if file_day != day:
+            continue
+        f = gzip.open(path, 'rb')
+        try:
+            for row in unicodecsv.reader(f, encoding='utf-8'):
+                # each gzip member of the older files starts with a header
+                if tuple(row) == ARCHIVE_COLUMNS:
+                    continue
+                yield parse_row(row)
+        finally:
+            f.close()
+
+
+def iter_pageviews(start=None, end=None, filters=None, matcher=None):
+    """Streams the archived pageviews and then the live ones of both
+    pageview tables, as ArchivedPageView rows.
+
+    ``start`` and ``end`` are optional dates (both included). ``filters``
+    (a Q object) selects the live pageviews and ``matcher`` (a callable
+    taking a row) selects the archived ones; they should be equivalent."""
+    for day in get_archived_days():
+        if (start and day < start) or (end and day > end):
+            continue
+        for pageview in iter_archived_pageviews(day):
+            if matcher is None or matcher(pageview):
+                yield pageview
+    for model in get_pageview_models():
+        pageviews = model.objects.all()
+        if filters is not None:
+            pageviews = pageviews.filter(filters)
+        if start:
+            pageviews = pageviews.filter(access_time__gte=start)
+        if end:
+            pageviews = pageviews.filter(
+                access_time__lt=end + datetime.timedelta(days=1))
+        for values in iter_keyset(pageviews, ARCHIVE_COLUMNS[1:]):
+            yield ArchivedPageView(*values)
@@ -0,0 +1,7 @@
+from django.conf.urls.defaults import patterns, url
+
+# Not localized, listed in settings.SUPPORTED_NONLOCALES.
+urlpatterns = patterns('',
+  url(r'^beacon/$', 'tracker.views.beacon',
+      name='tracker_beacon'),
+)
@@ -0,0 +1,76 @@
+"""Daily counters read by the scoreboard.
+
+DailyCounter rows are incremented by signal handlers (see the end of
+tracker.models) when the counted objects are created. The
+reconcile_daily_counters periodic task recomputes recent days from the
+counted tables, covering objects changed without signals, and backfills
+all the days when there are no counters yet.
+"""
+import datetime
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from drumbeat.utils import iter_keyset
+from users.models import UserProfile
+from replies.models import PageComment
+from projects.models import Participation, Project
+from tracker.models import DailyCounter
+
+
+def get_counted_objects():
+    """Returns the objects counted by each counter and the field with the
+    date they are counted on."""
+    from signups.models import SignupAnswer
+    ct = ContentType.objects.get_for_model(SignupAnswer)
+    return {
+        'users': (UserProfile.objects.all(), 'user__date_joined'),
+        'comments': (PageComment.objects.exclude(page_content_type=ct),
+            'created_on'),
+        'joins': (Participation.objects.filter(project__test=False,
+            left_on__isnull=True), 'joined_on'),
+        'groups': (Project.objects.filter(test=False), 'created_on'),
+    }
+
+
+@transaction.commit_on_success
+def reconcile_daily_counters(start=None):
+    """Recomputes the counters of the days since ``start`` (all the days
+    if None)."""
+    for name, (objects, date_field) in get_counted_objects().iteritems():
+        counters = DailyCounter.objects.filter(name=name)
+        if start:
+            objects = objects.filter(**{date_field + '__gte': start})
+            counters = counters.filter(date__gte=start)
+        counts = defaultdict(int)
+        for object_id, value in iter_keyset(objects, (date_field,)):
+            counts[value.date()] += 1
+        stored = dict(counters.values_list('date', 'count'))
+        for date in set(stored) - set(counts):
+            counts[date] = 0
+        for date, count in counts.iteritems():
+            if date not in stored:
+                DailyCounter.objects.create(name=name, date=date,
+                    count=count)
+            elif stored[date] != count:
+                counters.filter(date=date).update(count=count)
+
+
+def get_counts(name, time_details):
+    """Returns the count of today, this month and the previous month."""
+    first_day = datetime.date(time_details['prev_month_year'],
+        time_details['prev_month'], 1)
+    counters = DailyCounter.objects.filter(name=name,
+        date__gte=first_day).values_list('date', 'count')
+    today = this_month = prev_month = 0
+    for date, count in counters:
+        if (date.year, date.month) == (time_details['year'],
+                time_details['month']):
+            this_month += count
+            if date.day == time_details['day']:
+                today += count
+        elif (date.year, date.month) == (time_details['prev_month_year'],
+                time_details['prev_month']):
+            prev_month += count
+    return today, this_month, prev_month
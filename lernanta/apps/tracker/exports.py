@@ -0,0 +1,239 @@
+"""Detailed metrics reports for project organizers.
+
+The reports are written by a celery task (tracker.tasks.ExportProjectMetrics)
+to a file under settings.METRICS_EXPORT_ROOT and reused while the data
+they are built from does not change.
+"""
+import os
+import time
+import hashlib
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from relationships.models import Relationship
+from projects.models import Participation
+from tracker.models import (PageViewMetrics, MetricsRollupWatermark,
+    MetricsExport, user_total_metrics,
+    unauth_total_metrics, user_total_per_page_metrics,
+    unauth_total_per_page_metrics, chronological_user_metrics,
+    chronological_unauth_metrics, chronological_user_per_page_metrics,
+    chronological_unauth_per_page_metrics, get_project_comments,
+    get_project_task_edits)
+
+
+def get_dataset_fingerprint(project):
+    """Digest of the state of the data a detailed report is built from."""
+    state = [project.id, project.name]
+    querysets = [
+        PageViewMetrics.objects.filter(project=project),
+        get_project_comments(project),
+        get_project_task_edits(project),
+        Participation.objects.filter(project=project),
+    ]
+    for queryset in querysets:
+        state.extend(sorted(queryset.aggregate(Count('id'),
+            Max('id')).items()))
+    state.append(Participation.objects.filter(project=project).aggregate(
+        Max('left_on')))
+    relationships = Relationship.objects.filter(target_project=project)
+    state.append(relationships.aggregate(Count('id'), Max('id')))
+    state.append(relationships.filter(deleted=True).count())
+    # the rollup increments the stored metrics without adding rows
+    state.extend(MetricsRollupWatermark.objects.order_by('name').values_list(
+        'name', 'last_pageview_id'))
+    return hashlib.sha1(repr(state)).hexdigest()
+
+
+def get_export_path(filename):
+    return os.path.join(settings.METRICS_EXPORT_ROOT, filename)
+
+
+def fail_stale_exports(now=None):
+    """Marks as failed the exports still pending or running
+    METRICS_EXPORT_TIMEOUT seconds after they were requested (their task
+    was lost or killed), so they are requested again. Returns the number
+    of exports marked."""
+    now = now or datetime.datetime.now()
+    cutoff = now - datetime.timedelta(seconds=settings.METRICS_EXPORT_TIMEOUT)
+    return MetricsExport.objects.filter(status__in=(MetricsExport.PENDING,
+        MetricsExport.RUNNING), created_on__lt=cutoff).update(
+        status=MetricsExport.FAILED, finished_on=now)
+
+
+def remove_old_exports(now=None):
+    """Removes the report files written more than METRICS_EXPORT_MAX_AGE
+    days ago. Returns the number of files removed."""
+    root = settings.METRICS_EXPORT_ROOT
+    if not os.path.isdir(root):
+        return 0
+    now = now or datetime.datetime.now()
+    cutoff = time.mktime((now - datetime.timedelta(
+        days=settings.METRICS_EXPORT_MAX_AGE)).timetuple())
+    removed = 0
+    for filename in os.listdir(root):
+        path = os.path.join(root, filename)
+        if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def write_detailed_report(project, writer):
+    """Writes the detailed metrics report of ``project`` using ``writer``
+    (a csv writer)."""
+    # Preprocessing
+    organizers = project.organizers(include_deleted=True).order_by(
+        'user__username').select_related('user')
+    organizer_profiles = (organizer.user for organizer in organizers)
+    organizer_ids = organizers.values('user_id')
+    participants = project.non_organizer_participants(include_deleted=True).order_by(
+        'user__username').select_related('user')
+    participant_profiles = (participant.user for participant in participants)
+    participant_ids = participants.values('user_id')
+    followers = project.non_participant_followers(include_deleted=True).order_by(
+        'source__username').select_related('source')
+    follower_profiles = (follower.source for follower in followers)
+    follower_ids = followers.values('source_id')
+    previous_followers = project.previous_followers(include_deleted=True).order_by(
+        'source__username').select_related('source')
+    previous_follower_profiles = (previous.source for previous
+        in previous_followers)
+    previous_follower_ids = project.previous_followers().values('source_id')
+    headers = ["Time on Pages", "Non-zero Length Page Views",
+        "Zero-length Page Views", "Comments", "Page Edits"]
+    writer.writerow(["Course: " + project.name])
+    writer.writerow(["Data generated: " + datetime.datetime.now().strftime(
+        "%b %d, %Y")])
+    writer.writerow([])
+    writer.writerow([])
+    # Write Total Metrics
+    writer.writerow(["TOTALS"])
+    writer.writerow(["Organizers"] + headers)
+    metrics = user_total_metrics(project,
+        organizer_profiles)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Participants"] + headers)
+    metrics = user_total_metrics(project,
+        participant_profiles)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Followers"] + headers)
+    for row in user_total_metrics(project, follower_profiles):
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Previous Followers"] + headers)
+    metrics = user_total_metrics(project,
+        previous_follower_profiles)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Unauthenticated Visitors"] + headers)
+    for row in unauth_total_metrics(project):
+        writer.writerow(row + ["0"] * 2)
+    writer.writerow([])
+    writer.writerow([])
+    # Restoring profile iterators
+    organizer_profiles = (organizer.user for organizer in organizers)
+    participant_profiles = (participant.user for participant in participants)
+    follower_profiles = (follower.source for follower in followers)
+    previous_follower_profiles = (previous.source for previous
+        in previous_followers)
+    # Write Per Page Total Metrics
+    writer.writerow(["PER PAGE TOTALS"])
+    writer.writerow(["Organizers", "Page Paths"] + headers[:-2])
+    metrics = user_total_per_page_metrics(project,
+        organizer_ids)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Participants", "Page Paths"] + headers[:-2])
+    metrics = user_total_per_page_metrics(project,
+        participant_ids)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Followers", "Page Paths"] + headers[:-2])
+    metrics = user_total_per_page_metrics(project, follower_ids)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Previous Followers", "Page Paths"] + headers[:-2])
+    metrics = user_total_per_page_metrics(project,
+        previous_follower_ids)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Unauthenticated Visitors", "Page Paths"] + headers[:-2])
+    for row in unauth_total_per_page_metrics(project):
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow([])
+    # Write Chronological Metrics
+    writer.writerow(["CHRONOLOGICAL"])
+    writer.writerow(["Organizers", "Dates"] + headers)
+    metrics = chronological_user_metrics(project,
+        organizer_profiles)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Participants", "Dates"] + headers)
+    metrics = chronological_user_metrics(project,
+        participant_profiles)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Followers", "Dates"] + headers)
+    metrics = chronological_user_metrics(project,
+        follower_profiles)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Previous Followers", "Dates"] + headers)
+    metrics = chronological_user_metrics(project,
+        previous_follower_profiles)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Unauthenticated Visitors", "Dates"] + headers)
+    for row in chronological_unauth_metrics(project):
+        writer.writerow(row + ["0"] * 2)
+    writer.writerow([])
+    writer.writerow([])
+    # Write Chronological Per Page Metrics
+    writer.writerow(["CHRONOLOGICAL PER PAGE"])
+    writer.writerow(["Organizers", "Dates", "Page Paths"] + headers[:-2])
+    metrics = chronological_user_per_page_metrics(
+        project, organizer_ids)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Participants", "Dates", "Page Paths"] + headers[:-2])
+    metrics = chronological_user_per_page_metrics(
+        project, participant_ids)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Followers", "Dates", "Page Paths"] + headers[:-2])
+    metrics = chronological_user_per_page_metrics(
+        project, follower_ids)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Previous Followers", "Dates",
+        "Page Paths"] + headers[:-2])
+    metrics = chronological_user_per_page_metrics(project,
+        previous_follower_ids)
+    for row in metrics:
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow(["Unauthenticated Visitors", "Dates",
+        "Page Paths"] + headers[:-2])
+    for row in chronological_unauth_per_page_metrics(project):
+        writer.writerow(row)
+    writer.writerow([])
+    writer.writerow([])
@@ -0,0 +1,408 @@
+"""Buffered PageView ingestion.
+
+Pageview records are kept in a bounded per-process buffer and written to
+the database with multi-row inserts, either by a background flusher thread
+or by handing the batch to celery. The request that produces a pageview
+never waits for the tracker tables.
+"""
+import time
+import atexit
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from drumbeat.utils import bulk_insert
+from tracker.models import PageView, CompactPageView
+from tracker.utils import pack_ip
+from tracker import interning
+from tracker.paths import resolve_pages
+from tracker.last_pageview import (MAX_TIME_ON_PAGE, get_last_pageviews,
+    set_last_pageviews)
+
+log = logging.getLogger(__name__)
+
+# Columns written by the bulk insert, in order.
+PAGEVIEW_COLUMNS = ('session_key', 'user_id', 'access_time', 'request_url',
+    'referrer_url', 'ip_address', 'time_on_page', 'user_agent', 'page_path',
+    'project_id')
+
+# Columns written when pageviews are stored as CompactPageView rows.
+COMPACT_COLUMNS = ('session_key', 'user_id', 'access_time', 'url_id',
+    'referrer_id', 'user_agent_id', 'ip_number', 'time_on_page')
+
+
+def get_write_model():
+    """Model new pageviews are stored as."""
+    if settings.TRACKER_COMPACT_PAGEVIEWS:
+        return CompactPageView
+    return PageView
+
+
+def add_page_fields(records):
+    """Sets the page path and project of the records."""
+    pages = resolve_pages(set(record['request_url'] for record in records))
+    for record in records:
+        record['page_path'], record['project_id'] = pages[
+            record['request_url']]
+    return records
+
+
+def compact_records(records):
+    """Replaces the strings of the records by their interned ids."""
+    url_ids = interning.get_url_interner().get_ids(
+        [record['request_url'] for record in records])
+    referrer_ids = interning.get_referrer_interner().get_ids(
+        [record.get('referrer_url') for record in records])
+    user_agent_ids = interning.get_user_agent_interner().get_ids(
+        [record.get('user_agent') for record in records])
+    compacted = []
+    for record in records:
+        compacted.append({
+            'session_key': record['session_key'],
+            'user_id': record.get('user_id'),
+            'access_time': record['access_time'],
+            'url_id': url_ids[record['request_url']],
+            'referrer_id': referrer_ids.get(record.get('referrer_url')),
+            'user_agent_id': user_agent_ids.get(record.get('user_agent')),
+            'ip_number': pack_ip(record.get('ip_address')),
+            'time_on_page': record.get('time_on_page'),
+        })
+    return compacted
+
+
+def get_time_on_page(previous_access_time, access_time):
+    """Seconds between two pageviews of a session, or None when the gap
+    is too long to be a single visit."""
+    delta = access_time - previous_access_time
+    if delta.days == 0 and delta.seconds < MAX_TIME_ON_PAGE:
+        return delta.seconds
+    return None
+
+
+def update_time_on_page(durations):
+    """Sets time_on_page for several pageviews with a single UPDATE.
+
+    ``durations`` maps pageview ids to their time on page in seconds."""
+    if not durations:
+        return
+    qn = connection.ops.quote_name
+    table = qn(get_write_model()._meta.db_table)
+    cases = ' '.join(['WHEN %s THEN %s'] * len(durations))
+    params = []
+    for pageview_id, seconds in durations.iteritems():
+        params.extend([pageview_id, seconds])
+    ids = durations.keys()
+    sql = 'UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+        table, qn('time_on_page'), qn('id'), cases, qn('id'),
+        ', '.join(['%s'] * len(ids)))
+    cursor = connection.cursor()
+    cursor.execute(sql, params + ids)
+
+
+def insert_pageviews(records):
+    """Writes pageview records using multi-row INSERT statements."""
+    model = get_write_model()
+    if model is CompactPageView:
+        records = compact_records(records)
+        columns = COMPACT_COLUMNS
+    else:
+        records = add_page_fields(records)
+        columns = PAGEVIEW_COLUMNS
+    rows = [[record.get(column) for column in columns]
+        for record in records]
+    bulk_insert(model, columns, rows)
+
+
+def save_pageview(record):
+    """Stores a single pageview record. Returns its
+    (id, access_time) pair."""
+    model = get_write_model()
+    if model is CompactPageView:
+        record = compact_records([record])[0]
+        columns = COMPACT_COLUMNS
+    else:
+        record = add_page_fields([record])[0]
+        columns = PAGEVIEW_COLUMNS
+    pageview = model.objects.create(**dict((column, record.get(column))
+        for column in columns))
+    return pageview.id, pageview.access_time
+
+
+def resolve_previous_pageviews(records):
+    """Fills in time_on_page for the last stored pageview of each session
+    whose first record in this batch has no predecessor in the batch."""
+    first_access = {}
+    for record in records:
+        if record.get('has_previous'):
+            continue
+        session_key = record['session_key']
+        if session_key not in first_access:
+            first_access[session_key] = record['access_time']
+    previous = get_last_pageviews(first_access.keys())
+    durations = {}
+    for session_key, (pageview_id, access_time) in previous.iteritems():
+        seconds = get_time_on_page(access_time, first_access[session_key])
+        if seconds is not None:
+            durations[pageview_id] = seconds
+    update_time_on_page(durations)
+
+
+def remember_last_pageviews(records):
+    """Stores the id and access time of the last inserted pageview of each
+    session in the batch so the next batch can update its time_on_page."""
+    last_access = {}
+    for record in records:
+        last_access[record['session_key']] = record['access_time']
+    first_access_time = min(last_access.values())
+    last_ids = get_write_model().objects.filter(session_key__in=last_access.keys(),
+        access_time__gte=first_access_time).values('session_key').annotate(
+        last_id=Max('id')).values_list('session_key', 'last_id')
+    set_last_pageviews(dict((session_key, (last_id, last_access[session_key]))
+        for session_key, last_id in last_ids))
+
+
+@transaction.commit_on_success
+def flush_pageviews(records):
+    """Stores a batch of buffered pageview records."""
+    if not records:
+        return
+    resolve_previous_pageviews(records)
+    insert_pageviews(records)
+    remember_last_pageviews(records)
+
+
+def make_duration_record(session_key, pageview_id, seconds):
+    """Time on page reported by the browser (see tracker.views.beacon).
+    Returns None if the duration is not a single page visit."""
+    pageview_id, seconds = int(pageview_id), int(seconds)
+    if pageview_id <= 0 or seconds < 0 or seconds >= MAX_TIME_ON_PAGE:
+        return None
+    return {
+        'session_key': session_key,
+        'pageview_id': pageview_id,
+        'time_on_page': seconds,
+    }
+
+
+@transaction.commit_on_success
+def apply_durations(records):
+    """Sets time_on_page from a batch of duration records, ignoring the
+    ones reported for pageviews of other sessions."""
+    if not records:
+        return
+    durations = {}
+    for record in records:
+        durations[record['pageview_id']] = (record['session_key'],
+            record['time_on_page'])
+    sessions = dict(get_write_model().objects.filter(
+        id__in=durations.keys()).values_list('id', 'session_key'))
+    update_time_on_page(dict((pageview_id, seconds)
+        for pageview_id, (session_key, seconds) in durations.iteritems()
+        if sessions.get(pageview_id) == session_key))
+
+
+class PageViewBuffer(object):
+    """Bounded buffer of pageview records waiting to be written.
+
+    Records are dictionaries keyed by ``PAGEVIEW_COLUMNS``. The buffer
+    becomes ready to flush once it holds ``flush_size`` records or its
+    oldest record is ``flush_age`` seconds old. When it holds ``max_size``
+    records new ones are dropped (and counted) instead of blocking the
+    request."""
+
+    kind = 'pageview'
+
+    def __init__(self, max_size, flush_size, flush_age):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_age = flush_age
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.records = []
+        self.last_by_session = {}
+        self.oldest = None
+        self.added = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+
+    def add(self, record):
+        """Queues a record. Returns False if it was dropped."""
+        self.lock.acquire()
+        try:
+            if len(self.records) >= self.max_size:
+                self.dropped += 1
+                if self.dropped % self.flush_size == 1:
+                    log.warning('%s buffer full, %s records dropped.' % (
+                        self.kind.capitalize(), self.dropped))
+                return False
+            self.link(record)
+            self.records.append(record)
+            self.added += 1
+            if self.oldest is None:
+                self.oldest = time.time()
+            if len(self.records) >= self.flush_size:
+                self.ready.set()
+            return True
+        finally:
+            self.lock.release()
+
+    def link(self, record):
+        """Sets the time on page of the previous record of the session."""
+        session_key = record['session_key']
+        previous = self.last_by_session.get(session_key)
+        if previous:
+            previous['time_on_page'] = get_time_on_page(
+                previous['access_time'], record['access_time'])
+            record['has_previous'] = True
+        self.last_by_session[session_key] = record
+
+    def should_flush(self):
+        self.lock.acquire()
+        try:
+            if not self.records:
+                return False
+            if len(self.records) >= self.flush_size:
+                return True
+            return (time.time() - self.oldest) >= self.flush_age
+        finally:
+            self.lock.release()
+
+    def drain(self):
+        """Removes and returns all the buffered records."""
+        self.lock.acquire()
+        try:
+            records = self.records
+            self.records = []
+            self.last_by_session = {}
+            self.oldest = None
+            self.ready.clear()
+            return records
+        finally:
+            self.lock.release()
+
+    def flush(self):
+        records = self.drain()
+        if not records:
+            return 0
+        try:
+            self.store(records)
+        except Exception, error:
+            self.failed += len(records)
+            log.error('An error occurred flushing %s %s records: %s' %
+                (len(records), self.kind, error))
+            return 0
+        self.flushed += len(records)
+        return len(records)
+
+    def store(self, records):
+        if getattr(settings, 'TRACKER_BUFFER_FLUSH_ASYNC', False):
+            from tracker.tasks import FlushPageViews
+            FlushPageViews.apply_async((records,))
+        else:
+            flush_pageviews(records)
+
+    def stats(self):
+        return {
+            'buffered': len(self.records),
+            'added': self.added,
+            'dropped': self.dropped,
+            'flushed': self.flushed,
+            'failed': self.failed,
+        }
+
+
+class DurationBuffer(PageViewBuffer):
+    """Buffer of the durations reported by the time on page beacon."""
+
+    kind = 'duration'
+
+    def link(self, record):
+        pass
+
+    def store(self, records):
+        if getattr(settings, 'TRACKER_BUFFER_FLUSH_ASYNC', False):
+            from tracker.tasks import ApplyDurations
+            ApplyDurations.apply_async((records,))
+        else:
+            apply_durations(records)
+
+
+class BufferFlusher(threading.Thread):
+    """Daemon thread flushing the buffer on size or age."""
+
+    def __init__(self, buffer):
+        super(BufferFlusher, self).__init__(
+            name='%s-buffer-flusher' % buffer.kind)
+        self.daemon = True
+        self.buffer = buffer
+
+    def run(self):
+        while True:
+            self.buffer.ready.wait(self.buffer.flush_age)
+            if self.buffer.should_flush():
+                self.buffer.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Returns this process' pageview buffer, starting its flusher thread
+    on first use."""
+    global _buffer
+    if _buffer is None:
+        _buffer_lock.acquire()
+        try:
+            if _buffer is None:
+                buffer = PageViewBuffer(settings.TRACKER_BUFFER_MAX_SIZE,
+                    settings.TRACKER_BUFFER_FLUSH_SIZE,
+                    settings.TRACKER_BUFFER_FLUSH_AGE)
+                BufferFlusher(buffer).start()
+                # the records left when the process exits
+                atexit.register(buffer.flush)
+                _buffer = buffer
+        finally:
+            _buffer_lock.release()
+    return _buffer
+
+
+_duration_buffer = None
+
+
+def get_duration_buffer():
+    """Returns this process' duration buffer, starting its flusher thread
+    on first use."""
+    global _duration_buffer
+    if _duration_buffer is None:
+        _buffer_lock.acquire()
+        try:
+            if _duration_buffer is None:
+                buffer = DurationBuffer(settings.TRACKER_BUFFER_MAX_SIZE,
+                    settings.TRACKER_BUFFER_FLUSH_SIZE,
+                    settings.TRACKER_BUFFER_FLUSH_AGE)
+                BufferFlusher(buffer).start()
+                atexit.register(buffer.flush)
+                _duration_buffer = buffer
+        finally:
+            _buffer_lock.release()
+    return _duration_buffer
+
+
+def make_record(session_key, user_id, request_url, referrer_url,
+        ip_address, user_agent):
+    return {
+        'session_key': session_key,
+        'user_id': user_id,
+        'access_time': datetime.datetime.now(),
+        'request_url': request_url,
+        'referrer_url': referrer_url,
+        'ip_address': ip_address,
+        'time_on_page': None,
+        'user_agent': user_agent,
+    }
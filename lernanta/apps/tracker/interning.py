@@ -0,0 +1,119 @@
+"""Resolution of the strings stored in the tracker dictionary tables.
+
+Pageviews stored as CompactPageView reference their url, referrer and
+user agent by id. The ids are resolved at ingest from a per-process LRU,
+then the django cache and only then the dictionary tables, where the
+missing strings are added.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils.encoding import smart_str
+
+from tracker.last_pageview import LocalLRUStore
+from tracker.paths import resolve_pages
+from tracker.models import TrackedUrl, TrackedReferrer, TrackedUserAgent
+
+# Interned ids never change, keep them around for a day.
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_digest(value):
+    return hashlib.sha1(smart_str(value)).hexdigest()
+
+
+class Interner(object):
+    """Maps the strings of a dictionary table (an InternedString model)
+    to their ids."""
+
+    def __init__(self, model, max_entries):
+        self.model = model
+        self.local = LocalLRUStore(max_entries, CACHE_TIMEOUT)
+        self.key_prefix = 'tracker_interned_%s_' % model._meta.module_name
+
+    def get_ids(self, values):
+        """Returns a dict with the id of each of the given strings."""
+        values = set(value for value in values if value is not None)
+        ids = self.local.get_many(values)
+        missing = dict((get_digest(value), value) for value in values
+            if value not in ids)
+        if missing:
+            found = self.lookup(missing)
+            self.local.set_many(found)
+            ids.update(found)
+        return ids
+
+    def get_id(self, value):
+        if value is None:
+            return None
+        return self.get_ids([value])[value]
+
+    def lookup(self, digests):
+        """Resolves ``digests`` (a dict of digest -> value) from the cache
+        and the database, adding the strings not stored yet."""
+        found = {}
+        cached = cache.get_many([self.key_prefix + digest
+            for digest in digests])
+        for key, value_id in cached.iteritems():
+            found[digests[key[len(self.key_prefix):]]] = value_id
+        missing = dict((digest, value) for digest, value
+            in digests.iteritems() if value not in found)
+        if missing:
+            stored = dict(self.model.objects.filter(
+                digest__in=missing.keys()).values_list('digest', 'id'))
+            for digest, value in missing.iteritems():
+                value_id = stored.get(digest)
+                if value_id is None:
+                    value_id = self.create(digest, value)
+                found[value] = value_id
+            cache.set_many(dict((self.key_prefix + digest, found[value])
+                for digest, value in missing.iteritems()), CACHE_TIMEOUT)
+        return found
+
+    def get_fields(self, value):
+        """Extra fields stored along a new string."""
+        return {}
+
+    def create(self, digest, value):
+        sid = transaction.savepoint()
+        try:
+            instance = self.model.objects.create(digest=digest, value=value,
+                **self.get_fields(value))
+            transaction.savepoint_commit(sid)
+            return instance.id
+        except IntegrityError:
+            # stored by a concurrent ingest
+            transaction.savepoint_rollback(sid)
+            return self.model.objects.get(digest=digest).id
+
+
+class UrlInterner(Interner):
+    """Stores the page path and project of the urls."""
+
+    def get_fields(self, value):
+        page_path, project_id = resolve_pages([value])[value]
+        return {'page_path': page_path, 'project_id': project_id}
+
+
+_interners = {}
+
+
+def get_interner(model, interner_class=Interner):
+    if model not in _interners:
+        _interners[model] = interner_class(model,
+            settings.TRACKER_INTERNING_MAX_ENTRIES)
+    return _interners[model]
+
+
+def get_url_interner():
+    return get_interner(TrackedUrl, UrlInterner)
+
+
+def get_referrer_interner():
+    return get_interner(TrackedReferrer)
+
+
+def get_user_agent_interner():
+    return get_interner(TrackedUserAgent)
@@ -0,0 +1,117 @@
+"""Remembers the last pageview of each session.
+
+Used to compute ``time_on_page`` for the previous pageview of a session
+without sorting the PageView table. Entries live as long as a visit can
+last (``MAX_TIME_ON_PAGE``), so a missing entry means there is no
+previous pageview to update.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Visits longer than this are not considered a single page visit.
+MAX_TIME_ON_PAGE = 3600
+
+KEY_PREFIX = 'tracker_last_pageview_'
+
+
+def get_key_prefix():
+    """The entries hold ids of the table new pageviews are written to, so
+    the ones stored before TRACKER_COMPACT_PAGEVIEWS changed are not
+    read."""
+    if settings.TRACKER_COMPACT_PAGEVIEWS:
+        return KEY_PREFIX + 'compact_'
+    return KEY_PREFIX
+
+
+class DjangoCacheStore(object):
+    """Keeps the entries in the configured django cache."""
+
+    def get_many(self, session_keys):
+        prefix = get_key_prefix()
+        keys = dict((prefix + key, key) for key in session_keys)
+        found = cache.get_many(keys.keys())
+        return dict((keys[key], value) for key, value in found.iteritems())
+
+    def set_many(self, entries):
+        prefix = get_key_prefix()
+        cache.set_many(dict((prefix + key, value)
+            for key, value in entries.iteritems()), MAX_TIME_ON_PAGE)
+
+
+class LocalLRUStore(object):
+    """Keeps the entries in a per-process LRU with TTL eviction."""
+
+    def __init__(self, max_entries, timeout=MAX_TIME_ON_PAGE):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get_many(self, session_keys):
+        now = time.time()
+        found = {}
+        self.lock.acquire()
+        try:
+            for key in session_keys:
+                entry = self.entries.pop(key, None)
+                if entry is None:
+                    continue
+                expires, value = entry
+                if expires > now:
+                    # reinsert as the most recently used entry
+                    self.entries[key] = entry
+                    found[key] = value
+        finally:
+            self.lock.release()
+        return found
+
+    def set_many(self, entries):
+        expires = time.time() + self.timeout
+        self.lock.acquire()
+        try:
+            for key, value in entries.iteritems():
+                self.entries.pop(key, None)
+                self.entries[key] = (expires, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        finally:
+            self.lock.release()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if settings.TRACKER_LAST_PAGEVIEW_STORE == 'local':
+            _store = LocalLRUStore(settings.TRACKER_LAST_PAGEVIEW_MAX_ENTRIES)
+        else:
+            _store = DjangoCacheStore()
+    return _store
+
+
+def get_last_pageviews(session_keys):
+    """Returns a dict mapping session keys to their last
+    (pageview id, access_time) pair."""
+    if not session_keys:
+        return {}
+    return get_store().get_many(session_keys)
+
+
+def get_last_pageview(session_key):
+    return get_last_pageviews([session_key]).get(session_key)
+
+
+def set_last_pageviews(entries):
+    """Stores (pageview id, access_time) pairs keyed by session key."""
+    if entries:
+        get_store().set_many(entries)
+
+
+def set_last_pageview(session_key, pageview_id, access_time):
+    set_last_pageviews({session_key: (pageview_id, access_time)})
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tracker.models import PageView, TrackedUrl
+from tracker import paths
+
+
+class Command(BaseCommand):
+    help = 'Fills in the page path and project of the stored pageviews'
+
+    def handle(self, *args, **options):
+        count = paths.backfill(PageView, 'request_url')
+        self.stdout.write('Updated %s pageviews.\n' % count)
+        count = paths.backfill(TrackedUrl, 'value')
+        self.stdout.write('Updated %s tracked urls.\n' % count)
@@ -1,11 +1,11 @@
-import datetime
 import re
 import logging
 
 from django.conf import settings
 
 from tracker import utils
-from tracker.models import PageView
+from tracker import ingest
+from tracker import last_pageview as last_pageview_cache
 
 log = logging.getLogger(__name__)
 
@@ -22,38 +22,44 @@ class PageViewTrackerMiddleware:
         # ensure that the request.path begins with any of the prefixes
         for prefix in settings.TRACKING_PREFIXES:
             if re.match(prefix, request.path):
-                ip_address = utils.get_ip(request)
-                pageview = PageView()
-                pageview.session_key = request.session.session_key
-                pageview.ip_address = ip_address
-                pageview.request_url = request.path
-                pageview.referrer_url = utils.u_clean(
-                    request.META.get('HTTP_REFERER', 'unknown')[:255])
-                pageview.user_agent = user_agent
-                try:
-                    oldpageview = PageView.objects.filter(
-                        session_key=request.session.session_key).order_by(
-                        '-access_time')[0]
-                except IndexError, error:
-                    pass
-                else:
-                    time_on_page = datetime.datetime.now()
-                    time_on_page -= oldpageview.access_time
-                    if time_on_page.seconds < 3600 and time_on_page.days == 0:
-                        oldpageview.time_on_page = time_on_page.seconds
-                        oldpageview.save()
                 break
         else:
             # it did not find any matching prefixes.
             return
 
-        if request.user.is_authenticated():
-            now = datetime.datetime.now()
-            profile = request.user.get_profile()
-            pageview.user = request.user
+        ip_address = utils.get_ip(request)
+        referrer_url = utils.u_clean(
+            request.META.get('HTTP_REFERER', 'unknown')[:255])
+        user = request.user if request.user.is_authenticated() else None
+
+        record = ingest.make_record(request.session.session_key,
+            user.id if user else None, request.path, referrer_url,
+            ip_address, user_agent)
+        if settings.TRACKER_BUFFER_PAGEVIEWS:
+            ingest.get_buffer().add(record)
+            return
 
         try:
-            pageview.save()
+            pageview_id, access_time = ingest.save_pageview(record)
         except Exception, error:
             msg = 'An error occurred saving pageview record: %s'
             logging.error(msg % error)
+            return
+
+        session_key = record['session_key']
+        if settings.TRACKER_TIME_ON_PAGE_BEACON:
+            if session_key:
+                # the page reports its time on page (see _analytics.html)
+                request.tracked_pageview_id = pageview_id
+            return
+
+        last_pageview = last_pageview_cache.get_last_pageview(session_key)
+        if last_pageview:
+            last_pageview_id, last_access_time = last_pageview
+            time_on_page = ingest.get_time_on_page(last_access_time,
+                access_time)
+            if time_on_page is not None:
+                ingest.get_write_model().objects.filter(
+                    id=last_pageview_id).update(time_on_page=time_on_page)
+        last_pageview_cache.set_last_pageview(session_key, pageview_id,
+            access_time)
@@ -1,14 +1,16 @@
 import datetime
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models.signals import pre_save, post_save, post_init
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.contrib.sites.models import Site
+from django.conf import settings
 
 from drumbeat.models import ModelBase
 from content.models import Page
-from projects.models import Project
+from projects.models import Project, Participation
 from activity.schema import verbs
 from activity.models import Activity
 from replies.models import PageComment
@@ -77,6 +79,12 @@ class PageView(ModelBase):
                          blank=True, null=True)
     time_on_page = models.IntegerField(blank=True, null=True)
     user_agent = models.CharField(max_length=255, blank=True, null=True)
+    # request_url without its locale prefix and the project it belongs to
+    # (see tracker.paths).
+    page_path = models.CharField(max_length=755, db_index=True, blank=True,
+        null=True)
+    project = models.ForeignKey('projects.Project', null=True, blank=True,
+        related_name='pageviews')
 
     def __repr__(self):
         msg = '<session %s, date %s, url %s, length %s, user %s>'
@@ -84,6 +92,102 @@ class PageView(ModelBase):
             self.time_on_page, self.user)
 
 
+class InternedString(models.Model):
+    """A distinct string stored once and referenced by id."""
+    value = models.CharField(max_length=755)
+    # sha1 of the value, used for lookups
+    digest = models.CharField(max_length=40, unique=True)
+
+    class Meta:
+        abstract = True
+
+    def __unicode__(self):
+        return self.value
+
+
+class TrackedUrl(InternedString):
+    # see PageView
+    page_path = models.CharField(max_length=755, db_index=True, blank=True,
+        null=True)
+    project = models.ForeignKey('projects.Project', null=True, blank=True,
+        related_name='tracked_urls')
+
+
+class TrackedReferrer(InternedString):
+    pass
+
+
+class TrackedUserAgent(InternedString):
+    pass
+
+
+class CompactPageView(models.Model):
+    """Same as PageView, with interned strings and the ip address packed
+    in an integer (see tracker.interning)."""
+    session_key = models.CharField(max_length=100, db_index=True)
+    user = models.ForeignKey(User, null=True, blank=True,
+        related_name='compact_pageviews')
+    access_time = models.DateTimeField(db_index=True)
+    url = models.ForeignKey('tracker.TrackedUrl', related_name='pageviews')
+    referrer = models.ForeignKey('tracker.TrackedReferrer', null=True,
+        blank=True, related_name='pageviews')
+    user_agent = models.ForeignKey('tracker.TrackedUserAgent', null=True,
+        blank=True, related_name='pageviews')
+    ip_number = models.BigIntegerField(null=True, blank=True)
+    time_on_page = models.IntegerField(blank=True, null=True)
+
+
+class PageViewLog(models.Model):
+    """Read only database view of CompactPageView rows with the same
+    fields as PageView."""
+    session_key = models.CharField(max_length=100)
+    user = models.ForeignKey(User, null=True, blank=True,
+        related_name='pageview_logs')
+    access_time = models.DateTimeField()
+    request_url = models.CharField(max_length=755)
+    referrer_url = models.CharField(max_length=755, blank=True, null=True)
+    ip_address = models.CharField(max_length=15, blank=True, null=True)
+    time_on_page = models.IntegerField(blank=True, null=True)
+    user_agent = models.CharField(max_length=755, blank=True, null=True)
+    page_path = models.CharField(max_length=755, blank=True, null=True)
+    project = models.ForeignKey('projects.Project', null=True, blank=True,
+        related_name='pageview_logs')
+
+    class Meta:
+        managed = False
+        db_table = 'tracker_pageviewlog'
+
+    def __repr__(self):
+        msg = '<session %s, date %s, url %s, length %s, user %s>'
+        return msg % (self.session_key, self.access_time, self.request_url,
+            self.time_on_page, self.user)
+
+
+def get_pageview_model():
+    """Model the pageviews being stored can be read through."""
+    if settings.TRACKER_COMPACT_PAGEVIEWS:
+        return PageViewLog
+    return PageView
+
+
+def get_pageview_models():
+    """Models all the stored pageviews can be read through. Changing
+    TRACKER_COMPACT_PAGEVIEWS does not move the pageviews already stored,
+    so the compact ones are read whenever there are any."""
+    pageview_models = [PageView]
+    if (settings.TRACKER_COMPACT_PAGEVIEWS or
+            CompactPageView.objects.exists()):
+        pageview_models.append(PageViewLog)
+    return pageview_models
+
+
+def get_pageview_table(model):
+    """Table the pageviews read through ``model`` are stored in."""
+    if model is PageViewLog:
+        return CompactPageView._meta.db_table
+    return model._meta.db_table
+
+
 class PageViewMetrics(ModelBase):
     """ Store consolidated PageViews for a given access_date
         per project -> page_path,
@@ -102,6 +206,87 @@ class PageViewMetrics(ModelBase):
     zero_length_pageviews = models.IntegerField(null=True, blank=True)
 
 
+class MetricsRollupWatermark(ModelBase):
+    """Id of the last PageView aggregated into PageViewMetrics
+    by a rollup (see tracker.rollup)."""
+    name = models.SlugField(unique=True)
+    last_pageview_id = models.PositiveIntegerField(default=0)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return "%s: %s" % (self.name, self.last_pageview_id)
+
+
+class MetricsExport(ModelBase):
+    """A detailed metrics report of a project written to disk
+    by a background task (see tracker.exports)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+    project = models.ForeignKey('projects.Project',
+        related_name='metrics_exports')
+    requested_by = models.ForeignKey('users.UserProfile', null=True,
+        blank=True, related_name='metrics_exports')
+    # digest of the data the report was built from
+    fingerprint = models.CharField(max_length=40, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+        default=PENDING)
+    rows_written = models.PositiveIntegerField(default=0)
+    filename = models.CharField(max_length=255, blank=True)
+    created_on = models.DateTimeField(auto_now_add=True,
+        default=datetime.datetime.now)
+    finished_on = models.DateTimeField(null=True, blank=True)
+
+    def __unicode__(self):
+        return "%s export %s (%s)" % (self.project, self.id, self.status)
+
+    @models.permalink
+    def get_absolute_url(self):
+        return ('projects_admin_metrics_export', (), {
+            'slug': self.project.slug,
+            'export_id': self.id,
+        })
+
+    def is_ready(self):
+        return self.status == self.DONE
+
+
+class DailyCounter(ModelBase):
+    """Number of objects counted by the scoreboard on a given day
+    (see tracker.counters)."""
+    name = models.CharField(max_length=30)
+    date = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('name', 'date'),)
+
+    def __unicode__(self):
+        return "%s %s: %s" % (self.name, self.date, self.count)
+
+
+def increment_daily_counter(name, date, delta=1):
+    updated = DailyCounter.objects.filter(name=name, date=date).update(
+        count=models.F('count') + delta)
+    if not updated:
+        sid = transaction.savepoint()
+        try:
+            DailyCounter.objects.create(name=name, date=date, count=delta)
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            # created by a concurrent request
+            transaction.savepoint_rollback(sid)
+            DailyCounter.objects.filter(name=name, date=date).update(
+                count=models.F('count') + delta)
+
+
 def update_metrics_cache(project):
     # Only computes metrics for dates before today or yesterday
     # (depending on how early it is in the day).
@@ -120,7 +305,8 @@ def update_metrics_cache(project):
             project=project).order_by('-access_date')[0].access_date
     except IndexError:
         last_cached_day = project.created_on - delta
-    visits = PageView.objects.filter(access_time__gt=last_cached_day,
+    visits = get_pageview_model().objects.filter(project=project,
+        access_time__gt=last_cached_day,
         access_time__lt=not_included_upper_bound)
     # Computes metrics for each page.
     pages = Page.objects.filter(project=project)
@@ -129,7 +315,7 @@ def update_metrics_cache(project):
         # Filter page views to this page (does not include visits to subpages
         # like history/ and visits to older versions of this page).
         # Also adds the date for the visits as a separate field.
-        pageviews = visits.filter(request_url__endswith=page_path).extra(
+        pageviews = visits.filter(page_path='/' + page_path).extra(
             select={'access_time_date': "date(access_time)"})
         # Computes time on page on for each date for each authenticated
         # user not considering zero length visits.
@@ -205,6 +391,89 @@ def update_metrics_cache(project):
             on_db_metric.save()
 
 
+def get_project_comments(project):
+    project_ct = ContentType.objects.get_for_model(Project)
+    return PageComment.objects.filter(scope_id=project.id,
+        scope_content_type=project_ct)
+
+
+def get_project_task_edits(project):
+    page_ct = ContentType.objects.get_for_model(Page)
+    return Activity.objects.filter(scope_object=project,
+        target_content_type=page_ct, verb=verbs['update'])
+
+
+def get_users_pageview_totals(project):
+    """Pageview totals and last active date of each authenticated
+    user of the project, keyed by user id."""
+    metrics = PageViewMetrics.objects.filter(project=project,
+        user__isnull=False).values('user_id').annotate(
+        models.Max('access_date'),
+        models.Sum('non_zero_length_time_on_page'),
+        models.Sum('non_zero_length_pageviews'),
+        models.Sum('zero_length_pageviews'))
+    return dict((metric['user_id'], metric) for metric in metrics)
+
+
+def get_users_comments_count(project):
+    """Number of comments posted by each user in the project."""
+    return dict(get_project_comments(project).values('author_id').annotate(
+        comments_count=models.Count('id')).values_list(
+        'author_id', 'comments_count'))
+
+
+def get_users_task_edits_count(project):
+    """Number of page edits done by each user in the project."""
+    return dict(get_project_task_edits(project).values('actor_id').annotate(
+        edits_count=models.Count('id')).values_list(
+        'actor_id', 'edits_count'))
+
+
+def get_users_daily_metrics(project):
+    """Pageview totals, comments count and page edits count of each user of
+    the project for each date in which the user was active, keyed by user id
+    and then by date."""
+    daily_metrics = {}
+
+    def get_metric(user_id, date):
+        user_metrics = daily_metrics.setdefault(user_id, {})
+        return user_metrics.setdefault(force_date(date), {
+            'non_zero_length_time_on_page__sum': 0,
+            'non_zero_length_pageviews__sum': 0,
+            'zero_length_pageviews__sum': 0,
+            'comments_count': 0,
+            'edits_count': 0,
+        })
+
+    pageviews = PageViewMetrics.objects.filter(project=project,
+        user__isnull=False).values('user_id', 'access_date').annotate(
+        models.Sum('non_zero_length_time_on_page'),
+        models.Sum('non_zero_length_pageviews'),
+        models.Sum('zero_length_pageviews'))
+    for metric in pageviews:
+        get_metric(metric['user_id'], metric['access_date']).update(dict(
+            (key, value or 0) for key, value in metric.iteritems()
+            if key.endswith('__sum')))
+    comments = get_project_comments(project).extra(select={
+        'created_on_date': "date(created_on)"}).values('author_id',
+        'created_on_date').annotate(comments_count=models.Count('id'))
+    for comment in comments:
+        get_metric(comment['author_id'], comment['created_on_date'])[
+            'comments_count'] = comment['comments_count']
+    task_edits = get_project_task_edits(project).extra(select={
+        'created_on_date': "date(created_on)"}).values('actor_id',
+        'created_on_date').annotate(edits_count=models.Count('id'))
+    for edit in task_edits:
+        get_metric(edit['actor_id'], edit['created_on_date'])[
+            'edits_count'] = edit['edits_count']
+    return daily_metrics
+
+
+def get_deleted_usernames(user_ids):
+    return set(UserProfile.objects.filter(id__in=user_ids,
+        deleted=True).values_list('username', flat=True))
+
+
 def metrics_summary(project, users):
     """Metrics summary iterator.
 
@@ -212,37 +481,26 @@ def metrics_summary(project, users):
     total time on course pages (estimating a one minute length for visits
     of unknow/zero legth), total number of comments and
     total number of page edits."""
-    project_ct = ContentType.objects.get_for_model(Project)
-    page_ct = ContentType.objects.get_for_model(Page)
-    comments = PageComment.objects.filter(scope_id=project.id,
-        scope_content_type=project_ct)
-    task_edits = Activity.objects.filter(scope_object=project,
-        target_content_type=page_ct, verb=verbs['update'])
-    pageviews = PageViewMetrics.objects.filter(project=project)
+    pageviews = get_users_pageview_totals(project)
+    comments = get_users_comments_count(project)
+    task_edits = get_users_task_edits_count(project)
     index = 0
     last_username = None
     for user in users:
         if last_username != user.username:
             index += 1
             last_username = user.username
-        user_pageviews = pageviews.filter(user=user)
-        last_active = None
-        if user_pageviews.exists():
-            last_active = user_pageviews.order_by(
-                '-access_date')[0].access_date
+        metrics = pageviews.get(user.id, {})
         row = [
             'anonymous%s' % index if user.deleted else user.username,
-            last_active]
-        metrics = user_pageviews.aggregate(
-            models.Sum('non_zero_length_time_on_page'),
-            models.Sum('zero_length_pageviews'))
+            metrics.get('access_date__max')]
         total_time_on_pages = (
-            metrics['non_zero_length_time_on_page__sum'] or 0)
+            metrics.get('non_zero_length_time_on_page__sum') or 0)
         total_time_on_pages += (
-            (metrics['zero_length_pageviews__sum'] or 0) * 60)
+            (metrics.get('zero_length_pageviews__sum') or 0) * 60)
         row.append("%.2f" % (total_time_on_pages / 60.0))
-        row.append(comments.filter(author=user).count())
-        row.append(task_edits.filter(actor=user).count())
+        row.append(comments.get(user.id, 0))
+        row.append(task_edits.get(user.id, 0))
         yield row
 
 
@@ -252,13 +510,9 @@ def user_total_metrics(project, users):
     For each user, provides: username, totals for the time on course pages,
     number of non-zero length page views, number of zero-length
     page views, number of comments and number of page edits"""
-    project_ct = ContentType.objects.get_for_model(Project)
-    page_ct = ContentType.objects.get_for_model(Page)
-    comments = PageComment.objects.filter(scope_id=project.id,
-        scope_content_type=project_ct)
-    task_edits = Activity.objects.filter(scope_object=project,
-        target_content_type=page_ct, verb=verbs['update'])
-    pageviews = PageViewMetrics.objects.filter(project=project)
+    pageviews = get_users_pageview_totals(project)
+    comments = get_users_comments_count(project)
+    task_edits = get_users_task_edits_count(project)
     index = 0
     last_username = None
     for user in users:
@@ -266,16 +520,13 @@ def user_total_metrics(project, users):
             index += 1
             last_username = user.username
         row = ['anonymous%s' % index if user.deleted else user.username]
-        metrics = pageviews.filter(user=user).aggregate(
-            models.Sum('non_zero_length_time_on_page'),
-            models.Sum('non_zero_length_pageviews'),
-            models.Sum('zero_length_pageviews'))
+        metrics = pageviews.get(user.id, {})
         row.append("%.2f" % (
-            (metrics['non_zero_length_time_on_page__sum'] or 0) / 60.0))
-        row.append(metrics['non_zero_length_pageviews__sum'] or 0)
-        row.append(metrics['zero_length_pageviews__sum'] or 0)
-        row.append(comments.filter(author=user).count())
-        row.append(task_edits.filter(actor=user).count())
+            (metrics.get('non_zero_length_time_on_page__sum') or 0) / 60.0))
+        row.append(metrics.get('non_zero_length_pageviews__sum') or 0)
+        row.append(metrics.get('zero_length_pageviews__sum') or 0)
+        row.append(comments.get(user.id, 0))
+        row.append(task_edits.get(user.id, 0))
         yield row
 
 
@@ -314,6 +565,7 @@ def user_total_per_page_metrics(project, user_ids):
         models.Sum('non_zero_length_time_on_page'),
         models.Sum('non_zero_length_pageviews'),
         models.Sum('zero_length_pageviews'))
+    deleted_usernames = get_deleted_usernames(user_ids)
     index = 0
     last_username = None
     for metric in metrics:
@@ -321,9 +573,7 @@ def user_total_per_page_metrics(project, user_ids):
         if username != last_username:
             index += 1
             last_username = username
-        user_deleted = UserProfile.objects.filter(
-            username=username,
-            deleted=True).exists()
+        user_deleted = username in deleted_usernames
         row = [
             'anonymous%s' % index if user_deleted else username,
             metric['page_path']]
@@ -374,53 +624,28 @@ def chronological_user_metrics(project, users):
     published, and number of page edits.
 
     The information is sorted first by username, and then by date."""
-    project_ct = ContentType.objects.get_for_model(Project)
-    page_ct = ContentType.objects.get_for_model(Page)
-    comments = PageComment.objects.filter(scope_id=project.id,
-        scope_content_type=project_ct)
-    task_edits = Activity.objects.filter(scope_object=project,
-        target_content_type=page_ct, verb=verbs['update'])
-    pageviews = PageViewMetrics.objects.filter(project=project)
+    daily_metrics = get_users_daily_metrics(project)
     index = 0
     last_username = None
     for user in users:
-        user_pageviews = pageviews.filter(user=user)
-        user_comments = comments.filter(author=user)
-        user_task_edits = task_edits.filter(actor=user)
-        # Compute dates for which the user either visited a course page,
+        # Dates for which the user either visited a course page,
         # posted a comment (can be on the wall), or edited a course page.
-        dates = set(user_pageviews.distinct().values_list(
-            'access_date', flat=True))
-        dates.update(user_comments.extra(select={
-            'created_on_date': "date(created_on)"}).distinct().values_list(
-            'created_on_date', flat=True))
-        dates.update(user_task_edits.extra(select={
-            'created_on_date': "date(created_on)"}).distinct().values_list(
-            'created_on_date', flat=True))
-        dates = (force_date(d) for d in dates)
-        dates = sorted(dates, reverse=True)
+        user_metrics = daily_metrics.get(user.id, {})
+        dates = sorted(user_metrics.keys(), reverse=True)
         username = user.username
         if last_username != username:
             index += 1
             last_username = username
         anonymized_username = 'anonymous%s' % index if user.deleted else username
         for date in dates:
+            metrics = user_metrics[date]
             row = [anonymized_username, date.strftime("%Y-%m-%d")]
-            metrics = user_pageviews.filter(access_date=date).aggregate(
-                models.Sum('non_zero_length_time_on_page'),
-                models.Sum('non_zero_length_pageviews'),
-                models.Sum('zero_length_pageviews'))
             row.append("%.2f" % (
-                (metrics['non_zero_length_time_on_page__sum'] or 0) / 60.0))
-            row.append(metrics['non_zero_length_pageviews__sum'] or 0)
-            row.append(metrics['zero_length_pageviews__sum'] or 0)
-            comments_count = user_comments.filter(created_on__year=date.year,
-                created_on__month=date.month, created_on__day=date.day).count()
-            row.append(comments_count)
-            task_edits_count = user_task_edits.filter(
-                created_on__year=date.year, created_on__month=date.month,
-                created_on__day=date.day).count()
-            row.append(task_edits_count)
+                metrics['non_zero_length_time_on_page__sum'] / 60.0))
+            row.append(metrics['non_zero_length_pageviews__sum'])
+            row.append(metrics['zero_length_pageviews__sum'])
+            row.append(metrics['comments_count'])
+            row.append(metrics['edits_count'])
             yield row
 
 
@@ -470,22 +695,25 @@ def chronological_user_per_page_metrics(project, user_ids):
     """
     metrics = PageViewMetrics.objects.filter(project=project,
         user__in=user_ids).order_by('user__username',
-        'access_date', 'page_path')
+        'access_date', 'page_path').values('user__username', 'access_date',
+        'page_path', 'non_zero_length_time_on_page',
+        'non_zero_length_pageviews', 'zero_length_pageviews')
+    deleted_usernames = get_deleted_usernames(user_ids)
     index = 0
     last_username = None
     for metric in metrics:
-        if last_username != metric.user.username:
+        username = metric['user__username']
+        if last_username != username:
             index += 1
-            last_username = metric.user.username
-        user_deleted = UserProfile.objects.filter(
-            user=metric.user, deleted=True).exists()
+            last_username = username
+        user_deleted = username in deleted_usernames
         row = [
-            'anonymous%s' % index if user_deleted else metric.user.username,
-            metric.access_date.strftime("%Y-%m-%d"),
-            metric.page_path]
-        row.append("%.2f" % (metric.non_zero_length_time_on_page / 60.0))
-        row.append(metric.non_zero_length_pageviews)
-        row.append(metric.zero_length_pageviews)
+            'anonymous%s' % index if user_deleted else username,
+            metric['access_date'].strftime("%Y-%m-%d"),
+            metric['page_path']]
+        row.append("%.2f" % (metric['non_zero_length_time_on_page'] / 60.0))
+        row.append(metric['non_zero_length_pageviews'])
+        row.append(metric['zero_length_pageviews'])
         yield row
 
 
@@ -516,3 +744,77 @@ def chronological_unauth_per_page_metrics(project):
         row.append(metric.non_zero_length_pageviews)
         row.append(metric.zero_length_pageviews)
         yield row
+
+
+###########
+# Signals #
+###########
+
+def count_userprofile(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if kwargs.get('created', False) and instance.user_id:
+        increment_daily_counter('users', instance.user.date_joined.date())
+
+
+def count_comment(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if kwargs.get('created', False):
+        from signups.models import SignupAnswer
+        ct = ContentType.objects.get_for_model(SignupAnswer)
+        if instance.page_content_type != ct:
+            increment_daily_counter('comments', instance.created_on.date())
+
+
+def is_counted_join(participation):
+    return participation.left_on is None and not participation.project.test
+
+
+def get_join_fields(participation):
+    return (participation.project_id, participation.left_on)
+
+
+def record_join_fields(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    instance._join_fields = get_join_fields(instance)
+
+
+def check_participation_left(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    loaded = getattr(instance, '_join_fields', None)
+    if not instance.id or loaded == get_join_fields(instance):
+        # only leaving or moving the participation uncounts the join
+        instance._counted_join = False
+        return
+    instance._counted_join = Participation.objects.filter(id=instance.id,
+        left_on__isnull=True).exists()
+
+
+def count_join(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if kwargs.get('created', False):
+        if is_counted_join(instance):
+            increment_daily_counter('joins', instance.joined_on.date())
+    elif instance._counted_join and not is_counted_join(instance):
+        # joins are counted while the participant stays in the group
+        increment_daily_counter('joins', instance.joined_on.date(), -1)
+    instance._join_fields = get_join_fields(instance)
+
+
+def count_group(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if kwargs.get('created', False) and not instance.test:
+        increment_daily_counter('groups', instance.created_on.date())
+
+
+post_save.connect(count_userprofile, sender=UserProfile,
+    dispatch_uid='tracker_count_userprofile')
+post_save.connect(count_comment, sender=PageComment,
+    dispatch_uid='tracker_count_comment')
+post_init.connect(record_join_fields, sender=Participation,
+    dispatch_uid='tracker_record_join_fields')
+pre_save.connect(check_participation_left, sender=Participation,
+    dispatch_uid='tracker_check_participation_left')
+post_save.connect(count_join, sender=Participation,
+    dispatch_uid='tracker_count_join')
+post_save.connect(count_group, sender=Project,
+    dispatch_uid='tracker_count_group')
@@ -0,0 +1,95 @@
+"""Canonical page paths of the tracked urls.
+
+The page path of an url is the url without its locale prefix, so the
+pageviews of '/en/groups/x/' and '/es/groups/x/' share the same indexed
+page path. Urls under a project page also get the id of the project.
+"""
+import re
+from collections import defaultdict
+
+from django.conf import settings
+
+from l10n.locales import LANGUAGE_URL_MAP
+from projects.models import Project
+from tracker.last_pageview import LocalLRUStore
+
+PROJECT_PATH_RE = re.compile(r'^/groups/(?P<slug>[^/]+)/')
+
+# Rows updated per query by backfill.
+CHUNK_SIZE = 5000
+
+# Project slugs do not change, keep the ids of the existing projects
+# around for an hour.
+PROJECT_IDS_TIMEOUT = 60 * 60
+
+
+def get_page_path(url):
+    """Returns ``url`` without its locale prefix."""
+    first, _, rest = url.lstrip('/').partition('/')
+    if first.lower() in LANGUAGE_URL_MAP:
+        return '/' + rest
+    return url
+
+
+def get_project_slug(page_path):
+    match = PROJECT_PATH_RE.match(page_path)
+    if match:
+        return match.group('slug')
+    return None
+
+
+_project_ids = None
+
+
+def get_project_ids(slugs):
+    """Returns a dict with the project id of each of the given slugs (or
+    None if there is no project with that slug)."""
+    global _project_ids
+    if _project_ids is None:
+        _project_ids = LocalLRUStore(settings.TRACKER_INTERNING_MAX_ENTRIES,
+            PROJECT_IDS_TIMEOUT)
+    found = _project_ids.get_many(slugs)
+    missing = set(slugs) - set(found)
+    if missing:
+        stored = dict(Project.objects.filter(slug__in=missing).values_list(
+            'slug', 'id'))
+        # the slugs without a project are read again, it might be created
+        # later
+        _project_ids.set_many(stored)
+        found.update(stored)
+    return dict((slug, found.get(slug)) for slug in slugs)
+
+
+def resolve_pages(urls):
+    """Returns a dict with the (page_path, project_id) pair of each of the
+    given urls."""
+    page_paths = dict((url, get_page_path(url)) for url in urls)
+    slugs = dict((url, get_project_slug(page_path))
+        for url, page_path in page_paths.iteritems())
+    project_ids = get_project_ids(
+        [slug for slug in slugs.itervalues() if slug])
+    return dict((url, (page_path, project_ids.get(slugs[url])))
+        for url, page_path in page_paths.iteritems())
+
+
+def backfill(model, url_field, chunk_size=CHUNK_SIZE):
+    """Fills in the page path and project of the ``model`` rows stored
+    before they were resolved at ingest. Returns the number of rows
+    updated."""
+    count = 0
+    last_id = 0
+    while True:
+        rows = list(model.objects.filter(id__gt=last_id,
+            page_path__isnull=True).order_by('id').values_list(
+            'id', url_field)[:chunk_size])
+        if not rows:
+            return count
+        last_id = rows[-1][0]
+        pages = resolve_pages(set(url for row_id, url in rows))
+        ids_by_page = defaultdict(list)
+        for row_id, url in rows:
+            ids_by_page[pages[url]].append(row_id)
+        for (page_path, project_id), ids in ids_by_page.iteritems():
+            model.objects.filter(id__in=ids).update(page_path=page_path,
+                project=project_id)
+        count += len(rows)
@@ -0,0 +1,196 @@
+"""Per view request profiling.
+
+ProfilingMiddleware records, for a sample of the requests, the number of
+queries, the time spent in SQL, the time spent rendering templates and
+the wall time, aggregated per url name in hourly windows kept in the
+cache. Requests slower than TRACKER_PROFILING_SLOW_REQUEST seconds are
+also kept with their slowest queries. The numbers are shown to staff by
+tracker.views.profiling_report.
+"""
+import time
+import random
+import datetime
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.urlresolvers import resolve, Resolver404
+from django.db import connection, reset_queries
+from django.template.base import Template
+
+WINDOW_SIZE = 60 * 60
+
+WINDOW_KEY = 'tracker_profiling_%d'
+SLOW_REQUESTS_KEY = 'tracker_profiling_slow'
+
+# Upper bounds (in seconds) of the wall time histogram buckets, the last
+# bucket holds the slower requests.
+HISTOGRAM_BOUNDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# Slowest queries kept per slow request.
+SLOW_QUERIES = 5
+
+_state = threading.local()
+
+
+def timed_render(render):
+    def wrapper(self, context):
+        profile = getattr(_state, 'profile', None)
+        if profile is None or profile['rendering']:
+            # not profiling, or a template rendered from another one
+            return render(self, context)
+        profile['rendering'] = True
+        start = time.time()
+        try:
+            return render(self, context)
+        finally:
+            profile['render_time'] += time.time() - start
+            profile['rendering'] = False
+    wrapper.timed = True
+    return wrapper
+
+
+def get_window(now=None):
+    return int((now or time.time()) // WINDOW_SIZE)
+
+
+def get_bucket(wall_time):
+    for index, bound in enumerate(HISTOGRAM_BOUNDS):
+        if wall_time <= bound:
+            return index
+    return len(HISTOGRAM_BOUNDS)
+
+
+def new_stats():
+    return {
+        'count': 0,
+        'queries': 0,
+        'sql_time': 0.0,
+        'render_time': 0.0,
+        'wall_time': 0.0,
+        'max_wall_time': 0.0,
+        'histogram': [0] * (len(HISTOGRAM_BOUNDS) + 1),
+    }
+
+
+def add_stats(stats, other):
+    for key in ('count', 'queries', 'sql_time', 'render_time',
+            'wall_time'):
+        stats[key] += other[key]
+    stats['max_wall_time'] = max(stats['max_wall_time'],
+        other['max_wall_time'])
+    stats['histogram'] = [a + b for a, b in zip(stats['histogram'],
+        other['histogram'])]
+
+
+def record_profile(url_name, path, wall_time, render_time, queries):
+    """Adds a request to the current window and to the slow requests if
+    it took more than TRACKER_PROFILING_SLOW_REQUEST seconds."""
+    timeout = WINDOW_SIZE * settings.TRACKER_PROFILING_WINDOWS
+    sql_time = sum(float(query['time']) for query in queries)
+    key = WINDOW_KEY % get_window()
+    window = cache.get(key) or {}
+    stats = window.setdefault(url_name, new_stats())
+    stats['count'] += 1
+    stats['queries'] += len(queries)
+    stats['sql_time'] += sql_time
+    stats['render_time'] += render_time
+    stats['wall_time'] += wall_time
+    stats['max_wall_time'] = max(stats['max_wall_time'], wall_time)
+    stats['histogram'][get_bucket(wall_time)] += 1
+    cache.set(key, window, timeout)
+    if wall_time >= settings.TRACKER_PROFILING_SLOW_REQUEST:
+        slowest = sorted(queries, key=lambda query: float(query['time']),
+            reverse=True)[:SLOW_QUERIES]
+        slow_requests = cache.get(SLOW_REQUESTS_KEY) or []
+        slow_requests.insert(0, {
+            'url_name': url_name,
+            'path': path,
+            'date': datetime.datetime.now(),
+            'wall_time': wall_time,
+            'render_time': render_time,
+            'sql_time': sql_time,
+            'queries': len(queries),
+            'slowest_queries': [(float(query['time']), query['sql'][:1000])
+                for query in slowest],
+        })
+        del slow_requests[settings.TRACKER_PROFILING_SLOW_SAMPLES:]
+        cache.set(SLOW_REQUESTS_KEY, slow_requests, timeout)
+
+
+def get_profiles():
+    """Returns the stats of each url name over the kept windows, sorted by
+    total wall time."""
+    current = get_window()
+    keys = [WINDOW_KEY % window for window in range(
+        current - settings.TRACKER_PROFILING_WINDOWS + 1, current + 1)]
+    totals = {}
+    for window in cache.get_many(keys).itervalues():
+        for url_name, stats in window.iteritems():
+            add_stats(totals.setdefault(url_name, new_stats()), stats)
+    profiles = []
+    for url_name, stats in totals.iteritems():
+        count = float(stats['count'])
+        stats.update({
+            'url_name': url_name,
+            'avg_queries': stats['queries'] / count,
+            'avg_sql_time': stats['sql_time'] / count,
+            'avg_render_time': stats['render_time'] / count,
+            'avg_wall_time': stats['wall_time'] / count,
+        })
+        profiles.append(stats)
+    profiles.sort(key=lambda stats: stats['wall_time'], reverse=True)
+    return profiles
+
+
+def get_slow_requests():
+    return cache.get(SLOW_REQUESTS_KEY) or []
+
+
+class ProfilingMiddleware(object):
+    """Profiles a sample (TRACKER_PROFILING_SAMPLE_RATE) of the requests
+    when TRACKER_PROFILING is enabled."""
+
+    def __init__(self):
+        if not settings.TRACKER_PROFILING:
+            raise MiddlewareNotUsed
+        if not getattr(Template.render, 'timed', False):
+            Template.render = timed_render(Template.render)
+
+    def process_request(self, request):
+        _state.profile = None
+        if random.random() > settings.TRACKER_PROFILING_SAMPLE_RATE:
+            return
+        reset_queries()
+        connection.use_debug_cursor = True
+        _state.profile = {
+            'start': time.time(),
+            'url_name': None,
+            'render_time': 0.0,
+            'rendering': False,
+        }
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(_state, 'profile', None)
+        if profile is None:
+            return
+        try:
+            profile['url_name'] = resolve(request.path_info).url_name
+        except Resolver404:
+            pass
+        if not profile['url_name']:
+            profile['url_name'] = '%s.%s' % (view_func.__module__,
+                getattr(view_func, '__name__', view_func.__class__.__name__))
+
+    def process_response(self, request, response):
+        profile = getattr(_state, 'profile', None)
+        if profile is None:
+            return response
+        _state.profile = None
+        connection.use_debug_cursor = None
+        if profile['url_name']:
+            record_profile(profile['url_name'], request.path,
+                time.time() - profile['start'], profile['render_time'],
+                connection.queries)
+        return response
@@ -1,15 +1,18 @@
+import multiprocessing
+
+from django.db import connection
 from django.db.models import Q
 from django.contrib.contenttypes.models import ContentType
 
 from projects.models import Project, Participation, PerUserTaskCompletion
-from tracker.models import PageView
+from tracker import archive, paths
 from badges.models import Badge, Award, Assessment, Submission
 from statuses.models import Status
 from replies.models import PageComment
 from users.models import UserProfile
-from l10n import locales
 from content.models import Page
 from schools.models import School, ProjectSet
+from drumbeat.utils import iter_keyset
 
 # INPUT
 # group (slug or shortname of groups, courses, challenges)
@@ -44,84 +47,188 @@ def read_csv(path):
     return data
 
 
-def get_page_filters(projects):
+def get_tracked_urls(projects):
+    """Returns the page paths tracked for the given projects besides
+    the pages of the projects themselves."""
     tracked_urls = set()
-    tracked_url_prefixes = set()
     for project in projects:
-        tracked_url_prefixes.add(project.get_absolute_url())
         if project.school:
             tracked_urls.add(project.school.get_absolute_url())
         for projectset in project.projectsets.all():
             tracked_urls.add(projectset.get_absolute_url())
-    page_filters = None
-    for prefix in tracked_url_prefixes:
-        if page_filters:
-            page_filters |= Q(request_url__startswith=prefix)
-        else:
-            page_filters = Q(request_url__startswith=prefix)
-        for k in locales.LOCALES:
-            prefix_with_locale = '/%s%s' % (locales.LOCALES[k].external, prefix)
-            page_filters |= Q(request_url__startswith=prefix_with_locale)
-    for url in tracked_urls:
-        page_filters |= Q(request_url=url)
-        for k in locales.LOCALES:
-            url_with_locale = '/%s%s' % (locales.LOCALES[k].external, url)
-            page_filters |= Q(request_url=url_with_locale)
-    return page_filters
-
-
-def generate_csv_files():
+    return set(paths.get_page_path(url) for url in tracked_urls)
+
+
+def get_project_paths(projects):
+    """Page paths the pages of the given projects start with."""
+    return tuple(paths.get_page_path(project.get_absolute_url())
+        for project in projects)
+
+
+def get_page_filters(projects):
+    """The urls stored before their project was created have no project,
+    so the project pages are also matched by their path."""
+    filters = Q(project__in=projects) | Q(
+        page_path__in=get_tracked_urls(projects))
+    for prefix in get_project_paths(projects):
+        filters |= Q(page_path__startswith=prefix)
+    return filters
+
+
+def get_page_matcher(projects):
+    """Same as get_page_filters, for archived pageviews."""
+    prefixes = get_project_paths(projects)
+    urls = get_tracked_urls(projects)
+
+    def matcher(pageview):
+        page_path = paths.get_page_path(pageview.request_url)
+        return page_path in urls or page_path.startswith(prefixes)
+    return matcher
+
+
+def get_project_ids():
     groups_slugs = [r[0] for r in read_csv(GROUPS_PATH)]
-    projects = Project.objects.filter(slug__in=groups_slugs)
+    return list(Project.objects.filter(slug__in=groups_slugs).values_list(
+        'id', flat=True))
+
+
+def get_project_slugs(project_ids):
+    return dict(Project.objects.filter(id__in=project_ids).values_list(
+        'id', 'slug'))
+
+
+def get_badges(project_ids):
+    """Maps the ids of the badges of the given projects to their
+    (logic, slug) pair."""
+    badges = Badge.objects.filter(groups__in=project_ids).values_list('id',
+        'logic__name', 'slug').distinct()
+    return dict((badge_id, (logic, slug)) for badge_id, logic, slug in badges)
+
+
+def write_visits(project_ids):
+    projects = Project.objects.filter(id__in=project_ids)
     page_filters = get_page_filters(projects)
-    projects = projects.values('id')
+    page_matcher = get_page_matcher(projects)
     with open(VISITS_PATH, 'w') as f:
-        for pageview in PageView.objects.filter(page_filters).distinct():
-            if pageview.user:
-                f.write('%s,%s,%s,%s\n' % (pageview.request_url, pageview.access_time, pageview.ip_address, 'user%s' % pageview.user.id))
+        for pageview in archive.iter_pageviews(filters=page_filters,
+                matcher=page_matcher):
+            if pageview.user_id:
+                f.write('%s,%s,%s,%s\n' % (pageview.request_url, pageview.access_time, pageview.ip_address, 'user%s' % pageview.user_id))
             else:
                 f.write('%s,%s,%s,\n' % (pageview.request_url, pageview.access_time, pageview.ip_address))
-    groups_slugs = [r[0] for r in read_csv(GROUPS_PATH)]
-    projects = Project.objects.filter(slug__in=groups_slugs).values('id')
+
+
+def write_participations(project_ids):
+    slugs = get_project_slugs(project_ids)
+    participations = Participation.objects.filter(project__in=project_ids)
     with open(PARTICIPATIONS_PATH, 'w') as f:
-        for part in Participation.objects.filter(project__in=projects).distinct():
+        for part_id, project_id, user_id, joined_on, left_on, organizing, adopter in iter_keyset(
+                participations, ('project', 'user', 'joined_on', 'left_on', 'organizing', 'adopter')):
             status = 'learner'
-            if part.organizing:
+            if organizing:
                 status='creator'
-            elif part.adopter:
+            elif adopter:
                 status = 'adopter'
-            f.write('%s,%s,%s,%s,%s\n' % (part.project.slug, 'user%s' % part.user.id, part.joined_on, part.left_on or '', status))
+            f.write('%s,%s,%s,%s,%s\n' % (slugs[project_id], 'user%s' % user_id, joined_on, left_on or '', status))
+
+
+def write_tasks(project_ids):
+    slugs = get_project_slugs(project_ids)
+    tasks = Page.objects.filter(project__in=project_ids, listed=True, deleted=False)
     with open(TASKS_PATH, 'w') as f:
-        for task in Page.objects.filter(project__in=projects, listed=True, deleted=False).distinct():
-            f.write('%s,%s\n' % (task.project.slug, task.slug))
+        for task_id, project_id, slug in iter_keyset(tasks, ('project', 'slug')):
+            f.write('%s,%s\n' % (slugs[project_id], slug))
+
+
+def write_tasks_completion(project_ids):
+    slugs = get_project_slugs(project_ids)
+    completions = PerUserTaskCompletion.objects.filter(page__project__in=project_ids, page__deleted=False)
     with open(TASKS_COMPLETION_PATH, 'w') as f:
-        for comp in PerUserTaskCompletion.objects.filter(page__project__in=projects, page__deleted=False).distinct():
-            f.write('%s,%s,%s,%s,%s\n' % (comp.page.project.slug, comp.page.slug, 'user%s' % comp.user.id, comp.checked_on, comp.unchecked_on or ''))
+        for comp_id, project_id, page_slug, user_id, checked_on, unchecked_on in iter_keyset(
+                completions, ('page__project', 'page__slug', 'user', 'checked_on', 'unchecked_on')):
+            f.write('%s,%s,%s,%s,%s\n' % (slugs[project_id], page_slug, 'user%s' % user_id, checked_on, unchecked_on or ''))
+
+
+def write_badges_groups(project_ids):
+    slugs = get_project_slugs(project_ids)
+    groups = Badge.groups.through.objects.filter(project__in=project_ids).order_by(
+        'project', 'badge').values_list('project', 'badge__logic__name', 'badge__slug')
     with open(BADGES_GROUPS_PATH, 'w') as f:
-        for project in Project.objects.filter(id__in=projects).distinct():
-            for badge in project.badges.all():
-                f.write('%s,%s,%s\n' % (badge.logic, badge.slug, project.slug))
+        for project_id, logic, slug in groups:
+            f.write('%s,%s,%s\n' % (logic, slug, slugs[project_id]))
+
+
+def write_awards(project_ids):
+    badges = get_badges(project_ids)
+    awards = Award.objects.filter(badge__in=badges.keys())
     with open(AWARDS_PATH, 'w') as f:
-        for award in Award.objects.filter(badge__groups__in=projects).distinct():
-            f.write('%s,%s,%s,%s\n' % (award.badge.logic, award.badge.slug, 'user%s' % award.user.id, award.awarded_on))
+        for award_id, badge_id, user_id, awarded_on in iter_keyset(awards, ('badge', 'user', 'awarded_on')):
+            logic, slug = badges[badge_id]
+            f.write('%s,%s,%s,%s\n' % (logic, slug, 'user%s' % user_id, awarded_on))
+
+
+def write_assessments(project_ids):
+    badges = get_badges(project_ids)
+    assessments = Assessment.objects.filter(badge__in=badges.keys())
     with open(ASSESSMENTS_PATH, 'w') as f:
-        for assessment in Assessment.objects.filter(badge__groups__in=projects).distinct():
-            f.write('%s,%s,%s,%s,%s\n' % (assessment.badge.logic, assessment.badge.slug, 'user%s' % assessment.assessor.id,
-                'yes' if assessment.submission else 'no', assessment.created_on))
+        for assessment_id, badge_id, assessor_id, submission_id, created_on in iter_keyset(
+                assessments, ('badge', 'assessor', 'submission', 'created_on')):
+            logic, slug = badges[badge_id]
+            f.write('%s,%s,%s,%s,%s\n' % (logic, slug, 'user%s' % assessor_id,
+                'yes' if submission_id else 'no', created_on))
+
+
+def write_submissions(project_ids):
+    badges = get_badges(project_ids)
+    submissions = Submission.objects.filter(badge__in=badges.keys())
     with open(SUBMISSIONS_PATH, 'w') as f:
-        for sub in Submission.objects.filter(badge__groups__in=projects).distinct():
-            f.write('%s,%s,%s,%s\n' % (sub.badge.logic, sub.badge.slug, 'user%s' % sub.author.id, sub.created_on))
+        for sub_id, badge_id, author_id, created_on in iter_keyset(submissions, ('badge', 'author', 'created_on')):
+            logic, slug = badges[badge_id]
+            f.write('%s,%s,%s,%s\n' % (logic, slug, 'user%s' % author_id, created_on))
+
+
+def write_comments(project_ids):
+    slugs = get_project_slugs(project_ids)
     with open(COMMENTS_PATH, 'w') as f:
         project_ct = ContentType.objects.get_for_model(Project)
         status_ct = ContentType.objects.get_for_model(Status)
         task_ct = ContentType.objects.get_for_model(Page)
-        for status in Status.objects.filter(project__in=projects).distinct():
-            f.write('%s,,%s,%s\n' % (status.project.slug, 'user%s' % status.author.id, status.created_on))
-        comments = PageComment.objects.filter(scope_content_type=project_ct, scope_id__in=projects)
-        for comment in comments.filter(page_content_type=status_ct).distinct():
-            f.write('%s,,%s,%s\n' % (comment.scope_object.slug, 'user%s' % comment.author.id, comment.created_on))
-        for comment in comments.filter(page_content_type=task_ct).distinct():
-            f.write('%s,%s,%s,%s' % (comment.scope_object.slug, comment.page_object.slug, 'user%s' % comment.author.id, comment.created_on))
+        statuses = Status.objects.filter(project__in=project_ids)
+        for status_id, project_id, author_id, created_on in iter_keyset(statuses, ('project', 'author', 'created_on')):
+            f.write('%s,,%s,%s\n' % (slugs[project_id], 'user%s' % author_id, created_on))
+        comments = PageComment.objects.filter(scope_content_type=project_ct, scope_id__in=project_ids)
+        for comment_id, scope_id, author_id, created_on in iter_keyset(
+                comments.filter(page_content_type=status_ct), ('scope_id', 'author', 'created_on')):
+            f.write('%s,,%s,%s\n' % (slugs[scope_id], 'user%s' % author_id, created_on))
+        task_slugs = dict(Page.objects.filter(project__in=project_ids).values_list('id', 'slug'))
+        for comment_id, scope_id, page_id, author_id, created_on in iter_keyset(
+                comments.filter(page_content_type=task_ct), ('scope_id', 'page_id', 'author', 'created_on')):
+            f.write('%s,%s,%s,%s' % (slugs[scope_id], task_slugs[page_id], 'user%s' % author_id, created_on))
+
+
+# Each writer produces one of the output files.
+WRITERS = (write_visits, write_participations, write_tasks,
+    write_tasks_completion, write_badges_groups, write_awards,
+    write_assessments, write_submissions, write_comments)
+
+
+def run_writer(args):
+    writer, project_ids = args
+    writer(project_ids)
+
+
+def generate_csv_files(processes=None):
+    """Writes the output files in parallel worker processes (one per file
+    unless ``processes`` is given)."""
+    project_ids = get_project_ids()
+    # The workers are forked and must open their own database connection.
+    connection.close()
+    pool = multiprocessing.Pool(processes or len(WRITERS))
+    try:
+        pool.map(run_writer, [(writer, project_ids) for writer in WRITERS])
+    finally:
+        pool.close()
+        pool.join()
 
 
 def test_generated_csv_files():
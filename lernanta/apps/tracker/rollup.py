@@ -0,0 +1,184 @@
+"""Incremental rollup of PageView rows into PageViewMetrics.
+
+Every run makes a single pass over the pageviews stored since the last
+run (tracked by a persisted watermark), maps each url to its project page
+in memory and aggregates the four metric families of
+``update_metrics_cache`` at once. The results are added to the stored
+metrics with multi-row inserts for new rows and increments for the rows
+that already exist.
+"""
+import re
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import F, Max
+
+from drumbeat.utils import bulk_insert
+from content.models import Page
+from tracker.models import (PageViewMetrics, MetricsRollupWatermark,
+    get_pageview_models)
+
+log = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'pageview-metrics'
+
+# Number of pageviews fetched per query.
+CHUNK_SIZE = 5000
+
+PAGE_PATH_RE = re.compile(
+    r'(?:^|/)groups/(?P<project>[^/]+)/content/(?P<page>[^/]+)/$')
+
+METRICS_COLUMNS = ('project_id', 'page_path', 'user_id', 'ip_address',
+    'access_date', 'non_zero_length_time_on_page',
+    'non_zero_length_pageviews', 'zero_length_pageviews')
+
+
+def get_upper_bound(now=None):
+    """First access time not included in the rollup.
+
+    Only dates before today or yesterday (depending on how early it is in
+    the day) are rolled up, since their time on page values will not change
+    due to future pageviews."""
+    now = now or datetime.datetime.now()
+    upper_bound = now.date()
+    if now.hour < 2:
+        upper_bound -= datetime.timedelta(days=1)
+    return datetime.datetime.combine(upper_bound, datetime.time())
+
+
+def get_page_path(project_slug, page_slug):
+    return 'groups/%s/content/%s/' % (project_slug, page_slug)
+
+
+def get_page_map():
+    """Maps the page paths of all the projects to their project id. The
+    pageviews of the projects that are no longer active are rolled up too,
+    since they are archived (see tracker.archive) once rolled up."""
+    pages = Page.objects.values_list('project__slug', 'slug', 'project_id')
+    return dict((get_page_path(project_slug, page_slug), project_id)
+        for project_slug, page_slug, project_id in pages)
+
+
+def get_watermark_name(model):
+    """Compact and plain pageviews have separate id sequences, so each
+    table gets its own watermark."""
+    if model._meta.db_table == 'tracker_pageview':
+        return WATERMARK_NAME
+    return '%s-%s' % (WATERMARK_NAME, model._meta.db_table)
+
+
+def get_computed_days():
+    """Maps the projects to the last day of their metrics computed by
+    update_metrics_cache, which computed every day of a project up to its
+    last one."""
+    return dict(PageViewMetrics.objects.values('project').annotate(
+        Max('access_date')).values_list('project', 'access_date__max'))
+
+
+def aggregate_pageviews(pageviews, page_map, totals, computed_days=None):
+    """Adds (request_url, user_id, ip_address, access_time, time_on_page)
+    rows to ``totals``, keyed like the rows of PageViewMetrics. The rows
+    of the days in ``computed_days`` (see get_computed_days) are left
+    out."""
+    for request_url, user_id, ip_address, access_time, time_on_page in pageviews:
+        match = PAGE_PATH_RE.search(request_url)
+        if not match:
+            continue
+        page_path = get_page_path(match.group('project'), match.group('page'))
+        project_id = page_map.get(page_path)
+        if not project_id:
+            continue
+        access_date = access_time.date()
+        if computed_days and project_id in computed_days and (
+                access_date <= computed_days[project_id]):
+            continue
+        if user_id:
+            ip_address = None
+        key = (project_id, page_path, user_id, ip_address, access_date)
+        metric = totals.get(key)
+        if metric is None:
+            metric = totals[key] = [0, 0, 0]
+        if time_on_page is None:
+            metric[2] += 1
+        else:
+            metric[0] += time_on_page
+            metric[1] += 1
+
+
+def store_metrics(totals):
+    """Adds the aggregated ``totals`` to PageViewMetrics."""
+    if not totals:
+        return
+    project_ids = set(key[0] for key in totals)
+    dates = set(key[4] for key in totals)
+    existing = PageViewMetrics.objects.filter(project__in=project_ids,
+        access_date__in=dates).values_list('id', 'project_id', 'page_path',
+        'user_id', 'ip_address', 'access_date')
+    existing_ids = {}
+    for metric_id, project_id, page_path, user_id, ip_address, date in existing:
+        key = (project_id, page_path, user_id,
+            None if user_id else ip_address, date)
+        existing_ids[key] = metric_id
+    new_rows = []
+    for key, (time_on_page, non_zero, zero) in totals.iteritems():
+        metric_id = existing_ids.get(key)
+        if metric_id:
+            PageViewMetrics.objects.filter(id=metric_id).update(
+                non_zero_length_time_on_page=F(
+                    'non_zero_length_time_on_page') + time_on_page,
+                non_zero_length_pageviews=F(
+                    'non_zero_length_pageviews') + non_zero,
+                zero_length_pageviews=F('zero_length_pageviews') + zero)
+        else:
+            new_rows.append(list(key) + [time_on_page, non_zero, zero])
+    bulk_insert(PageViewMetrics, METRICS_COLUMNS, new_rows)
+
+
+def read_pageviews(model, page_map, totals, now=None):
+    """Aggregates the pageviews of ``model`` stored since its watermark
+    into ``totals`` and moves the watermark past them. Returns the number
+    of pageviews read."""
+    watermark, created = MetricsRollupWatermark.objects.get_or_create(
+        name=get_watermark_name(model))
+    # The first rollup reads all the stored pageviews, except the ones of
+    # the days update_metrics_cache computed before.
+    computed_days = get_computed_days() if created else None
+    pageviews = model.objects.filter(id__gt=watermark.last_pageview_id)
+    # Stop at the first pageview of a day that is not complete yet.
+    try:
+        stop_id = pageviews.filter(access_time__gte=get_upper_bound(
+            now)).order_by('id').values_list('id', flat=True)[0]
+        pageviews = pageviews.filter(id__lt=stop_id)
+    except IndexError:
+        pass
+    last_id = watermark.last_pageview_id
+    count = 0
+    while True:
+        chunk = list(pageviews.filter(id__gt=last_id).order_by(
+            'id').values_list('id', 'request_url', 'user_id', 'ip_address',
+            'access_time', 'time_on_page')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        aggregate_pageviews((row[1:] for row in chunk), page_map, totals,
+            computed_days)
+        last_id = chunk[-1][0]
+        count += len(chunk)
+    watermark.last_pageview_id = last_id
+    watermark.save()
+    return count
+
+
+@transaction.commit_on_success
+def rollup_pageview_metrics(now=None):
+    """Aggregates the pageviews stored since the last rollup into
+    PageViewMetrics. Returns the number of pageviews read."""
+    page_map = get_page_map()
+    totals = {}
+    count = 0
+    for model in get_pageview_models():
+        count += read_pageviews(model, page_map, totals, now)
+    store_metrics(totals)
+    log.debug('Rolled up %s pageviews into %s metrics.' % (count,
+        len(totals)))
+    return count
@@ -1,18 +1,20 @@
-# python_example.py
+"""Statsd metrics client.
 
-# Steve Ivy <steveivy@gmail.com>
-# http://monkinetic.com
- 
-# this file expects local_settings.py to be in the same dir, with statsd host and port information:
-# 
-# statsd_host = 'localhost'
-# statsd_port = 8125
+Counters and timers are aggregated in the process and sent to the statsd
+daemon at settings.STATSD_HOST:STATSD_PORT by a background thread every
+STATSD_FLUSH_INTERVAL seconds, packing several metrics per UDP packet.
+Recording a metric never touches the network or the database.
 
+>>> from tracker.statsd import Statsd
+>>> Statsd.increment('some.int')
+>>> Statsd.timing('some.time', 500)
+"""
+import os
 import random
-import sys
-from pprint import pprint
-from socket import socket, AF_INET, SOCK_DGRAM
+import socket
 import logging
+import threading
+from collections import defaultdict
 
 from django.conf import settings
 from django.contrib.sites.models import Site
@@ -20,19 +22,157 @@ from django.contrib.sites.models import Site
 log = logging.getLogger(__name__)
 
 
-# Sends statistics to the stats daemon over UDP
+class StatsClient(object):
+    """Aggregates counters and timers and sends them to a statsd daemon
+    when flushed."""
+
+    def __init__(self, host, port, prefix='', max_packet_size=512,
+            max_timings=1000):
+        self.addr = (host, port)
+        self.prefix = prefix
+        self.max_packet_size = max_packet_size
+        self.max_timings = max_timings
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.timers = defaultdict(list)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def sampled(self, sample_rate):
+        return sample_rate >= 1 or random.random() <= sample_rate
+
+    def update_stats(self, stats, delta=1, sample_rate=1):
+        if not self.sampled(sample_rate):
+            return
+        if not isinstance(stats, (list, tuple)):
+            stats = [stats]
+        self.lock.acquire()
+        try:
+            for stat in stats:
+                # counts sampled at different rates are sent separately
+                self.counters[(stat, sample_rate)] += delta
+        finally:
+            self.lock.release()
+
+    def timing(self, stat, time, sample_rate=1):
+        if not self.sampled(sample_rate):
+            return
+        self.lock.acquire()
+        try:
+            timings = self.timers[(stat, sample_rate)]
+            if len(timings) < self.max_timings:
+                timings.append(time)
+        finally:
+            self.lock.release()
+
+    def drain(self):
+        """Removes and returns the aggregated metrics as statsd lines."""
+        self.lock.acquire()
+        try:
+            counters, self.counters = self.counters, defaultdict(int)
+            timers, self.timers = self.timers, defaultdict(list)
+        finally:
+            self.lock.release()
+        lines = []
+        for (stat, sample_rate), value in counters.iteritems():
+            lines.append(self.format(stat, value, 'c', sample_rate))
+        for (stat, sample_rate), timings in timers.iteritems():
+            for value in timings:
+                lines.append(self.format(stat, '%d' % value, 'ms',
+                    sample_rate))
+        return lines
+
+    def format(self, stat, value, metric_type, sample_rate):
+        line = '%s%s:%s|%s' % (self.prefix, stat, value, metric_type)
+        if sample_rate < 1:
+            line += '|@%s' % sample_rate
+        return line
+
+    def packets(self, lines):
+        """Joins ``lines`` in packets of at most max_packet_size bytes."""
+        packet = []
+        size = 0
+        for line in lines:
+            if packet and size + len(line) + 1 > self.max_packet_size:
+                yield '\n'.join(packet)
+                packet = []
+                size = 0
+            packet.append(line)
+            size += len(line) + 1
+        if packet:
+            yield '\n'.join(packet)
+
+    def flush(self):
+        lines = self.drain()
+        for packet in self.packets(lines):
+            try:
+                self.sock.sendto(packet, self.addr)
+            except socket.error, error:
+                log.error('An error occurred sending metrics to statsd: %s'
+                    % error)
+        return len(lines)
+
+
+class StatsFlusher(threading.Thread):
+    """Daemon thread flushing a client at a fixed interval."""
+
+    def __init__(self, client, interval):
+        super(StatsFlusher, self).__init__(name='statsd-flusher')
+        self.daemon = True
+        self.client = client
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.stopped.wait(self.interval)
+            self.client.flush()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns this process' client (None if statsd is not configured),
+    starting its flusher thread on first use."""
+    global _client, _client_pid
+    # threads do not survive a fork, forked processes get their own client
+    if _client_pid != os.getpid():
+        _client_lock.acquire()
+        try:
+            if _client_pid != os.getpid():
+                host = getattr(settings, 'STATSD_HOST', None)
+                _client = None
+                if host:
+                    prefix = settings.STATSD_PREFIX
+                    if prefix is None:
+                        prefix = Site.objects.get_current().domain
+                    _client = StatsClient(host, settings.STATSD_PORT,
+                        prefix and prefix + '.',
+                        settings.STATSD_MAX_PACKET_SIZE)
+                    StatsFlusher(_client,
+                        settings.STATSD_FLUSH_INTERVAL).start()
+                else:
+                    log.debug('statsd not configured properly')
+                _client_pid = os.getpid()
+        finally:
+            _client_lock.release()
+    return _client
+
+
 class Statsd(object):
-    
+    """Records metrics with this process' client."""
+
     @staticmethod
     def timing(stat, time, sample_rate=1):
         """
         Log timing information
-        >>> from tracker.statsd import Statsd
         >>> Statsd.timing('some.time', 500)
         """
-        stats = {}
-        stats[stat] = "%d|ms" % time
-        Statsd.send(stats, sample_rate)
+        client = get_client()
+        if client:
+            client.timing(stat, time, sample_rate)
 
     @staticmethod
     def increment(stats, sample_rate=1):
@@ -50,54 +190,13 @@ class Statsd(object):
         >>> Statsd.decrement('some.int')
         """
         Statsd.update_stats(stats, -1, sample_rate)
-    
+
     @staticmethod
     def update_stats(stats, delta=1, sampleRate=1):
         """
         Updates one or more stats counters by arbitrary amounts
         >>> Statsd.update_stats('some.int',10)
         """
-        if (type(stats) is not list):
-            stats = [stats]
-        data = {}
-        for stat in stats:
-            data[stat] = "%s|c" % delta
-
-        Statsd.send(data, sampleRate)
-    
-    @staticmethod
-    def send(data, sample_rate=1):
-        """
-        Squirt the metrics over UDP
-        """
-        #TODO - disabling statsd for now
-        return
-        try:
-            host = settings.STATSD_HOST
-            port = settings.STATSD_PORT
-            addr=(host, port)
-        except AttributeError:
-            log.debug('statsd not configured properly')
-            return
-        
-        sampled_data = {}
-        
-        if(sample_rate < 1):
-            if random.random() <= sample_rate:
-                for stat in data.keys():
-                    value = data[stat]
-                    sampled_data[stat] = "%s|@%s" %(value, sample_rate)
-        else:
-            sampled_data=data
-
-        domain = Site.objects.get_current().domain
-
-        udp_sock = socket(AF_INET, SOCK_DGRAM)
-        try:
-            for stat in sampled_data.keys():
-                value = data[stat]
-                send_data = "%s.%s:%s" % (domain, stat, value)
-                udp_sock.sendto(send_data, addr)
-        except:
-            log.error("Unexpected error at statsd: %s" % pprint(sys.exc_info()))
-
+        client = get_client()
+        if client:
+            client.update_stats(stats, delta, sampleRate)
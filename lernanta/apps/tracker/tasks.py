@@ -1,20 +1,61 @@
+import os
+import datetime
+import unicodecsv
+
 from celery.task.schedules import crontab
 from celery.decorators import periodic_task
 
 from celery.task import Task
 
-from models import update_metrics_cache
-#from projects.models import get_active_projects
+from django.conf import settings
+
+from models import update_metrics_cache, MetricsExport
+from ingest import flush_pageviews, apply_durations
+from rollup import rollup_pageview_metrics
+import exports
+import archive
+import counters
 
 #TODO celery.decorators module is being deprecated
 @periodic_task(name="tracker.tasks.update_metrics", run_every=crontab(hour=4, minute=30, day_of_week="*"))
 def update_metrics():
     # This runs every morning at 4:30a.m
-    #log = update_metrics.get_logger()
-    #log.debug('updating project pageview metrics')
-    #for project in get_active_projects():
-    #    UpdateCourseMetrics.apply_async((project,))
-    pass
+    log = update_metrics.get_logger()
+    log.debug('updating project pageview metrics')
+    # A single pass over the new pageviews covers all the projects.
+    count = rollup_pageview_metrics()
+    log.debug('rolled up {0} pageviews'.format(count))
+
+
+@periodic_task(name="tracker.tasks.archive_pageviews", run_every=crontab(hour=5, minute=30, day_of_week="*"))
+def archive_pageviews():
+    # Runs after update_metrics, so the days it rolled up can be archived.
+    if not settings.TRACKER_ARCHIVE_PAGEVIEWS:
+        return
+    log = archive_pageviews.get_logger()
+    count = archive.archive_pageviews()
+    log.debug('archived {0} pageviews'.format(count))
+
+
+@periodic_task(name="tracker.tasks.clean_metrics_exports", run_every=crontab(hour=6, minute=30, day_of_week="*"))
+def clean_metrics_exports():
+    log = clean_metrics_exports.get_logger()
+    failed = exports.fail_stale_exports()
+    removed = exports.remove_old_exports()
+    log.debug('{0} stale metrics exports failed, {1} files removed'.format(
+        failed, removed))
+
+
+@periodic_task(name="tracker.tasks.reconcile_daily_counters", run_every=crontab(hour=3, minute=30, day_of_week="*"))
+def reconcile_daily_counters():
+    # Recomputes the days shown by the scoreboard, or all of them the
+    # first time.
+    start = None
+    if counters.DailyCounter.objects.exists():
+        today = datetime.date.today()
+        start = (today.replace(day=1) - datetime.timedelta(days=1)).replace(
+            day=1)
+    counters.reconcile_daily_counters(start)
 
 
 class UpdateCourseMetrics(Task):
@@ -25,3 +66,81 @@ class UpdateCourseMetrics(Task):
         log = self.get_logger(**kwargs)
         log.debug('updating pageview metrics for {0}'.format(project.name))
         update_metrics_cache(project)
+
+
+class FlushPageViews(Task):
+    """Stores a batch of buffered pageview records."""
+    name = 'tracker.tasks.FlushPageViews'
+
+    def run(self, records, **kwargs):
+        log = self.get_logger(**kwargs)
+        log.debug('flushing {0} pageview records'.format(len(records)))
+        flush_pageviews(records)
+
+
+class ApplyDurations(Task):
+    """Stores a batch of durations reported by the time on page beacon."""
+    name = 'tracker.tasks.ApplyDurations'
+
+    def run(self, records, **kwargs):
+        log = self.get_logger(**kwargs)
+        log.debug('applying {0} duration records'.format(len(records)))
+        apply_durations(records)
+
+
+class ExportProjectMetrics(Task):
+    """Writes the detailed metrics report of a project to disk."""
+    name = 'tracker.tasks.ExportProjectMetrics'
+
+    # How often (in rows) the progress of the export is recorded.
+    progress_interval = 500
+
+    def run(self, export_id, **kwargs):
+        log = self.get_logger(**kwargs)
+        export = MetricsExport.objects.get(id=export_id)
+        log.debug('exporting metrics of {0}'.format(export.project.slug))
+        MetricsExport.objects.filter(id=export_id).update(
+            status=MetricsExport.RUNNING)
+        filename = 'metrics-{0}-{1}.csv'.format(export.project.id,
+            export.fingerprint)
+        path = exports.get_export_path(filename)
+        tmp_path = '{0}.{1}.tmp'.format(path, export_id)
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(tmp_path, 'wb') as f:
+                writer = ProgressWriter(unicodecsv.writer(f), export_id,
+                    self.progress_interval)
+                exports.write_detailed_report(export.project, writer)
+            os.rename(tmp_path, path)
+        except Exception, error:
+            log.error('metrics export {0} failed: {1}'.format(export_id,
+                error))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            MetricsExport.objects.filter(id=export_id).update(
+                status=MetricsExport.FAILED,
+                finished_on=datetime.datetime.now())
+            return
+        MetricsExport.objects.filter(id=export_id).update(
+            status=MetricsExport.DONE, filename=filename,
+            rows_written=writer.rows_written,
+            finished_on=datetime.datetime.now())
+
+
+class ProgressWriter(object):
+    """Wraps a csv writer recording the number of rows written
+    on the export."""
+
+    def __init__(self, writer, export_id, interval):
+        self.writer = writer
+        self.export_id = export_id
+        self.interval = interval
+        self.rows_written = 0
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        self.rows_written += 1
+        if self.rows_written % self.interval == 0:
+            MetricsExport.objects.filter(id=self.export_id).update(
+                rows_written=self.rows_written)
@@ -0,0 +1,948 @@
+import os
+import time
+import socket
+import shutil
+import datetime
+import tempfile
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.template.base import Template
+from django.utils import simplejson
+from django.contrib.auth.models import User
+
+from test_utils import TestCase
+
+from drumbeat.testing import LocalCacheMixin
+from users.models import create_profile
+from projects.models import Project, Participation
+from content.models import Page
+from replies.models import PageComment
+from activity.models import Activity
+from activity.schema import verbs
+from tracker.models import (PageView, PageViewMetrics,
+    MetricsRollupWatermark, MetricsExport, DailyCounter, metrics_summary,
+    user_total_metrics, chronological_user_metrics, TrackedUrl,
+    CompactPageView, PageViewLog, get_pageview_models)
+from tracker import (rollup, statsd, exports, ingest, counters, tasks,
+    last_pageview, interning, paths, archive, report_csv, profiling)
+
+# The tracker_pageviewlog view as the migrations create it on sqlite, the
+# tests do not run them.
+PAGEVIEWLOG_VIEW = '''CREATE VIEW tracker_pageviewlog AS
+    SELECT p.id, p.session_key, p.user_id, p.access_time,
+        u.value AS request_url, r.value AS referrer_url,
+        (p.ip_number / 16777216) || '.' || ((p.ip_number / 65536) %% 256)
+        || '.' || ((p.ip_number / 256) %% 256) || '.' || (p.ip_number %% 256)
+        AS ip_address, p.time_on_page, ua.value AS user_agent, u.page_path,
+        u.project_id
+    FROM tracker_compactpageview p
+    INNER JOIN tracker_trackedurl u ON u.id = p.url_id
+    LEFT OUTER JOIN tracker_trackedreferrer r ON r.id = p.referrer_id
+    LEFT OUTER JOIN tracker_trackeduseragent ua ON ua.id = p.user_agent_id'''
+
+
+class RollupTests(TestCase):
+
+    now = datetime.datetime(2012, 5, 10, 12)
+    yesterday = datetime.datetime(2012, 5, 9, 10)
+
+    def setUp(self):
+        django_user = User(username='tracked', email='tracked@p2pu.org')
+        self.user = create_profile(django_user)
+        self.user.set_password('testpass')
+        self.user.save()
+        self.project = Project(name='Tracked Project',
+            short_description='This project is tracked',
+            long_description='No really, its tracked')
+        self.project.save()
+        self.page = Page(title='Tracked page', content='Tracked',
+            project=self.project, author=self.user)
+        self.page.save()
+        self.page_path = rollup.get_page_path(self.project.slug,
+            self.page.slug)
+
+    def add_pageview(self, access_time, time_on_page=None, user=None,
+            request_url=None):
+        if request_url is None:
+            request_url = '/en/' + self.page_path
+        pageview = PageView.objects.create(session_key='session',
+            user=user, request_url=request_url, ip_address='10.0.0.1',
+            time_on_page=time_on_page)
+        # access_time is set on creation
+        PageView.objects.filter(id=pageview.id).update(
+            access_time=access_time)
+        return pageview
+
+    def test_page_path_re(self):
+        """Test that only the urls of project pages are matched"""
+        match = rollup.PAGE_PATH_RE.search('/en/groups/a-b/content/c-d/')
+        self.assertEqual((match.group('project'), match.group('page')),
+            ('a-b', 'c-d'))
+        self.assertTrue(rollup.PAGE_PATH_RE.search('groups/a/content/b/'))
+        for url in ('/en/groups/a/', '/en/groups/a/content/b/history/',
+                '/en/groups/a/content/b', '/en/mygroups/a/content/b/'):
+            self.assertFalse(rollup.PAGE_PATH_RE.search(url), url)
+
+    def test_rollup_watermark(self):
+        """Test that each pageview is rolled up once, when its day ends"""
+        yesterday = self.add_pageview(self.yesterday, time_on_page=30)
+        today = self.add_pageview(self.now)
+        self.assertEqual(rollup.rollup_pageview_metrics(self.now), 1)
+        watermark = MetricsRollupWatermark.objects.get(
+            name=rollup.WATERMARK_NAME)
+        self.assertEqual(watermark.last_pageview_id, yesterday.id)
+        self.assertEqual(rollup.rollup_pageview_metrics(self.now), 0)
+        tomorrow = self.now + datetime.timedelta(days=1)
+        self.assertEqual(rollup.rollup_pageview_metrics(tomorrow), 1)
+        watermark = MetricsRollupWatermark.objects.get(
+            name=rollup.WATERMARK_NAME)
+        self.assertEqual(watermark.last_pageview_id, today.id)
+        metrics = PageViewMetrics.objects.order_by('access_date')
+        self.assertEqual([(metric.access_date, metric.page_path,
+            metric.non_zero_length_pageviews, metric.zero_length_pageviews)
+            for metric in metrics], [
+            (self.yesterday.date(), self.page_path, 1, 0),
+            (self.now.date(), self.page_path, 0, 1)])
+
+    def test_rollup_updates_and_inserts(self):
+        """Test that stored metrics are increased and new ones inserted"""
+        self.add_pageview(self.yesterday, time_on_page=30)
+        rollup.rollup_pageview_metrics(self.now)
+        metric = PageViewMetrics.objects.get()
+        self.add_pageview(self.yesterday, time_on_page=20)
+        self.add_pageview(self.yesterday)
+        self.add_pageview(self.yesterday, time_on_page=10,
+            user=self.user.user)
+        self.assertEqual(rollup.rollup_pageview_metrics(self.now), 3)
+        self.assertEqual(PageViewMetrics.objects.count(), 2)
+        metric = PageViewMetrics.objects.get(id=metric.id)
+        self.assertEqual((metric.non_zero_length_time_on_page,
+            metric.non_zero_length_pageviews, metric.zero_length_pageviews),
+            (50, 2, 1))
+        user_metric = PageViewMetrics.objects.get(user=self.user.user)
+        self.assertEqual(user_metric.ip_address, None)
+        self.assertEqual((user_metric.non_zero_length_time_on_page,
+            user_metric.non_zero_length_pageviews), (10, 1))
+
+    def test_first_rollup_skips_computed_days(self):
+        """Test that the first rollup reads the stored pageviews except
+        the days computed by update_metrics_cache"""
+        computed = self.yesterday - datetime.timedelta(days=1)
+        PageViewMetrics.objects.create(project=self.project,
+            page_path=self.page_path, ip_address='10.0.0.1',
+            access_date=computed.date(), non_zero_length_time_on_page=0,
+            non_zero_length_pageviews=0, zero_length_pageviews=1)
+        self.add_pageview(computed - datetime.timedelta(days=1))
+        self.add_pageview(computed)
+        self.add_pageview(self.yesterday)
+        self.assertEqual(rollup.rollup_pageview_metrics(self.now), 3)
+        self.assertEqual(sorted(PageViewMetrics.objects.values_list(
+            'access_date', 'zero_length_pageviews')), [
+            (computed.date(), 1), (self.yesterday.date(), 1)])
+
+
+class StatsdTests(TestCase):
+
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.settimeout(5)
+
+    def tearDown(self):
+        self.listener.close()
+
+    def receive(self, count):
+        return [self.listener.recv(4096) for i in range(count)]
+
+    def test_flush_packets(self):
+        """Test that flushed metrics reach the daemon in small packets"""
+        host, port = self.listener.getsockname()
+        client = statsd.StatsClient(host, port, 'site.', max_packet_size=40)
+        client.update_stats('comments')
+        client.update_stats(['comments', 'users'], 2)
+        client.update_stats('sampled', sample_rate=0.5 ** 100)
+        client.timing('render', 120.7)
+        client.timing('render', 80)
+        self.assertEqual(client.flush(), 4)
+        packets = self.receive(2)
+        for packet in packets:
+            self.assertTrue(len(packet) <= 40)
+        self.assertEqual(sorted('\n'.join(packets).split('\n')), [
+            'site.comments:3|c', 'site.render:120|ms', 'site.render:80|ms',
+            'site.users:2|c'])
+        self.assertEqual(client.flush(), 0)
+
+    def test_sample_rate(self):
+        """Test that the sample rate is sent with the sampled counters"""
+        host, port = self.listener.getsockname()
+        client = statsd.StatsClient(host, port)
+        client.update_stats('sampled', sample_rate=0.999999999)
+        client.flush()
+        self.assertEqual(self.receive(1), ['sampled:1|c|@0.999999999'])
+
+    def test_not_configured(self):
+        """Test that nothing is recorded without STATSD_HOST"""
+        host = getattr(settings, 'STATSD_HOST', None)
+        settings.STATSD_HOST = None
+        statsd._client_pid = None
+        try:
+            self.assertEqual(statsd.get_client(), None)
+            statsd.Statsd.increment('comments')
+        finally:
+            settings.STATSD_HOST = host
+            statsd._client_pid = None
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.project = Project(name='Exported Project',
+            short_description='This project is exported',
+            long_description='No really, its exported')
+        self.project.save()
+
+    def test_fail_stale_exports(self):
+        """Test that exports stuck for too long are marked as failed"""
+        now = datetime.datetime.now()
+        stuck = MetricsExport.objects.create(project=self.project,
+            status=MetricsExport.RUNNING)
+        MetricsExport.objects.filter(id=stuck.id).update(
+            created_on=now - datetime.timedelta(
+            seconds=settings.METRICS_EXPORT_TIMEOUT + 1))
+        pending = MetricsExport.objects.create(project=self.project)
+        self.assertEqual(exports.fail_stale_exports(now), 1)
+        self.assertEqual(MetricsExport.objects.get(id=stuck.id).status,
+            MetricsExport.FAILED)
+        self.assertEqual(MetricsExport.objects.get(id=pending.id).status,
+            MetricsExport.PENDING)
+
+    def test_fingerprint_follows_rollup(self):
+        """Test that rolling up pageviews changes the dataset fingerprint"""
+        fingerprint = exports.get_dataset_fingerprint(self.project)
+        MetricsRollupWatermark.objects.create(name=rollup.WATERMARK_NAME,
+            last_pageview_id=10)
+        self.assertNotEqual(exports.get_dataset_fingerprint(self.project),
+            fingerprint)
+
+    def test_remove_old_exports(self):
+        """Test that only the old report files are removed"""
+        export_root = settings.METRICS_EXPORT_ROOT
+        settings.METRICS_EXPORT_ROOT = tempfile.mkdtemp()
+        try:
+            old_path = exports.get_export_path('old.csv')
+            new_path = exports.get_export_path('new.csv')
+            for path in (old_path, new_path):
+                open(path, 'w').close()
+            written = time.time() - (
+                settings.METRICS_EXPORT_MAX_AGE + 1) * 24 * 60 * 60
+            os.utime(old_path, (written, written))
+            self.assertEqual(exports.remove_old_exports(), 1)
+            self.assertFalse(os.path.exists(old_path))
+            self.assertTrue(os.path.exists(new_path))
+        finally:
+            shutil.rmtree(settings.METRICS_EXPORT_ROOT)
+            settings.METRICS_EXPORT_ROOT = export_root
+
+
+class BufferTests(TestCase):
+
+    start = datetime.datetime(2012, 5, 9, 10)
+
+    def make_record(self, session_key, seconds=0):
+        record = ingest.make_record(session_key, None, '/en/groups/x/',
+            'unknown', '10.0.0.1', 'agent')
+        record['access_time'] = self.start + datetime.timedelta(
+            seconds=seconds)
+        return record
+
+    def test_flush_on_size(self):
+        """Test that the buffer is flushed once it holds flush_size
+        records, and drops records when full"""
+        buffer = ingest.PageViewBuffer(max_size=3, flush_size=2,
+            flush_age=60)
+        self.assertFalse(buffer.should_flush())
+        buffer.add(self.make_record('one'))
+        self.assertFalse(buffer.should_flush())
+        self.assertFalse(buffer.ready.is_set())
+        buffer.add(self.make_record('two'))
+        self.assertTrue(buffer.should_flush())
+        self.assertTrue(buffer.ready.is_set())
+        self.assertTrue(buffer.add(self.make_record('three')))
+        self.assertFalse(buffer.add(self.make_record('four')))
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        self.assertEqual(len(buffer.drain()), 3)
+        self.assertFalse(buffer.ready.is_set())
+
+    def test_flush_on_age(self):
+        """Test that the buffer is flushed once its oldest record is
+        flush_age seconds old"""
+        buffer = ingest.PageViewBuffer(max_size=10, flush_size=10,
+            flush_age=60)
+        buffer.add(self.make_record('one'))
+        self.assertFalse(buffer.should_flush())
+        buffer.oldest -= 60
+        self.assertTrue(buffer.should_flush())
+
+    def test_flush_multi_row_insert(self):
+        """Test that a flush stores its records with a single INSERT and
+        the time on page of the records followed by another one"""
+        buffer = ingest.PageViewBuffer(max_size=10, flush_size=10,
+            flush_age=60)
+        for session_key, seconds in (('one', 0), ('two', 5), ('one', 30)):
+            buffer.add(self.make_record(session_key, seconds))
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        connection.queries = []
+        try:
+            self.assertEqual(buffer.flush(), 3)
+            inserts = [query for query in connection.queries
+                if query['sql'].startswith('INSERT')]
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(sorted(PageView.objects.values_list('session_key',
+            'time_on_page')), [('one', None), ('one', 30), ('two', None)])
+        self.assertEqual(buffer.stats()['flushed'], 3)
+
+
+class BeaconTests(TestCase):
+
+    def setUp(self):
+        self.buffer = ingest.get_duration_buffer()
+        self.buffer.drain()
+
+    def tearDown(self):
+        self.buffer.drain()
+
+    def add_pageview(self, session_key):
+        return PageView.objects.create(session_key=session_key,
+            request_url='/en/groups/x/', ip_address='10.0.0.1')
+
+    def test_beacon(self):
+        """Test that the beacon takes csrf exempt POSTs of durations"""
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(client.get('/tracker/beacon/').status_code, 405)
+        response = client.post('/tracker/beacon/',
+            simplejson.dumps([[1, 12], [2, 60 * 60 * 24], [-1, 5]]),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 204)
+        records = self.buffer.drain()
+        self.assertEqual([(record['pageview_id'], record['time_on_page'])
+            for record in records], [(1, 12)])
+        self.assertTrue(records[0]['session_key'])
+        response = client.post('/tracker/beacon/', 'not json',
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        # too large for an int once parsed
+        response = client.post('/tracker/beacon/', '[[5, 1e400]]',
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.buffer.drain(), [])
+
+    def test_apply_durations(self):
+        """Test that durations are only applied to the pageviews of the
+        session reporting them"""
+        own = self.add_pageview('one')
+        other = self.add_pageview('two')
+        buffer = ingest.DurationBuffer(max_size=10, flush_size=10,
+            flush_age=60)
+        buffer.add(ingest.make_duration_record('one', own.id, 12))
+        buffer.add(ingest.make_duration_record('one', other.id, 30))
+        self.assertEqual(buffer.flush(), 2)
+        durations = dict(PageView.objects.values_list('id', 'time_on_page'))
+        self.assertEqual((durations[own.id], durations[other.id]), (12, None))
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        django_user = User(username='counted', email='counted@p2pu.org')
+        self.user = create_profile(django_user)
+        self.user.set_password('testpass')
+        self.user.save()
+        self.project = Project(name='Counted Project',
+            short_description='This project is counted',
+            long_description='No really, its counted')
+        self.project.save()
+        self.today = datetime.date.today()
+
+    def get_count(self, name):
+        return sum(DailyCounter.objects.filter(name=name,
+            date=self.today).values_list('count', flat=True))
+
+    def join(self):
+        participation = Participation(user=self.user, project=self.project)
+        participation.save()
+        return participation
+
+    def test_signals_increment(self):
+        """Test that creating the counted objects increments the counters
+        of the day"""
+        self.assertEqual(self.get_count('users'), 1)
+        self.assertEqual(self.get_count('groups'), 1)
+        test_project = Project(name='Test Project', test=True,
+            short_description='This project is not counted',
+            long_description='No really, its not counted')
+        test_project.save()
+        self.assertEqual(self.get_count('groups'), 1)
+        participation = self.join()
+        self.assertEqual(self.get_count('joins'), 1)
+        participation.save()
+        self.assertEqual(self.get_count('joins'), 1)
+        participation.left_on = datetime.datetime.now()
+        participation.save()
+        self.assertEqual(self.get_count('joins'), 0)
+        participation.save()
+        self.assertEqual(self.get_count('joins'), 0)
+
+    def test_unchanged_participation_not_read(self):
+        """Test that saving a participation reads its stored state only
+        when it leaves the group or moves to another"""
+        participation = self.join()
+        participation = Participation.objects.get(id=participation.id)
+        participation.organizing = True
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        try:
+            connection.queries = []
+            participation.save()
+            self.assertFalse([query for query in connection.queries
+                if 'left_on" IS NULL' in query['sql']])
+            participation.left_on = datetime.datetime.now()
+            connection.queries = []
+            participation.save()
+            self.assertTrue([query for query in connection.queries
+                if 'left_on" IS NULL' in query['sql']])
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+        self.assertEqual(self.get_count('joins'), 0)
+
+    def test_reconcile(self):
+        """Test that the reconcile fixes the counters changed without
+        signals"""
+        self.join()
+        Participation.objects.filter(user=self.user).update(
+            left_on=datetime.datetime.now())
+        DailyCounter.objects.filter(name='users').update(count=5)
+        yesterday = self.today - datetime.timedelta(days=1)
+        DailyCounter(name='groups', date=yesterday, count=3).save()
+        counters.reconcile_daily_counters(yesterday)
+        self.assertEqual(self.get_count('users'), 1)
+        self.assertEqual(self.get_count('joins'), 0)
+        self.assertEqual(list(DailyCounter.objects.filter(name='groups',
+            date=yesterday).values_list('count', flat=True)), [0])
+
+    def test_reconcile_task_backfills(self):
+        """Test that the periodic task counts all the days when there are
+        no counters"""
+        created_on = datetime.datetime(2011, 3, 4, 10)
+        Project.objects.filter(id=self.project.id).update(
+            created_on=created_on)
+        DailyCounter.objects.all().delete()
+        tasks.reconcile_daily_counters()
+        self.assertEqual(list(DailyCounter.objects.filter(name='groups',
+            date=created_on.date()).values_list('count', flat=True)), [1])
+        self.assertEqual(self.get_count('users'), 1)
+
+
+class LastPageviewTests(LocalCacheMixin, TestCase):
+
+    cached_modules = (last_pageview,)
+
+    def setUp(self):
+        self.compact = settings.TRACKER_COMPACT_PAGEVIEWS
+        django_user = User(username='visitor', email='visitor@p2pu.org')
+        self.user = create_profile(django_user)
+        self.user.set_password('testpass')
+        self.user.save()
+
+    def tearDown(self):
+        settings.TRACKER_COMPACT_PAGEVIEWS = self.compact
+        last_pageview._store = None
+
+    def test_local_lru_store(self):
+        """Test that the local store evicts the least recently used and
+        the expired entries"""
+        store = last_pageview.LocalLRUStore(2, timeout=60)
+        store.set_many({'one': (1, None), 'two': (2, None)})
+        self.assertEqual(store.get_many(['one']), {'one': (1, None)})
+        store.set_many({'three': (3, None)})
+        self.assertEqual(store.get_many(['one', 'two', 'three']),
+            {'one': (1, None), 'three': (3, None)})
+        store = last_pageview.LocalLRUStore(2, timeout=0)
+        store.set_many({'one': (1, None)})
+        self.assertEqual(store.get_many(['one']), {})
+        self.assertEqual(len(store.entries), 0)
+
+    def test_compact_key_prefix(self):
+        """Test that the entries stored for one pageview table are not
+        read for the other"""
+        store = last_pageview.DjangoCacheStore()
+        settings.TRACKER_COMPACT_PAGEVIEWS = False
+        store.set_many({'one': (1, None)})
+        self.assertEqual(store.get_many(['one']), {'one': (1, None)})
+        settings.TRACKER_COMPACT_PAGEVIEWS = True
+        self.assertEqual(store.get_many(['one']), {})
+        store.set_many({'one': (2, None)})
+        self.assertEqual(store.get_many(['one']), {'one': (2, None)})
+        settings.TRACKER_COMPACT_PAGEVIEWS = False
+        self.assertEqual(store.get_many(['one']), {'one': (1, None)})
+
+    def test_time_on_page(self):
+        """Test that the next request of a session sets the time on page
+        of the previous pageview without reading the pageviews"""
+        settings.TRACKER_COMPACT_PAGEVIEWS = False
+        last_pageview._store = last_pageview.LocalLRUStore(10)
+        client = Client()
+        client.login(username='visitor', password='testpass')
+        client.get('/en/courses/create/')
+        first = PageView.objects.latest('id')
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        try:
+            connection.queries = []
+            client.get('/en/courses/create/')
+            selects = [query for query in connection.queries
+                if query['sql'].startswith('SELECT')
+                and 'tracker_pageview' in query['sql']]
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+        self.assertEqual(selects, [])
+        pageviews = list(PageView.objects.filter(
+            session_key=first.session_key).order_by('id').values_list(
+            'id', 'time_on_page'))
+        self.assertEqual(len(pageviews), 2)
+        self.assertEqual(pageviews[0][0], first.id)
+        self.assertTrue(pageviews[0][1] is not None)
+        self.assertEqual(pageviews[1][1], None)
+
+
+class UserMetricsTests(TestCase):
+
+    first_day = datetime.date(2012, 5, 1)
+    second_day = datetime.date(2012, 5, 2)
+
+    def setUp(self):
+        profiles = []
+        for username in ('alice', 'bob'):
+            django_user = User(username=username,
+                email='%s@p2pu.org' % username)
+            profile = create_profile(django_user)
+            profile.set_password('testpass')
+            profile.save()
+            profiles.append(profile)
+        self.alice, self.bob = profiles
+        self.project = Project(name='Measured Project',
+            short_description='This project is measured',
+            long_description='No really, its measured')
+        self.project.save()
+        self.page = Page(title='Measured page', content='Measured',
+            project=self.project, author=self.alice)
+        self.page.save()
+        for user, day, path, time_on_page, pageviews, zero_length in (
+                (self.alice, self.first_day, '/a', 120, 2, 1),
+                (self.alice, self.first_day, '/b', 60, 1, 0),
+                (self.alice, self.second_day, '/a', 30, 1, 2),
+                (self.bob, self.second_day, '/a', 0, 0, 3),
+                (None, self.first_day, '/a', 600, 5, 5)):
+            PageViewMetrics(project=self.project,
+                user_id=user and user.id, ip_address='10.0.0.1',
+                access_date=day, page_path=path,
+                non_zero_length_time_on_page=time_on_page,
+                non_zero_length_pageviews=pageviews,
+                zero_length_pageviews=zero_length).save()
+        for author, day in ((self.alice, self.first_day),
+                (self.alice, self.first_day), (self.alice, self.second_day),
+                (self.bob, self.second_day)):
+            comment = PageComment(content='A comment', author=author,
+                page_object=self.page, scope_object=self.project)
+            comment.save()
+            PageComment.objects.filter(id=comment.id).update(
+                created_on=self.at_noon(day))
+        for author, day in ((self.bob, self.first_day),
+                (self.alice, self.second_day)):
+            self.page.author = author
+            self.page.save()
+            edit = Activity.objects.filter(verb=verbs['update'],
+                actor=author).latest('id')
+            Activity.objects.filter(id=edit.id).update(
+                created_on=self.at_noon(day))
+        self.bob.deleted = True
+        self.bob.save()
+
+    def at_noon(self, day):
+        return datetime.datetime.combine(day, datetime.time(12))
+
+    def test_metrics_summary(self):
+        """Test the summary of the users shown on the metrics page"""
+        self.assertEqual(list(metrics_summary(self.project,
+            [self.alice, self.bob])), [
+            ['alice', self.second_day, '6.50', 3, 1],
+            ['anonymous2', self.second_day, '3.00', 1, 1]])
+
+    def test_user_total_metrics(self):
+        """Test the totals of the users in the detailed csv"""
+        self.assertEqual(list(user_total_metrics(self.project,
+            [self.alice, self.bob])), [
+            ['alice', '3.50', 4, 3, 3, 1],
+            ['anonymous2', '0.00', 0, 3, 1, 1]])
+
+    def test_chronological_user_metrics(self):
+        """Test the daily metrics of the users in the detailed csv"""
+        self.assertEqual(list(chronological_user_metrics(self.project,
+            [self.alice, self.bob])), [
+            ['alice', '2012-05-02', '0.50', 1, 2, 1, 1],
+            ['alice', '2012-05-01', '3.00', 3, 1, 2, 0],
+            ['anonymous2', '2012-05-02', '0.00', 0, 3, 1, 0],
+            ['anonymous2', '2012-05-01', '0.00', 0, 0, 0, 1]])
+
+
+class CompactPageviewTests(TestCase):
+
+    def setUp(self):
+        self.compact = settings.TRACKER_COMPACT_PAGEVIEWS
+        settings.TRACKER_COMPACT_PAGEVIEWS = True
+        # the ids of the rolled back tests are not kept
+        interning._interners.clear()
+        paths._project_ids = None
+        self.project = Project(name='Compact Project',
+            short_description='This project is compact',
+            long_description='No really, its compact')
+        self.project.save()
+        self.url = '/en/groups/%s/' % self.project.slug
+
+    def tearDown(self):
+        settings.TRACKER_COMPACT_PAGEVIEWS = self.compact
+        interning._interners.clear()
+
+    def save_pageview(self, session_key, url=None):
+        record = ingest.make_record(session_key, None, url or self.url,
+            'http://example.com/', '10.0.0.1', 'agent')
+        return ingest.save_pageview(record)[0]
+
+    def test_interned_strings(self):
+        """Test that the strings of the pageviews are stored once"""
+        self.save_pageview('one')
+        self.save_pageview('two')
+        interning._interners.clear()
+        self.save_pageview('three')
+        self.assertEqual(TrackedUrl.objects.filter(value=self.url).count(),
+            1)
+        url = TrackedUrl.objects.get(value=self.url)
+        self.assertEqual(url.project_id, self.project.id)
+        self.assertEqual(sorted(CompactPageView.objects.values_list(
+            'session_key', 'url', 'ip_number')), [
+            ('one', url.id, 167772161), ('three', url.id, 167772161),
+            ('two', url.id, 167772161)])
+        self.assertEqual(PageView.objects.count(), 0)
+
+    def test_concurrent_insert(self):
+        """Test that a string stored by a concurrent ingest is read"""
+        interner = interning.get_url_interner()
+        digest = interning.get_digest(self.url)
+        url = TrackedUrl.objects.create(value=self.url, digest=digest)
+        self.assertEqual(interner.create(digest, self.url), url.id)
+        self.assertEqual(TrackedUrl.objects.filter(digest=digest).count(),
+            1)
+
+    def test_read_both_tables(self):
+        """Test that the plain and compact pageviews are both read"""
+        settings.TRACKER_COMPACT_PAGEVIEWS = False
+        self.assertEqual(get_pageview_models(), [PageView])
+        plain_id = self.save_pageview('plain')
+        settings.TRACKER_COMPACT_PAGEVIEWS = True
+        compact_id = self.save_pageview('compact', '/en/groups/other/')
+        settings.TRACKER_COMPACT_PAGEVIEWS = False
+        connection.cursor().execute(PAGEVIEWLOG_VIEW, [])
+        pageview_models = get_pageview_models()
+        self.assertEqual(pageview_models, [PageView, PageViewLog])
+        rows = []
+        for model in pageview_models:
+            rows.extend(model.objects.values_list('id', 'session_key',
+                'request_url', 'referrer_url', 'ip_address', 'user_agent',
+                'project'))
+        self.assertEqual(rows, [
+            (plain_id, 'plain', self.url, 'http://example.com/', '10.0.0.1',
+                'agent', self.project.id),
+            (compact_id, 'compact', '/en/groups/other/',
+                'http://example.com/', '10.0.0.1', 'agent', None)])
+
+
+class ArchiveTests(TestCase):
+
+    now = datetime.datetime(2012, 6, 20, 12)
+    old_day = datetime.date(2012, 5, 1)
+
+    def setUp(self):
+        self.archive_root = settings.TRACKER_ARCHIVE_ROOT
+        settings.TRACKER_ARCHIVE_ROOT = tempfile.mkdtemp()
+        self.compact = settings.TRACKER_COMPACT_PAGEVIEWS
+        settings.TRACKER_COMPACT_PAGEVIEWS = False
+        self.pageviews = [
+            self.add_pageview('one', datetime.datetime(2012, 5, 1, 10), 12,
+                'http://example.com/'),
+            self.add_pageview('two', datetime.datetime(2012, 5, 1, 11)),
+            # after the archive bound
+            self.add_pageview('three', datetime.datetime(2012, 6, 10, 9)),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(settings.TRACKER_ARCHIVE_ROOT)
+        settings.TRACKER_ARCHIVE_ROOT = self.archive_root
+        settings.TRACKER_COMPACT_PAGEVIEWS = self.compact
+
+    def add_pageview(self, session_key, access_time, time_on_page=None,
+            referrer_url=None):
+        pageview = PageView.objects.create(session_key=session_key,
+            request_url='/en/groups/x/', referrer_url=referrer_url,
+            ip_address='10.0.0.1', time_on_page=time_on_page,
+            user_agent='agent')
+        PageView.objects.filter(id=pageview.id).update(
+            access_time=access_time)
+        return archive.ArchivedPageView(*PageView.objects.filter(
+            id=pageview.id).values_list(*archive.ARCHIVE_COLUMNS)[0])
+
+    def roll_up(self, pageview):
+        MetricsRollupWatermark.objects.create(
+            name=rollup.get_watermark_name(PageView),
+            last_pageview_id=pageview.id)
+
+    def get_live_ids(self):
+        return sorted(PageView.objects.values_list('id', flat=True))
+
+    def test_archive(self):
+        """Test that the rolled up days older than the archive delay are
+        moved to the archive files"""
+        self.assertEqual(archive.archive_pageviews(self.now), 0)
+        self.roll_up(self.pageviews[-1])
+        self.assertEqual(archive.get_archive_bound(self.now),
+            datetime.date(2012, 5, 21))
+        self.assertEqual(archive.archive_pageviews(self.now), 2)
+        self.assertEqual(self.get_live_ids(), [self.pageviews[2].id])
+        files = archive.get_archive_files()
+        self.assertEqual([(day, table, last_id)
+            for day, table, last_id, path in files],
+            [(self.old_day, 'tracker_pageview', self.pageviews[1].id)])
+        self.assertEqual(list(archive.iter_archived_pageviews(
+            self.old_day)), self.pageviews[:2])
+        # a second run writes and deletes nothing
+        self.assertEqual(archive.archive_pageviews(self.now), 0)
+        self.assertEqual(archive.get_archive_files(), files)
+        self.assertEqual(self.get_live_ids(), [self.pageviews[2].id])
+
+    def test_pending_pageviews_kept(self):
+        """Test that the pageviews not rolled up are kept"""
+        self.roll_up(self.pageviews[0])
+        self.assertEqual(archive.get_archive_bound(self.now), self.old_day)
+        self.assertEqual(archive.archive_pageviews(self.now), 0)
+        self.assertEqual(archive.archive_day(self.old_day), 1)
+        self.assertEqual(self.get_live_ids(), [self.pageviews[1].id,
+            self.pageviews[2].id])
+        self.assertEqual(archive.archive_day(self.old_day), 0)
+        self.assertEqual(len(archive.get_archive_files()), 1)
+
+    def test_iter_pageviews(self):
+        """Test that the archived pageviews are streamed before the live
+        ones"""
+        self.roll_up(self.pageviews[-1])
+        archive.archive_pageviews(self.now)
+        self.assertEqual(list(archive.iter_pageviews()), self.pageviews)
+        self.assertEqual(list(archive.iter_pageviews(
+            start=datetime.date(2012, 6, 1))), self.pageviews[2:])
+
+    def test_parse_row(self):
+        """Test that the archived values are read back"""
+        pageview = archive.parse_row(['5', 'one', '',
+            '2012-05-01 10:00:00.250000', '/en/groups/x/', '', '10.0.0.1',
+            '', 'agent'])
+        self.assertEqual(pageview, archive.ArchivedPageView(5, 'one', None,
+            datetime.datetime(2012, 5, 1, 10, 0, 0, 250000),
+            '/en/groups/x/', None, '10.0.0.1', None, 'agent'))
+        pageview = archive.parse_row(['6', 'two', '3',
+            '2012-05-01 10:00:00', '/en/', '', '', '30', ''])
+        self.assertEqual((pageview.user_id, pageview.time_on_page,
+            pageview.access_time), (3, 30, datetime.datetime(2012, 5, 1, 10)))
+
+
+class PathTests(TestCase):
+
+    def setUp(self):
+        # the project ids of the rolled back tests are not kept
+        paths._project_ids = None
+
+    def tearDown(self):
+        paths._project_ids = None
+
+    def test_project_created_later(self):
+        """Test that the pages of a project seen before it was created
+        get its id and are reported"""
+        url = '/en/groups/later-project/'
+        self.assertEqual(paths.resolve_pages([url]),
+            {url: ('/groups/later-project/', None)})
+        PageView.objects.create(session_key='early', request_url=url,
+            page_path='/groups/later-project/')
+        project = Project(name='Later Project',
+            short_description='This project was created later',
+            long_description='No really, its late')
+        project.save()
+        self.assertEqual(project.slug, 'later-project')
+        self.assertEqual(paths.resolve_pages([url]),
+            {url: ('/groups/later-project/', project.id)})
+        projects = Project.objects.filter(id=project.id)
+        self.assertEqual(list(PageView.objects.filter(
+            report_csv.get_page_filters(projects)).values_list(
+            'session_key', flat=True)), ['early'])
+
+
+class ReportTests(TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.report_dir = tempfile.mkdtemp()
+        # the report files are written to the working directory
+        os.chdir(self.report_dir)
+        paths._project_ids = None
+        profiles = []
+        for username in ('creator', 'learner'):
+            django_user = User(username=username,
+                email='%s@p2pu.org' % username)
+            profile = create_profile(django_user)
+            profile.set_password('testpass')
+            profile.save()
+            profiles.append(profile)
+        self.creator, self.learner = profiles
+        self.projects = []
+        for name in ('Reported Project', 'Other Project'):
+            project = Project(name=name,
+                short_description='This project is reported',
+                long_description='No really, its reported')
+            project.save()
+            self.projects.append(project)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.report_dir)
+        paths._project_ids = None
+
+    def read_lines(self, path):
+        with open(path) as f:
+            return f.read().splitlines()
+
+    def test_write_visits(self):
+        """Test that the visits of the pages of the projects are
+        written"""
+        pageviews = []
+        for session_key, user, project in (('one', self.learner,
+                self.projects[0]), ('two', None, self.projects[0]),
+                ('three', None, self.projects[1])):
+            url = '/en/groups/%s/' % project.slug
+            record = ingest.make_record(session_key, user and user.id, url,
+                'unknown', '10.0.0.1', 'agent')
+            pageviews.append(ingest.save_pageview(record))
+        report_csv.run_writer((report_csv.write_visits,
+            [self.projects[0].id]))
+        url = '/en/groups/%s/' % self.projects[0].slug
+        self.assertEqual(self.read_lines(report_csv.VISITS_PATH), [
+            '%s,%s,10.0.0.1,user%s' % (url, pageviews[0][1],
+                self.learner.id),
+            '%s,%s,10.0.0.1,' % (url, pageviews[1][1])])
+
+    def test_write_participations(self):
+        """Test that the participations of the projects are written in
+        id order"""
+        left_on = datetime.datetime(2012, 5, 2, 10)
+        Participation(project=self.projects[0], user=self.creator,
+            organizing=True).save()
+        Participation(project=self.projects[0], user=self.learner,
+            left_on=left_on).save()
+        Participation(project=self.projects[1], user=self.learner).save()
+        report_csv.run_writer((report_csv.write_participations,
+            [self.projects[0].id]))
+        joined_on = list(Participation.objects.filter(
+            project=self.projects[0]).order_by('id').values_list(
+            'joined_on', flat=True))
+        slug = self.projects[0].slug
+        self.assertEqual(self.read_lines(report_csv.PARTICIPATIONS_PATH), [
+            '%s,user%s,%s,,creator' % (slug, self.creator.id, joined_on[0]),
+            '%s,user%s,%s,%s,learner' % (slug, self.learner.id,
+                joined_on[1], left_on)])
+
+
+class ProfilingTests(LocalCacheMixin, TestCase):
+
+    cached_modules = (profiling,)
+
+    def setUp(self):
+        self.profiling = settings.TRACKER_PROFILING
+        self.sample_rate = settings.TRACKER_PROFILING_SAMPLE_RATE
+        self.slow_request = settings.TRACKER_PROFILING_SLOW_REQUEST
+        # the middleware wraps the template rendering when it is loaded
+        self.render = Template.render
+        settings.TRACKER_PROFILING = True
+        settings.TRACKER_PROFILING_SAMPLE_RATE = 1
+        profiles = []
+        # the first profile created is made staff
+        for username in ('staff', 'visitor'):
+            django_user = User(username=username,
+                email='%s@p2pu.org' % username)
+            profile = create_profile(django_user)
+            profile.set_password('testpass')
+            profile.save()
+            profiles.append(profile)
+        self.staff, self.visitor = profiles
+
+    def tearDown(self):
+        settings.TRACKER_PROFILING = self.profiling
+        settings.TRACKER_PROFILING_SAMPLE_RATE = self.sample_rate
+        settings.TRACKER_PROFILING_SLOW_REQUEST = self.slow_request
+        Template.render = self.render
+
+    def test_profile_window(self):
+        """Test that the queries and the render time of a request are
+        counted in the current window"""
+        settings.TRACKER_PROFILING_SLOW_REQUEST = 60
+        client = Client()
+        client.login(username='visitor', password='testpass')
+        response = client.get('/en/courses/create/')
+        self.assertEqual(response.status_code, 200)
+        profiles = profiling.get_profiles()
+        self.assertEqual(len(profiles), 1)
+        stats = profiles[0]
+        self.assertEqual(stats['count'], 1)
+        self.assertTrue(stats['queries'] > 0)
+        self.assertTrue(stats['render_time'] > 0)
+        self.assertTrue(stats['wall_time'] >= stats['render_time'])
+        self.assertEqual(sum(stats['histogram']), 1)
+        self.assertEqual(profiling.get_slow_requests(), [])
+
+    def test_slow_request(self):
+        """Test that the requests slower than the threshold are kept with
+        their slowest queries"""
+        settings.TRACKER_PROFILING_SLOW_REQUEST = 0
+        client = Client()
+        client.login(username='visitor', password='testpass')
+        client.get('/en/courses/create/')
+        slow_requests = profiling.get_slow_requests()
+        self.assertEqual(len(slow_requests), 1)
+        slow_request = slow_requests[0]
+        self.assertEqual(slow_request['path'], '/en/courses/create/')
+        self.assertEqual(slow_request['url_name'],
+            profiling.get_profiles()[0]['url_name'])
+        self.assertTrue(slow_request['slowest_queries'])
+        self.assertTrue(len(slow_request['slowest_queries']) <=
+            profiling.SLOW_QUERIES)
+
+    def test_report_staff_only(self):
+        """Test that the profiling report is only shown to staff"""
+        client = Client()
+        self.assertEqual(client.get('/en/metrics/profiling/').status_code,
+            404)
+        client.login(username='visitor', password='testpass')
+        self.assertEqual(client.get('/en/metrics/profiling/').status_code,
+            404)
+        client.logout()
+        client.login(username='staff', password='testpass')
+        self.assertEqual(client.get('/en/metrics/profiling/').status_code,
+            200)
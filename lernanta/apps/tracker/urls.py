@@ -11,4 +11,6 @@ urlpatterns = patterns('',
       name='metrics_scoreboard_top_groups_joins'),
   url(r'^scoreboard/groups/$', 'tracker.views.scoreboard_groups',
       name='metrics_scoreboard_groups'),
+  url(r'^profiling/$', 'tracker.views.profiling_report',
+      name='metrics_profiling'),
 )
@@ -1,4 +1,6 @@
 import re
+import socket
+import struct
 import unicodedata
 import datetime
 
@@ -65,3 +67,17 @@ def force_date(date):
         return datetime.datetime.strptime(date, '%Y-%m-%d').date()
     else:
         return date
+
+
+def pack_ip(ip_address):
+    """Packs a dotted IPv4 address in an integer."""
+    try:
+        return struct.unpack('!L', socket.inet_aton(ip_address))[0]
+    except (socket.error, TypeError):
+        return None
+
+
+def unpack_ip(ip_number):
+    if ip_number is None:
+        return None
+    return socket.inet_ntoa(struct.pack('!L', ip_number))
@@ -8,15 +8,22 @@ from django import http
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Count
 from django.utils import simplejson
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from users.models import UserProfile
 from replies.models import PageComment
 from projects.models import Participation, Project
 from signups.models import SignupAnswer
+from tracker import counters, ingest, profiling
 
 
 log = logging.getLogger(__name__)
 
+# Durations accepted per beacon request.
+BEACON_MAX_DURATIONS = 20
+
 
 def get_time_details():
     stats_date = datetime.datetime.now()
@@ -37,25 +44,19 @@ def get_time_details():
     }
 
 
-def get_stats(name, objects_list, date_field_name, time_details):
-    todays_count = objects_list.filter(**{
-        date_field_name + '__day': time_details['day'],
-        date_field_name + '__month': time_details['month'],
-        date_field_name + '__year': time_details['year']
-        }).count()
+def get_counter_stats(name, time_details):
+    """Scoreboard stats of the objects counted by the ``name`` daily
+    counter (see tracker.counters)."""
+    todays_count, this_month_count, prev_month_count = counters.get_counts(
+        name, time_details)
+    return summarize_stats(name, todays_count, this_month_count,
+        prev_month_count, time_details)
 
-    this_month_count = objects_list.filter(**{
-        date_field_name + '__month': time_details['month'],
-        date_field_name + '__year': time_details['year']
-        }).count()
 
+def summarize_stats(name, todays_count, this_month_count, prev_month_count,
+        time_details):
     pace = this_month_count * time_details['number_days_month'] / time_details['day']
 
-    prev_month_count = objects_list.filter(**{
-        date_field_name + '__month': time_details['prev_month'],
-        date_field_name + '__year': time_details['prev_month_year']
-        }).count()
-
     green_threshold = prev_month_count * 105 / 100
     red_threshold = prev_month_count * 95 / 100
 
@@ -80,18 +81,10 @@ def scoreboard(request):
     if not request.user.is_authenticated() or not request.user.is_staff:
         raise http.Http404
     time_details = get_time_details()
-    users_stats = get_stats('users', UserProfile.objects.all(),
-        'user__date_joined', time_details)
-    ct = ContentType.objects.get_for_model(SignupAnswer)
-    comments = PageComment.objects.exclude(page_content_type=ct)
-    comments_stats = get_stats('comments', comments, 'created_on', time_details)
-    joins = Participation.objects.filter(
-        project__test=False, left_on__isnull=True)
-    joins_stats = get_stats('joins', joins,
-        'joined_on', time_details)
-    groups = Project.objects.filter(test=False)
-    groups_stats = get_stats('groups', groups,
-        'created_on', time_details)
+    users_stats = get_counter_stats('users', time_details)
+    comments_stats = get_counter_stats('comments', time_details)
+    joins_stats = get_counter_stats('joins', time_details)
+    groups_stats = get_counter_stats('groups', time_details)
     context = {
         'stats': [users_stats, comments_stats, joins_stats, groups_stats],
         'stats_date': time_details['stats_date'],
@@ -102,6 +95,45 @@ def scoreboard(request):
     )
 
 
+@csrf_exempt
+@require_POST
+def beacon(request):
+    """Receives the time spent on pages of the session, sent by the
+    browser when they are left (see _analytics.html) as a json list of
+    [pageview id, seconds] pairs."""
+    session_key = request.session.session_key
+    if not session_key:
+        return http.HttpResponse(status=204)
+    try:
+        durations = simplejson.loads(request.raw_post_data)
+        records = [ingest.make_duration_record(session_key, pageview_id,
+            seconds) for pageview_id, seconds in
+            durations[:BEACON_MAX_DURATIONS]]
+    except (ValueError, TypeError, OverflowError):
+        return http.HttpResponseBadRequest()
+    buffer = ingest.get_duration_buffer()
+    for record in records:
+        if record:
+            buffer.add(record)
+    return http.HttpResponse(status=204)
+
+
+def profiling_report(request):
+    if not request.user.is_authenticated() or not request.user.is_staff:
+        raise http.Http404
+    context = {
+        'profiles': profiling.get_profiles()[:50],
+        'slow_requests': profiling.get_slow_requests(),
+        'histogram_bounds': profiling.HISTOGRAM_BOUNDS,
+        'windows': settings.TRACKER_PROFILING_WINDOWS,
+        'stats_date': datetime.datetime.now(),
+    }
+    return render_to_response(
+        'tracker/profiling.html', context,
+        context_instance=RequestContext(request)
+    )
+
+
 def scoreboard_users(request):
     if not request.user.is_authenticated() or not request.user.is_staff:
         raise http.Http404
@@ -29,7 +29,7 @@ from l10n import locales
 from urlparse import urlparse, urlunparse
 from links.models import Link
 from drumbeat import messages
-from activity.models import Activity
+from activity.models import Activity, prefetch_activities
 from activity.views import filter_activities
 from pagination.views import get_pagination_context
 from badges.models import Award, get_awarded_badges
@@ -402,7 +402,10 @@ def profile_view(request, username):
         'profile_view': True,
         'domain': Site.objects.get_current().domain,
     }
-    context.update(get_pagination_context(request, activities))
+    context.update(get_pagination_context(request, activities,
+        order_field='-created_on'))
+    current_page = context['pagination_current_page']
+    current_page.object_list = prefetch_activities(current_page.object_list)
     return render_to_response('users/profile.html', context,
         context_instance=RequestContext(request))
 
@@ -56,7 +56,7 @@ USE_I18N = True
 USE_L10N = True
 
 SUPPORTED_NONLOCALES = ('media', 'static', '.well-known', 'pubsub', 'broadcasts',
-'ajax', 'api', 'oauth',)
+'ajax', 'api', 'oauth', 'tracker',)
 
 # Absolute path to the directory that holds media.
 # Example: "/home/media/media.lawrence.com/"
@@ -72,6 +72,15 @@ MEDIA_URL = '/media/'
 # Examples: "http://foo.com/media/", "/media/".
 #ADMIN_MEDIA_PREFIX = '/admin-media/'
 
+# Absolute path to the directory where the detailed metrics reports are
+# written. It should not be served publicly.
+METRICS_EXPORT_ROOT = path('exports')
+# Exports still pending or running METRICS_EXPORT_TIMEOUT seconds after
+# they were requested are marked as failed, and the report files are
+# removed METRICS_EXPORT_MAX_AGE days after they were written.
+METRICS_EXPORT_TIMEOUT = 60 * 60
+METRICS_EXPORT_MAX_AGE = 7
+
 # Absolute path to the directory that holds static files.
 # Example: "/home/media/media.lawrence.com/static/"
 STATIC_ROOT = path('static_serv')
@@ -101,6 +110,7 @@ SESSION_COOKIE_PATH = '/; HttpOnly'
 MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
 
 MIDDLEWARE_CLASSES = (
+    'tracker.profiling.ProfilingMiddleware',
     'drumbeat.middleware.NotFoundMiddleware',
     'django.contrib.redirects.middleware.RedirectFallbackMiddleware',
     'l10n.middleware.LocaleURLRewriter',
@@ -323,6 +333,79 @@ TRACKING_PREFIXES = [
     r'^/\w{2}/courses/create/$',
 ]
 
+# Buffered pageview ingestion. When enabled pageviews are queued in a
+# bounded per-process buffer and stored with multi-row inserts once
+# TRACKER_BUFFER_FLUSH_SIZE records are queued or the oldest one is
+# TRACKER_BUFFER_FLUSH_AGE seconds old. Records arriving while the buffer
+# holds TRACKER_BUFFER_MAX_SIZE records are dropped.
+TRACKER_BUFFER_PAGEVIEWS = False
+TRACKER_BUFFER_MAX_SIZE = 5000
+TRACKER_BUFFER_FLUSH_SIZE = 200
+TRACKER_BUFFER_FLUSH_AGE = 10
+# Hand flushed batches to celery instead of writing them from the web process.
+TRACKER_BUFFER_FLUSH_ASYNC = False
+# Where the last pageview of each session is remembered to compute
+# time_on_page: 'cache' (django cache) or 'local' (per-process LRU).
+TRACKER_LAST_PAGEVIEW_STORE = 'cache'
+TRACKER_LAST_PAGEVIEW_MAX_ENTRIES = 10000
+# Store pageviews as CompactPageView rows referencing interned urls,
+# referrers and user agents. Reports read them through the
+# tracker_pageviewlog database view, together with the pageviews stored
+# before the setting was changed.
+TRACKER_COMPACT_PAGEVIEWS = False
+# Interned string ids kept in each process, per dictionary table.
+TRACKER_INTERNING_MAX_ENTRIES = 20000
+# Pages report how long they were viewed to tracker.views.beacon when they
+# are left, instead of updating time_on_page on the next pageview of the
+# session. Durations are buffered like the pageviews. Only used when
+# pageviews are not buffered, since buffered pageviews have no id yet.
+TRACKER_TIME_ON_PAGE_BEACON = False
+# Move the pageviews of the days rolled up into PageViewMetrics and older
+# than TRACKER_ARCHIVE_AFTER_DAYS to gzip'd csv files under
+# TRACKER_ARCHIVE_ROOT, one per day, table and run (see tracker.archive).
+TRACKER_ARCHIVE_PAGEVIEWS = False
+TRACKER_ARCHIVE_AFTER_DAYS = 30
+TRACKER_ARCHIVE_ROOT = path('archive', 'pageviews')
+
+# Metrics are sent to the statsd daemon at STATSD_HOST:STATSD_PORT (see
+# settings_local.dist.py) every STATSD_FLUSH_INTERVAL seconds, in packets
+# of at most STATSD_MAX_PACKET_SIZE bytes. Metric names are prefixed with
+# STATSD_PREFIX, or the current site domain when it is None.
+STATSD_PREFIX = None
+STATSD_FLUSH_INTERVAL = 10
+STATSD_MAX_PACKET_SIZE = 512
+
+# Request profiling (see tracker.profiling). A TRACKER_PROFILING_SAMPLE_RATE
+# fraction of the requests is profiled and aggregated per url name in
+# hourly windows, the last TRACKER_PROFILING_WINDOWS of them are shown at
+# the metrics profiling page. The last TRACKER_PROFILING_SLOW_SAMPLES
+# requests slower than TRACKER_PROFILING_SLOW_REQUEST seconds are kept.
+TRACKER_PROFILING = False
+TRACKER_PROFILING_SAMPLE_RATE = 0.1
+TRACKER_PROFILING_WINDOWS = 24
+TRACKER_PROFILING_SLOW_REQUEST = 2
+TRACKER_PROFILING_SLOW_SAMPLES = 50
+
+# Dashboards read the activities copied to each user's timeline when they
+# are created (see activity.timelines) instead of querying everything the
+# user follows. Run the rebuild_timelines command after enabling it.
+# Rebuilt timelines keep the last ACTIVITY_TIMELINE_LENGTH activities.
+ACTIVITY_TIMELINES = False
+ACTIVITY_TIMELINE_LENGTH = 500
+# Seconds the rendered activity fragments are cached (see
+# activity.fragments).
+ACTIVITY_FRAGMENT_TIMEOUT = 60 * 60 * 24
+# Seconds the activity feed documents are cached. They are replaced as
+# soon as a newer activity is created in the scope of the feed.
+ACTIVITY_FEED_TIMEOUT = 60 * 60
+# Seconds the project sidebar data is cached. Membership, content, sign-up
+# and link changes replace it right away, the tags, the school and the
+# badges only when it expires.
+PROJECT_SIDEBAR_TIMEOUT = 60 * 5
+# Seconds the course index updates wait for more edits of the same
+# course before running (see learn.sync).
+LEARN_SYNC_DELAY = 60
+
 BOT_NAMES =['Googlebot', 'Slurp', 'Twiceler', 'msnbot',
     'KaloogaBot', 'YodaoBot', 'Baiduspider', 'googlebot',
     'Speedy Spider', 'DotBot', 'Sogou', 'YoudaoBot',
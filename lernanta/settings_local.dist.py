@@ -179,7 +179,8 @@ SSO_EXTERNAL_REDIRECTS = {
     },
 }
 
-# Statsd
-STATSD_HOST = 'stats.p2pu.org'
+# Statsd, no metrics are sent unless STATSD_HOST is set
+# (e.g. to 'localhost').
+STATSD_HOST = None
 STATSD_PORT = 8125
 
@@ -27,6 +27,7 @@ urlpatterns = patterns('',
     (r'^comments/',      include('replies.urls')),
     (r'^badges/',        include('badges.urls')),
     (r'metrics/',        include('tracker.urls')),
+    (r'^tracker/',       include('tracker.beacon_urls')),
     (r'reviews/',        include('reviews.urls')),
     (r'notifications/',  include('notifications.urls')),
     (r'api/',            include('api.urls')),